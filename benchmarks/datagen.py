@@ -0,0 +1,157 @@
+"""
+Synthetic dataset generator for benchmarks.
+
+Generates realistic-looking users, books and requests into a scratch SQLite database with the
+application schema. Sizes are named by the number of books:
+
+    scale   users    books       requests
+    10k     1,000    10,000      5,000
+    100k    10,000   100,000     50,000
+    1m      100,000  1,000,000   500,000
+
+All users share one bcrypt hash of `PASSWORD` (at the configured `PasswordHasher.rounds`), so
+`User.login` costs the same as in production without hashing a password per generated user.
+
+Usage:
+    python -m benchmarks.datagen --scale 100k --db /tmp/bookmate-100k.db
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+import bcrypt
+
+from controllers.password_hasher import PasswordHasher
+from models.database import DBManager
+
+SCALES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+PASSWORD = "benchmark-password"
+BATCH_SIZE = 10_000
+
+TITLE_WORDS = (
+    "Shadow", "River", "Empire", "Garden", "Silent", "Winter", "Secret", "Night", "Ocean", "Stone",
+    "Crown", "Fire", "Glass", "Memory", "Storm", "Golden", "Last", "Lost", "Hidden", "Broken",
+    "Kingdom", "Journey", "Light", "Forest", "Dream", "City", "Road", "House", "War", "Love",
+    "History", "Science", "Python", "Data", "Mountain", "Island", "Letters", "Song", "Iron", "Wild",
+)
+FIRST_NAMES = (
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "Ngozi", "Haruki",
+    "Isabel", "Gabriel", "Toni", "Chinua", "Orhan", "Elena", "Kazuo", "Zadie", "Salman", "Ursula",
+)
+LAST_NAMES = (
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Adichie", "Murakami",
+    "Allende", "Marquez", "Morrison", "Achebe", "Pamuk", "Ferrante", "Ishiguro", "Smith", "Rushdie", "Le Guin",
+)
+
+
+def isbn13(number):
+    """
+    Builds a valid ISBN-13 (with check digit) from a serial number.
+
+    Args:
+        number (int): Serial number, unique per book.
+
+    Returns:
+        str: A hyphen-free ISBN-13 in the 978 prefix range.
+    """
+    body = f"978{number:09d}"
+    total = sum(int(digit) * (1 if i % 2 == 0 else 3) for i, digit in enumerate(body))
+    return body + str((10 - total % 10) % 10)
+
+
+def generate(path, scale, seed=42, progress=print):
+    """
+    Creates a fresh database at `path` filled with synthetic data.
+
+    Args:
+        path (str): Database file to create (an existing file is replaced).
+        scale (str): One of the keys of `SCALES`.
+        seed (int): Random seed, so the same scale always yields the same dataset.
+        progress (callable): Receives human-readable progress messages.
+
+    Returns:
+        dict: Row counts per table.
+    """
+    books = SCALES[scale]
+    users = max(books // 10, 2)
+    requests = books // 2
+    rng = random.Random(seed)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")  # Like files created by the application
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")  # Scratch data; durability is irrelevant here
+    DBManager.create_schema(conn)
+
+    started = time.perf_counter()
+    password_hash = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(PasswordHasher.rounds))
+    _insert(conn, "INSERT INTO users (username, password) VALUES (?, ?)",
+            ((f"user{i:07d}", password_hash) for i in range(1, users + 1)))
+    progress(f"  {users:,} users")
+
+    def book_rows():
+        for i in range(1, books + 1):
+            title = " ".join(rng.sample(TITLE_WORDS, rng.randint(2, 4)))
+            author = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            isbn = isbn13(i)
+            yield title, author, isbn, isbn, rng.randint(1, users)  # Already a bare ISBN-13
+
+    _insert(conn, "INSERT INTO books (title, author, isbn, isbn13, owner_id) VALUES (?, ?, ?, ?, ?)", book_rows())
+    progress(f"  {books:,} books")
+
+    def request_rows():
+        for _ in range(requests):
+            status = rng.choices(("Pending", "Accepted", "Rejected"), (6, 2, 2))[0]
+            yield rng.randint(1, users), status, rng.randint(1, books)
+
+    # The owner is copied from the book row, as Request.save does; a repeated pending
+    # (book, requester) pair is skipped, as the unique index on pending requests demands
+    _insert(conn, "INSERT OR IGNORE INTO requests (book_id, requester_id, owner_id, status) "
+                  "SELECT book_id, ?, owner_id, ? FROM books WHERE book_id = ?",
+            request_rows())
+    progress(f"  {requests:,} requests")
+
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    progress(f"Generated {scale} dataset in {time.perf_counter() - started:.1f}s")
+    return {"users": users, "books": books, "requests": requests}
+
+
+def _insert(conn, sql, rows):
+    """
+    Inserts rows from an iterator in batches of `BATCH_SIZE`, one transaction per batch.
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(sql, batch)
+            conn.commit()
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+        conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic BookMate dataset.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="10k")
+    parser.add_argument("--db", required=True, help="scratch database file to create")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    generate(args.db, args.scale, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Benchmarks for the controller hot paths.
+
+Times `Book.search`, `Book.search_page`, `Request.view_requests`, `Request.update_request_status`
+and `User.login` against a synthetic dataset (see `benchmarks/datagen.py`) and writes the
+results as JSON. With `--baseline`, the run is compared against an earlier results file and
+exits non-zero if any operation's median got slower than the allowed ratio.
+
+The generated dataset is reused across runs, but never benchmarked directly: every run works on
+a fresh copy (a scratch file, or an in-memory database with `--memory`), so operations that write
+(`update_request_status`, password rehashes on login) leave the next run the same data to start from.
+
+Usage:
+    python -m benchmarks.run --scale 100k --output results.json
+    python -m benchmarks.run --scale 100k --baseline results.json --threshold 1.25
+    python -m benchmarks.run --scale 100k --memory       # in-memory copy: storage out of the picture
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks import datagen
+from controllers.book import Book
+from controllers.request import Request
+from controllers.user import User
+from models.database import DBManager
+
+
+class Benchmark:
+    """
+    Runs each controller operation a number of times and summarizes its latency.
+    """
+
+    def __init__(self, scale, repeat, seed=7):
+        """
+        Args:
+            scale (str): Dataset scale the database was generated with.
+            repeat (int): Timed calls per operation (login uses at most 10, since bcrypt is slow by design).
+            seed (int): Random seed for the operation arguments.
+        """
+        self.scale = scale
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+        self.users = DBManager.fetch_one("SELECT COUNT(*) FROM users")[0]
+        self.books = DBManager.fetch_one("SELECT MAX(book_id) FROM books")[0]
+
+    def operations(self):
+        """
+        Returns:
+            dict: Operation name -> (argument factory, callable taking those arguments, repeat count).
+        """
+        rng = self.rng
+        pending = [row[0] for row in DBManager.fetch_all(
+            "SELECT request_id FROM requests WHERE status = 'Pending' ORDER BY random() LIMIT ?", (self.repeat,)
+        )]
+        return {
+            "search_keyword": (lambda: (rng.choice(datagen.TITLE_WORDS),), Book.search, self.repeat),
+            "search_two_terms": (lambda: (" ".join(rng.sample(datagen.TITLE_WORDS, 2)),), Book.search, self.repeat),
+            "search_prefix": (lambda: (rng.choice(datagen.TITLE_WORDS)[:3],), Book.search, self.repeat),
+            "search_author": (lambda: (rng.choice(datagen.LAST_NAMES),), Book.search, self.repeat),
+            "search_isbn": (lambda: (datagen.isbn13(rng.randint(1, self.books)),), Book.search, self.repeat),
+            "search_page_all": (lambda: ("", rng.randint(0, self.books), 50), Book.search_page, self.repeat),
+            "view_requests": (lambda: (rng.randint(1, self.users),), Request.view_requests, self.repeat),
+            "update_request_status": (
+                lambda: (pending.pop(), rng.choice(("Accepted", "Rejected"))),
+                Request.update_request_status,
+                min(self.repeat, len(pending)),
+            ),
+            "login": (lambda: (f"user{rng.randint(1, self.users):07d}", datagen.PASSWORD), User().login,
+                      min(self.repeat, 10)),
+        }
+
+    def run(self, selected=None, progress=print):
+        """
+        Times every (or every selected) operation.
+
+        Returns:
+            dict: Operation name -> latency summary in milliseconds.
+        """
+        results = {}
+        for name, (make_args, func, repeat) in self.operations().items():
+            if selected and name not in selected:
+                continue
+            samples = []
+            for _ in range(repeat):
+                args = make_args()
+                Book.clear_caches()  # Time the database, not the read-through caches
+                started = time.perf_counter()
+                func(*args)
+                samples.append((time.perf_counter() - started) * 1000)
+            if not samples:
+                continue
+            samples.sort()
+            results[name] = {
+                "calls": len(samples),
+                "mean_ms": statistics.fmean(samples),
+                "p50_ms": samples[len(samples) // 2],
+                "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "min_ms": samples[0],
+                "max_ms": samples[-1],
+            }
+            progress(f"  {name:<24}{results[name]['p50_ms']:>10.3f} ms p50{results[name]['p95_ms']:>10.3f} ms p95")
+        return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares the median latency of each operation against a baseline run.
+
+    Args:
+        results (dict): Current results (the `results` section of a results file).
+        baseline (dict): Baseline results in the same format.
+        threshold (float): Maximum allowed current/baseline median ratio.
+
+    Returns:
+        list: (operation, baseline p50, current p50, ratio) for every operation over the threshold.
+    """
+    regressions = []
+    print(f"\n{'operation':<24}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = current["p50_ms"] / previous["p50_ms"] if previous["p50_ms"] > 0 else float("inf")
+        marker = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:<24}{previous['p50_ms']:>10.3f}ms{current['p50_ms']:>10.3f}ms{ratio:>8.2f}{marker}")
+        if ratio > threshold:
+            regressions.append((name, previous["p50_ms"], current["p50_ms"], ratio))
+    return regressions
+
+
+@contextlib.contextmanager
+def working_copy(path, memory=False):
+    """
+    Context manager pointing `DBManager` at a fresh copy of the dataset for the duration of a run.
+
+    Args:
+        path (str): The generated dataset, which is left untouched.
+        memory (bool): Copy it into an in-memory database instead of a scratch file.
+    """
+    if memory:
+        DBManager.configure(":memory:")
+        with contextlib.closing(sqlite3.connect(path)) as source:
+            source.backup(DBManager.get_connection())
+        scratch = None
+    else:
+        # Next to the dataset, so the copy is on the same storage
+        directory = os.path.dirname(os.path.abspath(path))
+        handle, scratch = tempfile.mkstemp(prefix="bookmate-bench-run-", suffix=".db", dir=directory)
+        os.close(handle)
+        with contextlib.closing(sqlite3.connect(path)) as source:
+            with contextlib.closing(sqlite3.connect(scratch)) as copy:
+                source.backup(copy)
+        DBManager.configure(scratch)
+    try:
+        yield
+    finally:
+        DBManager.close_connections()
+        if scratch is not None:
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(scratch + suffix)
+
+
+def main(argv=None):
+    """
+    Returns:
+        int: 0 on success, 1 if the run regressed against the baseline.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark BookMate controller operations.")
+    parser.add_argument("--scale", choices=sorted(datagen.SCALES), default="10k")
+    parser.add_argument("--db", help="dataset file, copied for every run (default: bookmate-bench-<scale>.db in the temp directory)")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the dataset even if --db exists")
+    parser.add_argument("--memory", action="store_true",
+                        help="copy the dataset into an in-memory database and benchmark that (no disk I/O)")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per operation (default: 50)")
+    parser.add_argument("--only", nargs="+", help="run only these operations")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this earlier results file")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="max allowed p50 slowdown vs. the baseline (default: 1.25)")
+    args = parser.parse_args(argv)
+
+    path = args.db or os.path.join(tempfile.gettempdir(), f"bookmate-bench-{args.scale}.db")
+    if args.regenerate or not os.path.exists(path):
+        print(f"Generating {args.scale} dataset into {path}")
+        datagen.generate(path, args.scale)
+
+    with working_copy(path, args.memory):
+        DBManager.setup_database()  # Applies any migrations added since the dataset was generated
+        print(f"Benchmarking {args.scale} dataset ({args.repeat} calls per operation)")
+        results = Benchmark(args.scale, args.repeat).run(args.only)
+    document = {
+        "meta": {
+            "scale": args.scale,
+            "repeat": args.repeat,
+            "memory": args.memory,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            json.dump(document, out, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as source:
+            baseline = json.load(source)
+        if baseline.get("meta", {}).get("scale") != args.scale:
+            print(f"Warning: baseline was recorded at scale {baseline.get('meta', {}).get('scale')}")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} operation(s) regressed by more than {args.threshold:.2f}x.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,16 @@
+import difflib
+import heapq
+import os
+import re
+import unicodedata
+from itertools import chain, islice
 from controllers.base import BaseModel
+from models.cache import LRUCache
 from models.database import DBManager
+from models.errors import ConstraintError
+from models.isbn import normalize_isbn
+from models.tenants import TenantRegistry
+from models.workload import WorkloadRecorder
 
 class Book(BaseModel):
     """
@@ -10,8 +21,27 @@ class Book(BaseModel):
         - title (str): Title of the book.
         - author (str): Author of the book.
         - isbn (str): ISBN of the book.
+        - isbn13 (str): The ISBN normalized to a bare ISBN-13 (None if `isbn` is not a valid ISBN).
         - owner_id (int): ID of the user who owns the book.
+
+    In sharded mode a book is stored on its owner's shard, and searches query every shard in
+    parallel and merge the results.
+
+    Book rows and search results are cached in size-bounded LRU caches (`BOOKMATE_BOOK_CACHE_BYTES`,
+    default 4 MB, and `BOOKMATE_SEARCH_CACHE_BYTES`, default 16 MB; 0 disables a cache). Writes
+    made through `save`, `delete` and request acceptance invalidate exactly the entries they can
+    change; code that writes to `books` directly must call `invalidate` or `invalidate_searches`.
+    In multi-tenant mode the caches keep every tenant's entries apart.
     """
+    _rows = LRUCache(
+        "books", int(os.environ.get("BOOKMATE_BOOK_CACHE_BYTES", 4 * 1024 * 1024)), scope=TenantRegistry.current
+    )
+    _searches = LRUCache(
+        "searches", int(os.environ.get("BOOKMATE_SEARCH_CACHE_BYTES", 16 * 1024 * 1024)), scope=TenantRegistry.current
+    )
+
+    FUZZY_CANDIDATES = 200  # Books per shard fetched from the trigram index before re-ranking
+    FUZZY_MIN_SIMILARITY = 0.75  # Lowest similarity (0-1) of a fuzzy match
 
     def __init__(self, title, author, isbn, owner_id):
         """
@@ -27,25 +57,46 @@ class Book(BaseModel):
         self.title = title
         self.author = author
         self.isbn = isbn
+        self.isbn13 = normalize_isbn(isbn)
         self.owner_id = owner_id
 
+    @WorkloadRecorder.operation("Book.save", capture=lambda book: [book.title, book.author, book.isbn, book.owner_id])
     def save(self):
         """
         Save the book to the database.
 
-        Inserts a new book record into the `books` table.
+        Inserts a new book record into the `books` table. A book whose ISBN is already in the
+        catalog is rejected: as typed (the `isbn` column is unique) or, for a valid ISBN, in any
+        other format of it (ISBN-10 or ISBN-13, with or without hyphens; the `isbn13` column is
+        unique). In sharded mode every shard is checked first, since the unique indexes only cover
+        one shard.
+
         Returns:
             bool: True if the book was saved successfully, False otherwise.
         """
-        if DBManager.execute_query(
-                "INSERT INTO books (title, author, isbn, owner_id) VALUES (?, ?, ?, ?)",
-                (self.title, self.author, self.isbn, self.owner_id),
-        ):
-            return True
-        else:
-            return False
+        shards = DBManager.get_shards()
+        if shards.count > 1 and self.isbn13 is not None and any(shards.scatter(
+                DBManager.fetch_one,
+                """SELECT 1 FROM books WHERE isbn13 = ?
+                   UNION ALL
+                   SELECT 1 FROM book_transfers WHERE isbn13 = ? -- allow-scan: the outbox only holds in-flight transfers
+                """,
+                (self.isbn13, self.isbn13))):
+            return False  # The ISBN is already in the catalog (or on a book moving between shards)
+        with shards.use(shards.shard_of_id(self.owner_id)):  # Books live on their owner's shard
+            try:
+                result = DBManager.execute_query(
+                    "INSERT INTO books (title, author, isbn, isbn13, owner_id) VALUES (?, ?, ?, ?, ?)",
+                    (self.title, self.author, self.isbn, self.isbn13, self.owner_id),
+                )
+            except ConstraintError:
+                return False  # The ISBN is already in the catalog
+        self.book_id = result.lastrowid
+        Book._invalidate_new_book(self.book_id, self.title, self.author, self.isbn, self.isbn13)
+        return True
 
     @staticmethod
+    @WorkloadRecorder.operation("Book.delete")
     def delete(book_id, owner_id):
         """
         Delete a book from the database.
@@ -57,20 +108,27 @@ class Book(BaseModel):
         Returns:
             bool: True if the book was deleted successfully, False otherwise.
         """
-        cursor = DBManager.execute_query(
-            "DELETE FROM books WHERE book_id = ? AND owner_id = ?",
-            (book_id, owner_id),
-        )
-        if cursor:
-            return cursor.rowcount > 0  # True if rows were affected.
-        else:
-            return False
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(owner_id)):
+            cursor = DBManager.execute_query(
+                "DELETE FROM books WHERE book_id = ? AND owner_id = ?",
+                (book_id, owner_id),
+            )
+        if cursor.rowcount > 0:
+            Book.invalidate(book_id)
+        return cursor.rowcount > 0  # True if rows were affected.
 
     @staticmethod
+    @WorkloadRecorder.operation("Book.search")
     def search(keyword):
         """
         Search for books in the database.
 
+        Non-empty keywords are looked up in the `books_fts` full-text index. Every term in the
+        keyword must match (as a word prefix) the title, author, or ISBN, and results are ranked
+        by bm25 relevance with title matches weighted highest. An empty keyword lists all books.
+        A keyword that is an ISBN (e.g. a scanned barcode) is looked up with `find_by_isbn` first.
+
         Args:
             keyword (str): The keyword to search for in the title, author, or ISBN.
 
@@ -82,16 +140,385 @@ class Book(BaseModel):
                   - isbn
                   - username of the owner.
         """
-        return DBManager.fetch_all(
+        by_isbn = Book.find_by_isbn(keyword)
+        if by_isbn:
+            return by_isbn
+
+        terms = Book._search_terms(keyword)
+        key = ("ranked", terms)
+        cached = Book._searches.get(key)
+        if cached is not None:
+            return list(cached)
+
+        generation = Book._searches.generation
+        results = Book._search_uncached(terms)
+        if results:  # Misses (typos, rare words) are cheap to repeat; keep the cache for real results
+            Book._searches.put(key, tuple(results), generation)
+        return results
+
+    @staticmethod
+    def _search_uncached(terms):
+        """
+        Run the query behind `search` for already normalized terms.
+        """
+        shards = DBManager.get_shards()
+        match_query = Book._build_match_query(" ".join(terms))
+        if match_query is None:
+            # Nothing to match on, so list the whole catalog (every shard is ordered by book_id).
+            results = shards.scatter(
+                DBManager.fetch_all,
+                """SELECT books.book_id, books.title, books.author, books.isbn, users.username
+                   FROM books
+                   LEFT JOIN users ON books.owner_id = users.user_id
+                   ORDER BY books.book_id
+                   -- allow-scan: listing the whole catalog reads every row by design
+                """
+            )
+            return list(heapq.merge(*results))
+
+        # Each shard returns its matches with their bm25 score; the merged list is ranked by score
+        results = shards.scatter(
+            DBManager.fetch_all,
+            """SELECT books.book_id, books.title, books.author, books.isbn, users.username,
+                      bm25(books_fts, 10.0, 5.0, 1.0) AS score
+               FROM books_fts
+               JOIN books ON books.book_id = books_fts.rowid
+               LEFT JOIN users ON books.owner_id = users.user_id
+               WHERE books_fts MATCH ?
+               ORDER BY score
+            """,
+            (match_query,),
+        )
+        return [row[:5] for row in heapq.merge(*results, key=lambda row: row[5])]
+
+    @staticmethod
+    @WorkloadRecorder.operation("Book.search_page")
+    def search_page(keyword, after_id=0, limit=50):
+        """
+        Fetch one page of search results using keyset pagination.
+
+        Results are ordered by `book_id`, and each page starts after the last `book_id` of the
+        previous one (`WHERE book_id > ? ORDER BY book_id LIMIT ?`). Every page is a short indexed
+        range query, however deep into the catalog it is.
+
+        Args:
+            keyword (str): The keyword to search for in the title, author, or ISBN ("" lists all books).
+            after_id (int): The last `book_id` of the previous page (0 for the first page).
+            limit (int): Maximum number of books on the page.
+
+        Returns:
+            list: Up to `limit` books, in the same format as `search`.
+        """
+        by_isbn = Book.find_by_isbn(keyword)
+        if by_isbn:
+            return [book for book in by_isbn if book[0] > after_id][:limit]
+
+        terms = Book._search_terms(keyword)
+        key = ("page", terms, after_id, limit)
+        cached = Book._searches.get(key)
+        if cached is not None:
+            return list(cached)
+
+        generation = Book._searches.generation
+        results = Book._search_page_uncached(terms, after_id, limit)
+        if results:
+            Book._searches.put(key, tuple(results), generation)
+        return results
+
+    @staticmethod
+    def _search_page_uncached(terms, after_id, limit):
+        """
+        Run the query behind `search_page` for already normalized terms.
+        """
+        shards = DBManager.get_shards()
+        match_query = Book._build_match_query(" ".join(terms))
+        if match_query is None:
+            results = shards.scatter(
+                DBManager.fetch_all,
+                """SELECT books.book_id, books.title, books.author, books.isbn, users.username
+                   FROM books
+                   LEFT JOIN users ON books.owner_id = users.user_id
+                   WHERE books.book_id > ?
+                   ORDER BY books.book_id
+                   LIMIT ?
+                """,
+                (after_id, limit),
+            )
+        else:
+            results = shards.scatter(
+                DBManager.fetch_all,
+                """SELECT books.book_id, books.title, books.author, books.isbn, users.username
+                   FROM books_fts
+                   JOIN books ON books.book_id = books_fts.rowid
+                   LEFT JOIN users ON books.owner_id = users.user_id
+                   WHERE books_fts MATCH ? AND books_fts.rowid > ?
+                   ORDER BY books_fts.rowid
+                   LIMIT ?
+                """,
+                (match_query, after_id, limit),
+            )
+        # Every shard returns its first `limit` books after `after_id`; the page is the lowest of them
+        return list(islice(heapq.merge(*results), limit))
+
+    @staticmethod
+    @WorkloadRecorder.operation("Book.iter_search")
+    def iter_search(keyword, page_size=100):
+        """
+        Stream search results without materializing them all in memory.
+
+        Every page is a separate short query, so no cursor (and no read snapshot) is held open
+        between pages: the caller may stop half way, or write to the database while the generator
+        is suspended. Listing the whole catalog walks it page by page with `search_page`. Keyword
+        searches page through the relevance-ranked results of `search` with a keyset on
+        `(score, book_id)` (in sharded mode, every shard returns its next page and the pages are
+        merged by score). Each page reflects the catalog when it is fetched; since a write in the
+        meantime shifts every score a little, the IDs of the books already yielded are kept so no
+        book is yielded twice.
+
+        Args:
+            keyword (str): The keyword to search for in the title, author, or ISBN ("" lists all books).
+            page_size (int): Number of books fetched from the database at a time.
+
+        Yields:
+            tuple: One book at a time, in the same format as `search`.
+        """
+        by_isbn = Book.find_by_isbn(keyword)
+        if by_isbn:
+            yield from by_isbn
+            return
+
+        match_query = Book._build_match_query(keyword)
+        if match_query is None:
+            after_id = 0
+            while True:
+                page = Book.search_page(keyword, after_id, page_size)
+                yield from page
+                if len(page) < page_size:
+                    return
+                after_id = page[-1][0]
+
+        after = (float("-inf"), 0)
+        seen = set()
+        while True:
+            page = Book._ranked_page(match_query, after, page_size)
+            for row in page:
+                if row[0] not in seen:
+                    seen.add(row[0])
+                    yield row[:5]
+            if len(page) < page_size:
+                return
+            after = (page[-1][5], page[-1][0])
+
+    @staticmethod
+    def _ranked_page(match_query, after, limit):
+        """
+        Fetch the next `limit` ranked matches after `after`, a `(score, book_id)` pair.
+
+        Returns:
+            list: Books in the same format as `search`, with their score appended.
+        """
+        results = DBManager.get_shards().scatter(
+            DBManager.fetch_all,
+            """SELECT * FROM (
+                   SELECT books.book_id, books.title, books.author, books.isbn, users.username,
+                          bm25(books_fts, 10.0, 5.0, 1.0) AS score
+                   FROM books_fts
+                   JOIN books ON books.book_id = books_fts.rowid
+                   LEFT JOIN users ON books.owner_id = users.user_id
+                   WHERE books_fts MATCH ?
+               )
+               WHERE (score, book_id) > (?, ?)
+               ORDER BY score, book_id
+               LIMIT ?
+            """,
+            (match_query, after[0], after[1], limit),
+        )
+        return list(islice(heapq.merge(*results, key=lambda row: (row[5], row[0])), limit))
+
+    @staticmethod
+    @WorkloadRecorder.operation("Book.find_by_isbn")
+    def find_by_isbn(isbn):
+        """
+        Look up a book by ISBN, in any format (ISBN-10 or ISBN-13, with or without hyphens).
+
+        This is a single lookup in the unique `isbn13` index (one per shard in sharded mode), so
+        only books with an `isbn13` are found. Databases upgraded to schema version 7 may hold
+        differently formatted copies of an ISBN added before that version: only the earliest copy
+        got the `isbn13`, and the later ones are only found by searching their title or author.
+
+        Args:
+            isbn (str): The ISBN to look for.
+
+        Returns:
+            list: The matching book (in the same format as `search`), or an empty list if `isbn` is
+                  not a valid ISBN or no book has it.
+        """
+        isbn13 = normalize_isbn(isbn)
+        if isbn13 is None:
+            return []
+        results = DBManager.get_shards().scatter(
+            DBManager.fetch_all,
             """SELECT books.book_id, books.title, books.author, books.isbn, users.username
                FROM books
                LEFT JOIN users ON books.owner_id = users.user_id
-               WHERE LOWER(books.title) LIKE LOWER(?)
-                  OR LOWER(books.author) LIKE LOWER(?)
-                  OR LOWER(books.isbn) LIKE LOWER(?)
+               WHERE books.isbn13 = ?
             """,
-            (f"%{keyword}%", f"%{keyword}%", f"%{keyword}%"),
+            (isbn13,),
         )
+        return sorted(chain(*results))
+
+    @staticmethod
+    @WorkloadRecorder.operation("Book.fuzzy_search")
+    def fuzzy_search(keyword, limit=20):
+        """
+        Typo-tolerant search over titles and authors (e.g. `tolkein` finds Tolkien).
+
+        Candidates come from the `books_trigram` index: books sharing the most three-letter
+        sequences with the keyword, at most `FUZZY_CANDIDATES` per shard, so the cost depends on
+        how many books share the keyword's trigrams, not on the size of the catalog. They are then
+        re-ranked by word similarity and those below `FUZZY_MIN_SIMILARITY` are dropped.
+
+        Args:
+            keyword (str): The (possibly misspelled) words to look for.
+            limit (int): Maximum number of books returned.
+
+        Returns:
+            list: Up to `limit` books, most similar first, in the same format as `search`.
+        """
+        words = tuple(Book._tokens(keyword))
+        trigrams = sorted({word[i:i + 3] for word in words for i in range(len(word) - 2)})
+        if not trigrams:
+            return Book.search(keyword)[:limit]  # Too short to have trigrams; prefix search is as good
+
+        key = ("fuzzy", words, limit)
+        cached = Book._searches.get(key)
+        if cached is not None:
+            return list(cached)
+
+        generation = Book._searches.generation
+        candidates = DBManager.get_shards().scatter(
+            DBManager.fetch_all,
+            """SELECT books.book_id, books.title, books.author, books.isbn, users.username
+               FROM (SELECT rowid AS book_id FROM books_trigram
+                     WHERE books_trigram MATCH ? ORDER BY rank LIMIT ?) AS candidates
+               JOIN books ON books.book_id = candidates.book_id
+               LEFT JOIN users ON books.owner_id = users.user_id
+               -- allow-scan: "candidates" is the trigram lookup, at most FUZZY_CANDIDATES rows
+            """,
+            (" OR ".join(f'"{trigram}"' for trigram in trigrams), Book.FUZZY_CANDIDATES),
+        )
+
+        scored = []
+        for row in chain(*candidates):
+            score = Book._similarity(words, Book._tokens(f"{row[1]} {row[2]}"))
+            if score >= Book.FUZZY_MIN_SIMILARITY:
+                scored.append((-score, row[0], row))
+        scored.sort()
+        results = [row for _, _, row in scored[:limit]]
+        if results:
+            Book._searches.put(key, tuple(results), generation)
+        return results
+
+    @staticmethod
+    def _similarity(words, tokens):
+        """
+        Score how well a book's words match the keyword's words.
+
+        Each keyword word is matched with the book word most similar to it (a prefix counts as a
+        perfect match, so partially typed words still rank first) and the scores are averaged.
+
+        Returns:
+            float: Similarity between 0 and 1.
+        """
+        if not words or not tokens:
+            return 0.0
+        total = 0.0
+        matcher = difflib.SequenceMatcher(autojunk=False)
+        for word in words:
+            matcher.set_seq2(word)  # SequenceMatcher caches its analysis of the second sequence
+            best = 0.0
+            for token in tokens:
+                if token.startswith(word):
+                    best = 1.0
+                    break
+                matcher.set_seq1(token)
+                # The quick ratios are cheap upper bounds; skip tokens that cannot beat the best so far
+                if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+                    best = max(best, matcher.ratio())
+            total += best
+        return total / len(words)
+
+    @staticmethod
+    def _build_match_query(keyword):
+        """
+        Convert a free-text keyword into an FTS5 MATCH expression.
+
+        Each word becomes a quoted prefix term (e.g. `tolk lord` -> `"tolk"* "lord"*`), so
+        FTS5 syntax characters typed by the user are never interpreted as operators.
+
+        Args:
+            keyword (str): The raw search keyword.
+
+        Returns:
+            str or None: The MATCH expression, or None if the keyword has no searchable terms.
+        """
+        terms = re.findall(r"\w+", keyword or "")
+        if not terms:
+            return None
+        return " ".join(f'"{term}"*' for term in terms)
+
+    @staticmethod
+    def _search_terms(keyword):
+        """
+        Normalize a keyword into the tuple of terms used as a search cache key.
+
+        FTS5 matching is case-insensitive, so `Tolkien` and `tolkien ` share one cache entry.
+        """
+        return tuple(re.findall(r"\w+", (keyword or "").lower()))
+
+    @staticmethod
+    @WorkloadRecorder.operation("Book.get")
+    def get(book_id):
+        """
+        Retrieve a single book by ID, served from the book cache when possible.
+
+        Args:
+            book_id (int): ID of the book to lookup.
+
+        Returns:
+            tuple or None: `(book_id, title, author, isbn, owner_id)`, or None if there is no such book.
+        """
+        try:
+            book_id = int(book_id)  # IDs typed at the console arrive as strings; cache keys must match
+        except (TypeError, ValueError):
+            return None
+        row = Book._rows.get(book_id)
+        if row is not None:
+            return row
+
+        generation = Book._rows.generation
+        shards = DBManager.get_shards()
+        try:
+            home = shards.shard_of_id(book_id)
+        except ValueError:
+            return None  # Not an ID any configured shard hands out
+        with shards.use(home):
+            row = DBManager.fetch_one(
+                "SELECT book_id, title, author, isbn, owner_id FROM books WHERE book_id = ?",
+                (book_id,)
+            )
+            if row is None and shards.count > 1:
+                # The book may have moved to another owner's shard; its home shard knows where
+                moved = DBManager.fetch_one("SELECT shard FROM book_locations WHERE book_id = ?", (book_id,))
+                if moved is not None:
+                    with shards.use(moved[0]):
+                        row = DBManager.fetch_one(
+                            "SELECT book_id, title, author, isbn, owner_id FROM books WHERE book_id = ?",
+                            (book_id,)
+                        )
+        if row is not None:
+            Book._rows.put(book_id, row, generation)  # Missing books are not cached, so inserts need no invalidation
+        return row
 
     @staticmethod
     def get_owner_id(book_id):
@@ -104,10 +531,93 @@ class Book(BaseModel):
         Returns:
             int or None: The owner ID if found, None otherwise.
         """
-        result = DBManager.fetch_one(
-            "SELECT owner_id FROM books WHERE book_id = ?",
-            (book_id,)
-        )
+        result = Book.get(book_id)
         if result:
-            return result[0]  # Return the owner_id if the query succeeds.
-        return None  # Return None if no matching record is found.
\ No newline at end of file
+            return result[4]  # Return the owner_id if the book exists.
+        return None  # Return None if no matching record is found.
+
+    @staticmethod
+    def invalidate(*book_ids):
+        """
+        Drop cached data for books that were deleted or changed (e.g. transferred to a new owner).
+
+        Removes the books' rows and every cached search result that lists one of them. Call this
+        after the change has been committed.
+
+        Args:
+            *book_ids (int): IDs of the changed books.
+        """
+        changed = {int(book_id) for book_id in book_ids}
+        for book_id in changed:
+            Book._rows.invalidate(book_id)
+        Book._searches.invalidate_where(lambda key, rows: any(row[0] in changed for row in rows))
+
+    @staticmethod
+    def invalidate_searches():
+        """
+        Drop every cached search result, e.g. after a bulk import.
+        """
+        Book._searches.clear()
+
+    @staticmethod
+    def clear_caches():
+        """
+        Drop every cached book row and search result.
+        """
+        Book._rows.clear()
+        Book._searches.clear()
+
+    @staticmethod
+    def cache_stats():
+        """
+        Returns:
+            list: `LRUCache.stats()` of the book and search caches.
+        """
+        return [Book._rows.stats(), Book._searches.stats()]
+
+    @staticmethod
+    def _invalidate_new_book(book_id, title, author, isbn, isbn13=None):
+        """
+        Drop the cached search results a newly inserted book can appear in: those whose terms it
+        matches. A keyset page is only affected if the book's ID falls in its range (after the
+        page's `after_id`, and before its last row unless the page was not full). IDs are not
+        handed out in order across shards, so a new book can land on any page.
+        """
+        tokens = Book._tokens(f"{title} {author} {isbn} {isbn13 or ''}")
+
+        def affected(key, rows):
+            terms = key[1]
+            if key[0] == "fuzzy":
+                return Book._similarity(terms, tokens) >= Book.FUZZY_MIN_SIMILARITY
+            if not Book._could_match(terms, tokens):
+                return False
+            if key[0] == "page":
+                after_id, limit = key[2], key[3]
+                return book_id > after_id and (len(rows) < limit or book_id < rows[-1][0])
+            return True
+
+        Book._searches.invalidate_where(affected)
+
+    @staticmethod
+    def _tokens(text):
+        """
+        Split text into words the way the FTS5 unicode61 tokenizer does (case- and accent-folded).
+        """
+        folded = "".join(
+            c for c in unicodedata.normalize("NFKD", (text or "").lower()) if not unicodedata.combining(c)
+        )
+        return re.findall(r"[^\W_]+", folded)
+
+    @staticmethod
+    def _could_match(terms, tokens):
+        """
+        Returns:
+            bool: False only if the book's tokens certainly do not match every prefix term.
+        """
+        for term in terms:
+            parts = Book._tokens(term)
+            if len(parts) != 1:
+                return True  # Terms FTS5 splits into phrases are not modelled; assume a match
+            if not any(token.startswith(parts[0]) for token in tokens):
+                return False
+        return True
\ No newline at end of file
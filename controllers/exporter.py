@@ -0,0 +1,398 @@
+import csv
+import heapq
+import json
+import os
+import time
+from itertools import islice
+from controllers.book import Book
+from controllers.request import Request
+from models.database import DBManager
+
+
+class ExportReport:
+    """
+    Outcome of an export.
+
+    Attributes:
+        - dataset (str): The exported dataset.
+        - rows (int): Number of rows written.
+        - bytes (int or None): Size of the output file, or None when writing to a stream.
+        - elapsed (float): Wall-clock seconds spent exporting.
+        - since (int or None): The `since` time of an incremental export (None for a full export).
+        - started_at (int): Unix time the export started.
+        - last_change (int or None): The latest change time (`updated_at`, or `resolved_at` for
+          `request_history`) among the rows written; None if no row was written.
+        - overlap (int): Seconds the next incremental export reaches back before `last_change`.
+    """
+
+    def __init__(self, dataset, since=None, overlap=0):
+        self.dataset = dataset
+        self.since = since
+        self.overlap = overlap
+        self.rows = 0
+        self.bytes = None
+        self.elapsed = 0.0
+        self.started_at = int(time.time())
+        self.last_change = None
+
+    @property
+    def next_since(self):
+        """
+        Returns:
+            int or None: The `since` to pass to the next incremental export: `overlap` seconds before
+                         the latest change written, or the same `since` again if nothing was written.
+        """
+        if self.last_change is None:
+            return self.since
+        return max(self.last_change - self.overlap, self.since or 0)
+
+    @property
+    def rows_per_second(self):
+        """
+        Returns:
+            float: Export throughput in rows.
+        """
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self):
+        """
+        Returns:
+            float or None: Export throughput in bytes, if the output size is known.
+        """
+        if self.bytes is None:
+            return None
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class Exporter:
+    """
+    Streams tables and the joined listings to CSV or JSONL in constant memory.
+
+    Rows are read with `DBManager.iter_rows` (`fetchmany` chunks of `chunk_size` rows) and written
+    one chunk at a time through an output buffer of `buffer_size` bytes, so memory use does not
+    grow with the size of the export. In sharded mode every shard is streamed and the streams are
+    merged in order, which holds one chunk per shard. Each shard's rows come from a single read
+    snapshot, held until the export finishes.
+
+    Datasets:
+        - users: `user_id, username, updated_at` (password hashes are never exported).
+        - books: `book_id, title, author, isbn, owner_id, updated_at`.
+        - requests: `request_id, book_id, requester_id, owner_id, status, resolved_at, updated_at`.
+        - request_history: archived requests (see `Request.archive_resolved`),
+          `request_id, book_id, requester_id, owner_id, status, resolved_at`.
+        - catalog: books with their owner's username, as listed by `Book.search`.
+        - request_details: requests with the book and requester, as listed by `Request.view_requests`,
+          plus the owner and timestamps; all statuses, not only pending ones.
+
+    Incremental exports (`since`) only write rows inserted or changed at or after that Unix time,
+    in change order, using the `updated_at` columns (see migration 11); for `request_history`
+    they select the requests resolved since then. Deleted rows are not reported, so consumers that
+    must see deletions should reconcile with a periodic full export.
+
+    A row's change time is taken when its statement runs, not when its transaction commits, so a
+    row committed after an export may carry an earlier time than rows that export wrote. The next
+    `since` (`ExportReport.next_since`) therefore reaches `overlap` seconds
+    (`BOOKMATE_EXPORT_OVERLAP`, default 60) back from the latest change written. Rows in that
+    window are written again; consumers apply rows by their ID (the first column), so repeats
+    simply overwrite.
+    """
+
+    overlap = int(os.environ.get("BOOKMATE_EXPORT_OVERLAP", 60))
+
+    DATASETS = {
+        "users": ("user_id", "username", "updated_at"),
+        "books": ("book_id", "title", "author", "isbn", "owner_id", "updated_at"),
+        "requests": ("request_id", "book_id", "requester_id", "owner_id", "status", "resolved_at", "updated_at"),
+        "request_history": ("request_id", "book_id", "requester_id", "owner_id", "status", "resolved_at"),
+        "catalog": ("book_id", "title", "author", "isbn", "owner", "updated_at"),
+        "request_details": (
+            "request_id", "book_id", "title", "author", "requester_id", "requester", "status",
+            "owner_id", "resolved_at", "updated_at",
+        ),
+    }
+    FORMATS = ("csv", "jsonl")
+
+    def __init__(self, chunk_size=1000, buffer_size=1 << 20, progress=None):
+        """
+        Initialize a new `Exporter`.
+
+        Args:
+            chunk_size (int): Number of rows fetched from SQLite (and written) at a time.
+            buffer_size (int): Size in bytes of the output file buffer.
+            progress (callable, optional): Called with the running `ExportReport` after every chunk.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+        self.progress = progress
+
+    def export_file(self, dataset, path, file_format=None, since=None):
+        """
+        Export a dataset to a file.
+
+        Args:
+            dataset (str): One of `DATASETS`.
+            path (str): The output file, overwritten if it exists.
+            file_format (str, optional): "csv" or "jsonl". Guessed from the file extension if omitted.
+            since (int, optional): Only export rows changed at or after this Unix time.
+
+        Returns:
+            ExportReport: Row count, output size and throughput.
+        """
+        file_format = file_format or self.detect_format(path)
+        with open(path, "w", newline="", encoding="utf-8", buffering=self.buffer_size) as out:
+            report = self.export(dataset, out, file_format, since)
+        report.bytes = os.path.getsize(path)
+        return report
+
+    def export(self, dataset, out, file_format, since=None):
+        """
+        Export a dataset to an open text stream (e.g. `sys.stdout`).
+
+        Args:
+            dataset (str): One of `DATASETS`.
+            out (file): The stream to write to; CSV output expects it to be opened with `newline=""`.
+            file_format (str): "csv" or "jsonl".
+            since (int, optional): Only export rows changed at or after this Unix time.
+
+        Returns:
+            ExportReport: Row count and throughput (`bytes` is None).
+        """
+        if file_format not in self.FORMATS:
+            raise ValueError(f"Unknown export format: {file_format}")
+        columns = self.columns(dataset)
+        report = ExportReport(dataset, since, self.overlap)
+        started = time.perf_counter()
+
+        if file_format == "csv":
+            writer = csv.writer(out)
+            writer.writerow(columns)
+            write_chunk = writer.writerows
+        else:
+            def write_chunk(chunk):
+                out.write("".join(json.dumps(dict(zip(columns, row))) + "\n" for row in chunk))
+
+        rows = self.iter_rows(dataset, since)
+        try:
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                write_chunk(chunk)
+                report.rows += len(chunk)
+                latest = max((row[-1] for row in chunk if row[-1] is not None), default=None)  # Change time is last
+                if latest is not None and (report.last_change is None or latest > report.last_change):
+                    report.last_change = latest
+                report.elapsed = time.perf_counter() - started
+                if self.progress:
+                    self.progress(report)
+        finally:
+            rows.close()  # Releases the read snapshots if writing failed
+        out.flush()
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def iter_rows(self, dataset, since=None):
+        """
+        Stream the rows of a dataset, merged across shards.
+
+        Args:
+            dataset (str): One of `DATASETS`.
+            since (int, optional): Only yield rows changed at or after this Unix time.
+
+        Yields:
+            tuple: One row at a time, with the dataset's `columns`. Full exports are ordered by ID,
+                   incremental ones by change time and ID.
+        """
+        self.columns(dataset)  # Validates the name before any query runs
+        query = getattr(self, f"_query_{dataset}")
+        shards = DBManager.get_shards()
+        streams = []
+        for index in range(shards.count):
+            with shards.use(index):  # iter_rows binds the shard's connection when called
+                streams.append(query(since))
+        if since is None:
+            merged = heapq.merge(*streams)
+        else:
+            merged = heapq.merge(*streams, key=lambda row: (row[-1], row[0]))  # The change time is last
+
+        fill = self._fill_request_details if dataset == "request_details" and shards.count > 1 else None
+        try:
+            if fill is None:
+                yield from merged
+                return
+            while True:
+                chunk = list(islice(merged, self.chunk_size))
+                if not chunk:
+                    return
+                yield from fill(chunk)
+        finally:
+            for stream in streams:
+                stream.close()
+
+    @classmethod
+    def columns(cls, dataset):
+        """
+        Args:
+            dataset (str): One of `DATASETS`.
+
+        Returns:
+            tuple: The dataset's column names.
+        """
+        try:
+            return cls.DATASETS[dataset]
+        except KeyError:
+            raise ValueError(f"Unknown dataset: {dataset}") from None
+
+    @staticmethod
+    def detect_format(path):
+        """
+        Args:
+            path (str): Path of the export file.
+
+        Returns:
+            str: "csv" for `.csv` files, otherwise "jsonl".
+        """
+        return "csv" if os.path.splitext(path)[1].lower() == ".csv" else "jsonl"
+
+    def _query_users(self, since):
+        if since is None:
+            return DBManager.iter_rows(
+                """SELECT user_id, username, updated_at FROM users ORDER BY user_id
+                   -- allow-scan: a full export reads every row
+                """,
+                chunk_size=self.chunk_size,
+            )
+        return DBManager.iter_rows(
+            """SELECT user_id, username, updated_at FROM users
+               WHERE updated_at >= ? ORDER BY updated_at, user_id
+            """,
+            (since,),
+            chunk_size=self.chunk_size,
+        )
+
+    def _query_books(self, since):
+        if since is None:
+            return DBManager.iter_rows(
+                """SELECT book_id, title, author, isbn, owner_id, updated_at FROM books ORDER BY book_id
+                   -- allow-scan: a full export reads every row
+                """,
+                chunk_size=self.chunk_size,
+            )
+        return DBManager.iter_rows(
+            """SELECT book_id, title, author, isbn, owner_id, updated_at FROM books
+               WHERE updated_at >= ? ORDER BY updated_at, book_id
+            """,
+            (since,),
+            chunk_size=self.chunk_size,
+        )
+
+    def _query_requests(self, since):
+        if since is None:
+            return DBManager.iter_rows(
+                """SELECT request_id, book_id, requester_id, owner_id, status, resolved_at, updated_at
+                   FROM requests ORDER BY request_id
+                   -- allow-scan: a full export reads every row
+                """,
+                chunk_size=self.chunk_size,
+            )
+        return DBManager.iter_rows(
+            """SELECT request_id, book_id, requester_id, owner_id, status, resolved_at, updated_at
+               FROM requests WHERE updated_at >= ? ORDER BY updated_at, request_id
+            """,
+            (since,),
+            chunk_size=self.chunk_size,
+        )
+
+    def _query_request_history(self, since):
+        if since is None:
+            return DBManager.iter_rows(
+                """SELECT request_id, book_id, requester_id, owner_id, status, resolved_at
+                   FROM requests_history ORDER BY request_id
+                   -- allow-scan: a full export reads every row
+                """,
+                chunk_size=self.chunk_size,
+            )
+        return DBManager.iter_rows(
+            """SELECT request_id, book_id, requester_id, owner_id, status, resolved_at
+               FROM requests_history WHERE resolved_at >= ? ORDER BY resolved_at, request_id
+            """,
+            (since,),
+            chunk_size=self.chunk_size,
+        )
+
+    def _query_catalog(self, since):
+        if since is None:
+            return DBManager.iter_rows(
+                """SELECT books.book_id, books.title, books.author, books.isbn, users.username, books.updated_at
+                   FROM books
+                   LEFT JOIN users ON books.owner_id = users.user_id
+                   ORDER BY books.book_id
+                   -- allow-scan: a full export reads every row
+                """,
+                chunk_size=self.chunk_size,
+            )
+        return DBManager.iter_rows(
+            """SELECT books.book_id, books.title, books.author, books.isbn, users.username, books.updated_at
+               FROM books
+               LEFT JOIN users ON books.owner_id = users.user_id
+               WHERE books.updated_at >= ?
+               ORDER BY books.updated_at, books.book_id
+            """,
+            (since,),
+            chunk_size=self.chunk_size,
+        )
+
+    def _query_request_details(self, since):
+        if since is None:
+            return DBManager.iter_rows(
+                """SELECT requests.request_id, requests.book_id, books.title, books.author,
+                          requests.requester_id, users.username, requests.status,
+                          requests.owner_id, requests.resolved_at, requests.updated_at
+                   FROM requests
+                   LEFT JOIN books ON requests.book_id = books.book_id
+                   LEFT JOIN users ON requests.requester_id = users.user_id
+                   ORDER BY requests.request_id
+                   -- allow-scan: a full export reads every row
+                """,
+                chunk_size=self.chunk_size,
+            )
+        return DBManager.iter_rows(
+            """SELECT requests.request_id, requests.book_id, books.title, books.author,
+                      requests.requester_id, users.username, requests.status,
+                      requests.owner_id, requests.resolved_at, requests.updated_at
+               FROM requests
+               LEFT JOIN books ON requests.book_id = books.book_id
+               LEFT JOIN users ON requests.requester_id = users.user_id
+               WHERE requests.updated_at >= ?
+               ORDER BY requests.updated_at, requests.request_id
+            """,
+            (since,),
+            chunk_size=self.chunk_size,
+        )
+
+    @staticmethod
+    def _fill_request_details(rows):
+        """
+        Complete request details the per-shard join left empty.
+
+        In sharded mode the requester may live on another shard than the owner, and an accepted
+        request's book moves to the requester's shard; both are looked up where they live.
+
+        Args:
+            rows (list): One chunk of `request_details` rows.
+
+        Returns:
+            list: The same rows with the book and requester filled in.
+        """
+        rows = Request._fill_requester_names(rows)
+        filled = []
+        for row in rows:
+            if row[2] is None:
+                book = Book.get(row[1])
+                if book is not None:
+                    row = row[:2] + book[1:3] + row[4:]
+            filled.append(row)
+        return filled
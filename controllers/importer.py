@@ -0,0 +1,260 @@
+import csv
+import json
+import os
+import time
+from controllers.book import Book
+from models.database import DBManager
+from models.isbn import normalize_isbn
+
+
+class ImportReport:
+    """
+    Outcome of a bulk book import.
+
+    Attributes:
+        - inserted (int): Number of books written to the database.
+        - failures (list): One `(row_number, isbn, reason)` tuple per rejected row.
+        - elapsed (float): Wall-clock seconds spent importing.
+    """
+
+    def __init__(self):
+        self.inserted = 0
+        self.failures = []
+        self.elapsed = 0.0
+
+    @property
+    def processed(self):
+        """
+        Returns:
+            int: Number of rows read, whether inserted or rejected.
+        """
+        return self.inserted + len(self.failures)
+
+    @property
+    def rows_per_second(self):
+        """
+        Returns:
+            float: Import throughput over all processed rows.
+        """
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class BookImporter:
+    """
+    Streams books from CSV or JSONL into the `books` table in batches.
+
+    Rows are read lazily, validated, and inserted with `executemany`, one transaction per batch,
+    so a large catalog costs one commit per `batch_size` rows instead of one per book. Rows that
+    are invalid or whose ISBN already exists (in the database or earlier in the same file) are
+    recorded in the report and skipped without aborting the rest of their batch.
+
+    Expected fields: `title`, `author`, `isbn` and, optionally, `owner_id` (defaults to the
+    importer's `owner_id`).
+    """
+
+    REQUIRED_FIELDS = ("title", "author", "isbn")
+    LOOKUP_CHUNK = 400  # Max ISBNs per `IN (...)` lookup (bound twice), below SQLite's variable limit
+
+    def __init__(self, owner_id, batch_size=1000, progress=None):
+        """
+        Initialize a new `BookImporter`.
+
+        Args:
+            owner_id (int): Owner assigned to rows that do not name one.
+            batch_size (int): Number of rows inserted per transaction.
+            progress (callable, optional): Called with the running `ImportReport` after every batch.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.owner_id = owner_id
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def import_file(self, path, file_format=None):
+        """
+        Import books from a CSV (with a header row) or JSONL file.
+
+        Args:
+            path (str): Path of the file to import.
+            file_format (str, optional): "csv" or "jsonl". Guessed from the file extension if omitted.
+
+        Returns:
+            ImportReport: Counts, per-row failures and throughput.
+        """
+        file_format = file_format or self.detect_format(path)
+        with open(path, newline="", encoding="utf-8") as source:
+            if file_format == "csv":
+                return self.import_rows(self.read_csv(source))
+            return self.import_rows(self.read_jsonl(source))
+
+    def import_rows(self, rows):
+        """
+        Import books from an iterable of `(row_number, row)` pairs.
+
+        `row` is a dict of fields, or an exception instance for a line that could not be parsed.
+
+        Args:
+            rows (iterable): The rows to import; consumed lazily, one batch at a time.
+
+        Returns:
+            ImportReport: Counts, per-row failures and throughput.
+        """
+        report = ImportReport()
+        started = time.perf_counter()
+        batch = []
+        for row_number, row in rows:
+            book = self._validate(row_number, row, report)
+            if book is not None:
+                batch.append((row_number, book))
+            if len(batch) >= self.batch_size:
+                self._insert_batch(batch, report)
+                batch = []
+                report.elapsed = time.perf_counter() - started
+                if self.progress:
+                    self.progress(report)
+        if batch:
+            self._insert_batch(batch, report)
+        report.elapsed = time.perf_counter() - started
+        if self.progress:
+            self.progress(report)
+        return report
+
+    @staticmethod
+    def detect_format(path):
+        """
+        Args:
+            path (str): Path of the import file.
+
+        Returns:
+            str: "csv" for `.csv` files, otherwise "jsonl".
+        """
+        return "csv" if os.path.splitext(path)[1].lower() == ".csv" else "jsonl"
+
+    @staticmethod
+    def read_csv(source):
+        """
+        Yield `(row_number, row)` pairs from a CSV file with a header row.
+
+        Args:
+            source (file): An open text file.
+        """
+        for row_number, row in enumerate(csv.DictReader(source), start=2):  # Row 1 is the header
+            yield row_number, row
+
+    @staticmethod
+    def read_jsonl(source):
+        """
+        Yield `(row_number, row)` pairs from a JSON-lines file. Blank lines are skipped.
+
+        Args:
+            source (file): An open text file.
+        """
+        for row_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row_number, json.loads(line)
+            except ValueError as e:
+                yield row_number, e
+
+    def _validate(self, row_number, row, report):
+        """
+        Check one row and convert it to the `(title, author, isbn, owner_id, isbn13)` insert tuple.
+
+        Returns:
+            tuple or None: The insert parameters, or None if the row was rejected (and recorded in the report).
+        """
+        if isinstance(row, Exception):
+            report.failures.append((row_number, None, f"unreadable row: {row}"))
+            return None
+        if not isinstance(row, dict):
+            report.failures.append((row_number, None, "row is not an object"))
+            return None
+
+        values = {}
+        for field in self.REQUIRED_FIELDS:
+            value = row.get(field)
+            value = str(value).strip() if value is not None else ""
+            if not value:
+                report.failures.append((row_number, row.get("isbn"), f"missing {field}"))
+                return None
+            values[field] = value
+
+        owner_id = row.get("owner_id") or self.owner_id
+        try:
+            owner_id = int(owner_id)
+            DBManager.get_shards().shard_of_id(owner_id)  # Rejects IDs outside every shard's range
+        except (TypeError, ValueError):
+            report.failures.append((row_number, values["isbn"], f"invalid owner_id: {owner_id!r}"))
+            return None
+
+        return values["title"], values["author"], values["isbn"], owner_id, normalize_isbn(values["isbn"])
+
+    def _insert_batch(self, batch, report):
+        """
+        Insert one batch, with one transaction per shard the batch's owners live on.
+        """
+        shards = DBManager.get_shards()
+        by_shard = {}
+        for row_number, book in batch:
+            by_shard.setdefault(shards.shard_of_id(book[3]), []).append((row_number, book))
+        for index, group in by_shard.items():
+            with shards.use(index):  # Books live on their owner's shard
+                self._insert_shard_batch(group, report)
+
+    def _insert_shard_batch(self, batch, report):
+        """
+        Insert books owned by users of the current shard in a single transaction, skipping rows
+        whose ISBN is already taken.
+
+        Like `Book.save`, the ISBNs are looked up on every shard, in both `books` and the
+        `book_transfers` outbox, since the unique indexes only cover one shard. The write lock is
+        held for the whole transaction, so no other writer on this shard can claim an ISBN between
+        the uniqueness lookup and the insert.
+        """
+        shards = DBManager.get_shards()
+        with DBManager.transaction() as conn:
+            # Runs inline on each shard inside the transaction, so this shard's lookup sees it
+            taken = set().union(*shards.scatter(self._existing, "isbn", [book[2] for _, book in batch]))
+            taken13 = set().union(*shards.scatter(self._existing, "isbn13", [book[4] for _, book in batch if book[4]]))
+            rows = []
+            for row_number, book in batch:
+                isbn, isbn13 = book[2], book[4]
+                if isbn in taken or (isbn13 and isbn13 in taken13):
+                    report.failures.append((row_number, isbn, "duplicate isbn"))
+                    continue
+                # Also rejects repeats (in any format) later in the same file
+                taken.add(isbn)
+                if isbn13:
+                    taken13.add(isbn13)
+                rows.append(book)
+            conn.executemany(
+                "INSERT INTO books (title, author, isbn, owner_id, isbn13) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        report.inserted += len(rows)
+        if rows:
+            Book.invalidate_searches()
+
+    def _existing(self, column, values):
+        """
+        Args:
+            column (str): "isbn" or "isbn13" (both uniquely indexed in `books`).
+            values (list): The values to look up.
+
+        Returns:
+            set: The subset of `values` already present in that column of the current shard's
+            `books` table or `book_transfers` outbox.
+        """
+        found = set()
+        for start in range(0, len(values), self.LOOKUP_CHUNK):
+            chunk = values[start:start + self.LOOKUP_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            found.update(row[0] for row in DBManager.fetch_all(
+                f"""SELECT {column} FROM books WHERE {column} IN ({placeholders})
+                    UNION ALL
+                    SELECT {column} FROM book_transfers WHERE {column} IN ({placeholders}) -- allow-scan: the outbox only holds in-flight transfers
+                """,
+                chunk + chunk,
+            ))
+        return found
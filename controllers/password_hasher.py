@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import bcrypt
+
+
+def _hash_password(password, rounds):
+    """Hash a password with bcrypt. Module-level so it can run in a worker process."""
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds))
+
+
+def _check_password(password, hashed):
+    """Check a password against a bcrypt hash. Module-level so it can run in a worker process."""
+    return bcrypt.checkpw(password.encode("utf-8"), hashed)
+
+
+class PasswordHasher:
+    """
+    Password hashing service running bcrypt on a pool of worker processes.
+
+    bcrypt is deliberately CPU-heavy (tens to hundreds of milliseconds per call), so hashing and
+    checking run on a process pool: concurrent logins and signups spread across all cores and
+    never hold up the calling process's other threads. The cost factor and pool size are
+    configurable through `configure()` or the environment variables `BOOKMATE_BCRYPT_ROUNDS`
+    (default 12) and `BOOKMATE_HASH_WORKERS` (default: number of CPUs; 0 hashes inline).
+    """
+    rounds = int(os.environ.get("BOOKMATE_BCRYPT_ROUNDS", 12))
+    workers = int(os.environ.get("BOOKMATE_HASH_WORKERS", os.cpu_count() or 1))
+
+    _executor = None  # Process pool, created on first use
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, rounds=None, workers=None):
+        """
+        Change the bcrypt cost factor and/or the number of worker processes.
+
+        Args:
+            rounds (int, optional): bcrypt cost factor (4-31); each step doubles the work.
+            workers (int, optional): Worker processes; 0 runs bcrypt in the calling thread.
+        """
+        if rounds is not None:
+            if not 4 <= rounds <= 31:
+                raise ValueError("bcrypt rounds must be between 4 and 31")
+            cls.rounds = rounds
+        if workers is not None:
+            cls.shutdown()
+            cls.workers = workers
+
+    @classmethod
+    def _submit(cls, func, *args):
+        """
+        Run `func` on the process pool (or inline when `workers` is 0).
+
+        Returns:
+            concurrent.futures.Future: Resolves to the function's result.
+        """
+        if cls.workers <= 0:
+            future = Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        with cls._lock:
+            if cls._executor is None:
+                # "spawn" keeps workers free of the parent's threads and open SQLite connections.
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=cls.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            executor = cls._executor
+        return executor.submit(func, *args)
+
+    @classmethod
+    def submit_hash(cls, password):
+        """
+        Args:
+            password (str): The plain-text password.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the bcrypt hash (bytes).
+        """
+        return cls._submit(_hash_password, password, cls.rounds)
+
+    @classmethod
+    def submit_check(cls, password, hashed):
+        """
+        Args:
+            password (str): The plain-text password.
+            hashed (bytes): The stored bcrypt hash.
+
+        Returns:
+            concurrent.futures.Future: Resolves to True if the password matches.
+        """
+        return cls._submit(_check_password, password, hashed)
+
+    @classmethod
+    def hash(cls, password):
+        """
+        Hash a password with the configured cost factor, waiting for the result.
+
+        Returns:
+            bytes: The bcrypt hash.
+        """
+        return cls.submit_hash(password).result()
+
+    @classmethod
+    def check(cls, password, hashed):
+        """
+        Check a password against a stored hash, waiting for the result.
+
+        Returns:
+            bool: True if the password matches.
+        """
+        return cls.submit_check(password, hashed).result()
+
+    @classmethod
+    def needs_rehash(cls, hashed):
+        """
+        Args:
+            hashed (bytes): A stored bcrypt hash.
+
+        Returns:
+            bool: True if the hash was made with a lower cost factor than the configured one (or is
+                  not a bcrypt hash). Stronger hashes are kept, so lowering the setting never
+                  weakens stored passwords.
+        """
+        try:
+            return int(hashed.split(b"$")[2]) < cls.rounds
+        except (IndexError, ValueError):
+            return True
+
+    @classmethod
+    def shutdown(cls):
+        """
+        Stop the worker processes. A new pool is started on the next hash or check.
+        """
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
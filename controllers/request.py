@@ -1,5 +1,9 @@
+import os
+import threading
+import time
 from controllers.base import BaseModel
 from models.database import DBManager
+from models.workload import WorkloadRecorder
 from controllers.book import Book
 
 
@@ -13,7 +17,16 @@ class Request(BaseModel):
         - requester_id (int): The ID of the user making the request.
         - owner_id (int): The ID of the user who currently owns the book.
         - status (str): The status of the request (e.g., "Pending", "Accepted").
+
+    In sharded mode a request is stored on the shard of the book's owner, next to the book.
     """
+    MAX_ID = 2 ** 63 - 1  # Largest SQLite rowid; upper bound for the first keyset page
+    EVENT_POLL_INTERVAL = 0.5  # Seconds between checks for events written by other processes
+    # Seconds resolved requests stay in `requests` before `archive_resolved` moves them to the history
+    retention = int(os.environ.get("BOOKMATE_REQUEST_RETENTION", 30 * 24 * 60 * 60))
+
+    _events_changed = threading.Condition()  # Notified when this process writes request events
+    _event_writes = 0
 
     def __init__(self, book_id, requester_id, owner_id=None):
         """
@@ -30,6 +43,7 @@ class Request(BaseModel):
         self.owner_id = owner_id
         self.status = "Pending"  # Set default status to 'Pending'
 
+    @WorkloadRecorder.operation("Request.save", capture=lambda request: [request.book_id, request.requester_id])
     def save(self):
         """
         Save the request to the database, automatically setting the owner_id from the `books` table.
@@ -38,8 +52,11 @@ class Request(BaseModel):
         1. Fetches the owner_id for the given book from the `books` table.
         2. If the owner_id is found, inserts the request into the `requests` table.
 
+        Saving is idempotent: if the requester already has a pending request for the book, no
+        duplicate is created and `request_id` is set to the existing request.
+
         Returns:
-            bool: True if the request was successfully saved, False otherwise.
+            bool: True if the request was saved (or was already pending), False otherwise.
         """
         # Step 1: Fetch the owner_id from the books table based on the book_id
         self.owner_id = Book.get_owner_id(self.book_id)
@@ -48,14 +65,31 @@ class Request(BaseModel):
         if self.owner_id is None:
             return False
 
-        # Step 3: Insert the request into the requests table
-        if DBManager.execute_query(
-                "INSERT INTO requests (book_id, requester_id, owner_id) VALUES (?, ?, ?)",
-                (self.book_id, self.requester_id, self.owner_id),
-        ):
-            return True  # Return True if insertion is successful
-        else:
-            return False  # Return False if insertion fails
+        # Step 3: Insert the request into the requests table, on the owner's shard (where the book is),
+        # unless the book was deleted or changed hands since its owner was looked up. Foreign keys
+        # are not enforced, so the statement checks this itself.
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(self.owner_id)):
+            result = DBManager.execute_query(
+                """INSERT INTO requests (book_id, requester_id, owner_id)
+                   SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM books WHERE book_id = ? AND owner_id = ?)
+                   ON CONFLICT (book_id, requester_id) WHERE status = 'Pending' DO NOTHING
+                """,
+                (self.book_id, self.requester_id, self.owner_id, self.book_id, self.owner_id),
+            )
+            if not result.rowcount:
+                # Already pending (unique index idx_requests_pending_once): reuse that request
+                existing = DBManager.fetch_one(
+                    "SELECT request_id FROM requests WHERE book_id = ? AND requester_id = ? AND status = 'Pending'",
+                    (self.book_id, self.requester_id),
+                )
+                if existing is None:
+                    return False  # The book is gone, or the request was resolved in the meantime
+                self.request_id = existing[0]
+                return True
+        self.request_id = result.lastrowid
+        Request._notify_events()
+        return True  # Return True if insertion is successful
 
     def delete(self):
         """
@@ -67,6 +101,7 @@ class Request(BaseModel):
         raise NotImplementedError("Requests cannot be deleted.")
 
     @staticmethod
+    @WorkloadRecorder.operation("Request.view_requests")
     def view_requests(owner_id):
         """
         View all pending requests for a specific owner.
@@ -79,54 +114,429 @@ class Request(BaseModel):
         Returns:
             list: A list of dictionaries containing the details of each pending request.
         """
-        return DBManager.fetch_all(
-            """SELECT
-                        requests.request_id,
-                        books.book_id, books.title, books.author,
-                        users.user_id, users.username,
-                        requests.status
-                    FROM requests
-                    LEFT JOIN books ON requests.book_id = books.book_id
-                    LEFT JOIN users ON requests.requester_id = users.user_id
-                    WHERE requests.owner_id = ? AND requests.status = 'Pending'
-                    ORDER BY requests.request_id DESC
-                    """,
-            (owner_id,)  # Filter by owner_id and only 'Pending' requests
-        )
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(owner_id)):
+            rows = DBManager.fetch_all(
+                """SELECT
+                            requests.request_id,
+                            books.book_id, books.title, books.author,
+                            requests.requester_id, users.username,
+                            requests.status
+                        FROM requests
+                        LEFT JOIN books ON requests.book_id = books.book_id
+                        LEFT JOIN users ON requests.requester_id = users.user_id
+                        WHERE requests.owner_id = ? AND requests.status = 'Pending'
+                        ORDER BY requests.request_id DESC
+                        """,
+                (owner_id,)  # Filter by owner_id and only 'Pending' requests
+            )
+        return Request._fill_requester_names(rows)
 
     @staticmethod
-    def update_request_status(request_id, status):
+    @WorkloadRecorder.operation("Request.view_requests_page")
+    def view_requests_page(owner_id, before_id=None, limit=50):
         """
-        Update the status of a request and, if the status is 'Accepted', update the book owner.
+        Fetch one page of pending requests for an owner using keyset pagination.
 
-        This method performs the following steps:
+        Requests are returned newest first, like `view_requests`; each page continues below the
+        last `request_id` of the previous page.
+
+        Args:
+            owner_id (int): The ID of the owner whose requests are to be viewed.
+            before_id (int, optional): The last `request_id` of the previous page (None for the first page).
+            limit (int): Maximum number of requests on the page.
+
+        Returns:
+            list: Up to `limit` requests, in the same format as `view_requests`.
+        """
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(owner_id)):
+            rows = DBManager.fetch_all(
+                """SELECT
+                            requests.request_id,
+                            books.book_id, books.title, books.author,
+                            requests.requester_id, users.username,
+                            requests.status
+                        FROM requests
+                        LEFT JOIN books ON requests.book_id = books.book_id
+                        LEFT JOIN users ON requests.requester_id = users.user_id
+                        WHERE requests.owner_id = ? AND requests.status = 'Pending' AND requests.request_id < ?
+                        ORDER BY requests.request_id DESC
+                        LIMIT ?
+                        """,
+                (owner_id, Request.MAX_ID if before_id is None else before_id, limit)
+            )
+        return Request._fill_requester_names(rows)
+
+    @staticmethod
+    @WorkloadRecorder.operation("Request.iter_requests")
+    def iter_requests(owner_id, page_size=50):
+        """
+        Stream the pending requests for an owner page by page, newest first.
+
+        Args:
+            owner_id (int): The ID of the owner whose requests are to be viewed.
+            page_size (int): Number of requests fetched from the database at a time.
+
+        Yields:
+            tuple: One request at a time, in the same format as `view_requests`.
+        """
+        before_id = None
+        while True:
+            page = Request.view_requests_page(owner_id, before_id, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            before_id = page[-1][0]
+
+    @staticmethod
+    def update_request_status(request_id, status, owner_id=None):
+        """
+        Resolve a pending request and, if the status is 'Accepted', transfer the book to the requester.
+
+        Everything happens in one transaction:
         1. If the status is "Accepted", the book's owner is updated to the requester.
         2. The status of the request is updated in the `requests` table.
+        3. On acceptance, every other pending request for the same book is rejected in one statement.
 
         Args:
             request_id (int): The ID of the request to be updated.
-            status (str): The new status for the request (e.g., "Accepted", "Rejected").
+            status (str): The new status for the request ("Accepted" or "Rejected").
+            owner_id (int, optional): If given, the request is only resolved if it was made to this owner.
 
         Returns:
-            None
+            str or None: The status the request was resolved with ("Rejected" if it was accepted but the
+                         book had been deleted or had changed hands), or None if it was not found or no
+                         longer pending.
+        """
+        return Request.update_request_statuses([(request_id, status)], owner_id)[0]
+
+    @staticmethod
+    @WorkloadRecorder.operation("Request.update_request_statuses")
+    def update_request_statuses(decisions, owner_id=None):
         """
-        # Fetch the book_id and requester_id for the request to be updated
-        request = DBManager.fetch_one(
-            "SELECT book_id, requester_id FROM requests WHERE request_id = ?",
-            (request_id,)  # Get details for the specific request_id
+        Resolve many requests in a single transaction (and a single commit).
+
+        Decisions are applied in order. A decision whose request is no longer pending when its turn
+        comes (e.g. because an earlier acceptance in the same batch rejected it as a competing
+        request for the same book) is skipped.
+
+        In sharded mode the decisions are grouped by the shard their requests live on, with one
+        transaction per shard. A book accepted by a user on another shard is moved to that shard
+        after the transaction has committed; if that shard refuses it (see `ShardSet.apply_transfers`),
+        the acceptance is undone and the request rejected.
+
+        Args:
+            decisions (list): `(request_id, status)` pairs, where status is "Accepted" or "Rejected".
+            owner_id (int, optional): If given, only requests made to this owner are resolved.
+
+        Returns:
+            list: Per decision, the status the request was resolved with, or None if it was not
+                  resolved. An acceptance comes back "Rejected" if the book had been deleted or had
+                  changed hands, or the new owner's shard refused it.
+        """
+        for _, status in decisions:
+            if status not in ("Accepted", "Rejected"):
+                raise ValueError(f"Invalid request status: {status!r}")
+
+        shards = DBManager.get_shards()
+        by_shard = {}  # shard -> [(position in decisions, request_id, status)]
+        results = [None] * len(decisions)
+        for position, (request_id, status) in enumerate(decisions):
+            try:
+                by_shard.setdefault(shards.shard_of_id(request_id), []).append((position, request_id, status))
+            except ValueError:
+                pass  # Not a request ID of any configured shard, so it cannot be pending
+
+        transferred = []
+        for index, group in by_shard.items():
+            with shards.use(index):
+                with DBManager.transaction() as conn:
+                    for position, request_id, status in group:
+                        results[position] = Request._resolve(conn, request_id, status, owner_id, transferred)
+            undone = set(shards.apply_transfers(index))  # Deliver books that moved to another shard
+            for position, request_id, _ in group:
+                if request_id in undone:
+                    results[position] = "Rejected"  # The new owner's shard refused the book; it went back
+        if transferred:
+            Book.invalidate(*transferred)  # Only after commit, so the cache cannot be refilled with old owners
+        if any(results):
+            Request._notify_events()
+        return results
+
+    @staticmethod
+    def _resolve(conn, request_id, status, expected_owner_id=None, transferred=None):
+        """
+        Apply one decision on a connection that is already inside a transaction.
+
+        Args:
+            conn (sqlite3.Connection): The transaction's connection.
+            request_id (int): The ID of the request to resolve.
+            status (str): "Accepted" or "Rejected".
+            expected_owner_id (int, optional): Skip the request unless it was made to this owner.
+            transferred (list, optional): Receives the ID of the book if it changed hands.
+
+        Returns:
+            str or None: The status the request was resolved with ("Rejected" for an acceptance of a
+                         book that was deleted or has changed hands), or None if it was not pending.
+        """
+        # Fetch the book, requester and owner for the request, if it is still pending
+        request = conn.execute(
+            "SELECT book_id, requester_id, owner_id FROM requests WHERE request_id = ? AND status = 'Pending'",
+            (request_id,)
+        ).fetchone()
+        if request is None:
+            return None
+        book_id, requester_id, owner_id = request
+        if expected_owner_id is not None and owner_id != expected_owner_id:
+            return None  # Only the owner the request was made to may resolve it
+
+        if status == "Accepted":
+            # Step 1: Transfer the book, but only if the owner on the request still owns it
+            moved = conn.execute(
+                "UPDATE books SET owner_id = ? WHERE book_id = ? AND owner_id = ?",
+                (requester_id, book_id, owner_id)
+            ).rowcount
+            if not moved:
+                status = "Rejected"  # The book was deleted or has changed hands since the request was made
+            else:
+                if transferred is not None:
+                    transferred.append(book_id)
+                shards = DBManager.get_shards()
+                target = shards.shard_of_id(requester_id)
+                if target != shards.current():
+                    shards.stage_transfer(conn, book_id, target, owner_id, request_id)  # The book follows its new owner
+
+        # Step 2: Update the request status in the requests table
+        resolved_at = int(time.time())
+        conn.execute(
+            "UPDATE requests SET status = ?, resolved_at = ? WHERE request_id = ?",
+            (status, resolved_at, request_id)
         )
-        if request:
-            book_id, requester_id = request
-
-            # Step 2: If status is "Accepted", update the book owner in the books table
-            if status == "Accepted":
-                DBManager.execute_query(
-                    "UPDATE books SET owner_id = ? WHERE book_id = ?",
-                    (requester_id, book_id)  # Update book owner
+
+        # Step 3: The book has a new owner, so every competing request for it is rejected
+        if status == "Accepted":
+            conn.execute(
+                "UPDATE requests SET status = 'Rejected', resolved_at = ? WHERE book_id = ? AND status = 'Pending'",
+                (resolved_at, book_id)
+            )
+        return status
+
+    @staticmethod
+    def archive_resolved(retention=None, batch_size=1000):
+        """
+        Move requests resolved more than `retention` seconds ago from `requests` to `requests_history`.
+
+        Rows are moved oldest first in batches of `batch_size`, each batch in its own short
+        transaction, so the job never holds the write lock for long and can be interrupted at
+        any point. `view_requests` only reads pending rows, but keeping the table and its indexes
+        small keeps every request query and write cheap.
+
+        Args:
+            retention (int, optional): Age in seconds (default: `Request.retention`).
+            batch_size (int): Requests moved per transaction.
+
+        Returns:
+            int: Number of requests archived.
+        """
+        cutoff = int(time.time()) - (Request.retention if retention is None else retention)
+        shards = DBManager.get_shards()
+        archived = 0
+        for index in range(shards.count):
+            with shards.use(index):
+                while True:
+                    with DBManager.transaction() as conn:
+                        rows = conn.execute(
+                            """SELECT request_id, book_id, requester_id, owner_id, status, resolved_at
+                               FROM requests
+                               WHERE resolved_at < ?
+                               ORDER BY resolved_at
+                               LIMIT ?
+                            """,
+                            (cutoff, batch_size),
+                        ).fetchall()
+                        conn.executemany(
+                            """INSERT OR REPLACE INTO requests_history
+                                   (request_id, book_id, requester_id, owner_id, status, resolved_at)
+                               VALUES (?, ?, ?, ?, ?, ?)
+                            """,
+                            rows,
+                        )
+                        conn.executemany("DELETE FROM requests WHERE request_id = ?", [(row[0],) for row in rows])
+                    archived += len(rows)
+                    if len(rows) < batch_size:
+                        break
+        return archived
+
+    @staticmethod
+    def history(owner_id, before_id=None, limit=50):
+        """
+        Fetch one page of an owner's resolved requests, newest first, whether archived or not.
+
+        Args:
+            owner_id (int): The owner the requests were made to.
+            before_id (int, optional): The last `request_id` of the previous page (None for the first page).
+            limit (int): Maximum number of requests on the page.
+
+        Returns:
+            list: `(request_id, book_id, requester_id, status, resolved_at)` tuples.
+        """
+        before_id = Request.MAX_ID if before_id is None else before_id
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(owner_id)):
+            return DBManager.fetch_all(
+                """SELECT request_id, book_id, requester_id, status, resolved_at FROM (
+                       SELECT request_id, book_id, requester_id, status, resolved_at
+                       FROM requests
+                       WHERE owner_id = ? AND status != 'Pending' AND request_id < ?
+                       UNION ALL
+                       SELECT request_id, book_id, requester_id, status, resolved_at
+                       FROM requests_history
+                       WHERE owner_id = ? AND request_id < ?
+                   )
+                   ORDER BY request_id DESC
+                   LIMIT ?
+                """,
+                (owner_id, before_id, owner_id, before_id, limit),
+            )
+
+    @staticmethod
+    def events_since(owner_id, after_event_id=0, limit=100, wait=0):
+        """
+        Fetch the changes to an owner's requests made after a cursor.
+
+        Every new request and every status change appends an event (see migration 8), so a client
+        that keeps the last `event_id` it has seen can poll with a single index range scan instead
+        of re-reading every pending request. With `wait`, the call long-polls: it returns as soon
+        as an event arrives, or with an empty list once `wait` seconds have passed.
+
+        Args:
+            owner_id (int): The owner whose requests are followed.
+            after_event_id (int): The cursor, the last `event_id` already seen (0 for all events).
+            limit (int): Maximum number of events returned.
+            wait (float): Seconds to wait for an event if there is none yet.
+
+        Returns:
+            list: `(event_id, request_id, book_id, requester_id, status, created_at)` tuples, oldest
+                  first. A new request has status 'Pending'.
+        """
+        shards = DBManager.get_shards()
+        deadline = time.monotonic() + wait
+        while True:
+            with Request._events_changed:
+                seen = Request._event_writes
+            with shards.use(shards.shard_of_id(owner_id)):
+                events = DBManager.fetch_all(
+                    """SELECT event_id, request_id, book_id, requester_id, status, created_at
+                       FROM request_events
+                       WHERE owner_id = ? AND event_id > ?
+                       ORDER BY event_id
+                       LIMIT ?
+                    """,
+                    (owner_id, after_event_id, limit),
+                )
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            # Woken early by writes from this process; the timeout also catches other processes' writes
+            with Request._events_changed:
+                Request._events_changed.wait_for(
+                    lambda: Request._event_writes != seen, min(remaining, Request.EVENT_POLL_INTERVAL)
                 )
 
-            # Step 3: Update the request status in the requests table
+    @staticmethod
+    def latest_event_id(owner_id):
+        """
+        Returns:
+            int: The newest `event_id` for an owner's requests (0 if there is none), i.e. the cursor
+                 from which `events_since` returns only future changes.
+        """
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(owner_id)):
+            row = DBManager.fetch_one("SELECT MAX(event_id) FROM request_events WHERE owner_id = ?", (owner_id,))
+        return (row[0] or 0) if row else 0
+
+    @staticmethod
+    def count_new_requests(owner_id):
+        """
+        Count the requests made to an owner since they last viewed their requests (see
+        `mark_events_seen`) that are still pending. Only events after the owner's saved cursor are read.
+
+        Args:
+            owner_id (int): The owner.
+
+        Returns:
+            int: The number of new pending requests.
+        """
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(owner_id)):
+            row = DBManager.fetch_one(
+                """SELECT COUNT(*)
+                   FROM request_events
+                   JOIN requests ON requests.request_id = request_events.request_id
+                   WHERE request_events.owner_id = ?
+                     AND request_events.event_id > COALESCE(
+                         (SELECT event_id FROM request_event_cursors WHERE owner_id = ?), 0)
+                     AND request_events.status = 'Pending' AND requests.status = 'Pending'
+                """,
+                (owner_id, owner_id),
+            )
+        return row[0] if row else 0
+
+    @staticmethod
+    def mark_events_seen(owner_id, event_id):
+        """
+        Save an owner's cursor: the requests made up to `event_id` no longer count as new.
+
+        Args:
+            owner_id (int): The owner.
+            event_id (int): The last event shown to them (the cursor never moves backwards).
+
+        Returns:
+            bool: True if the cursor was saved.
+        """
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(owner_id)):
             DBManager.execute_query(
-                "UPDATE requests SET status = ? WHERE request_id = ?",
-                (status, request_id)  # Update the status of the request
-            )
\ No newline at end of file
+                """INSERT INTO request_event_cursors (owner_id, event_id) VALUES (?, ?)
+                   ON CONFLICT (owner_id) DO UPDATE SET event_id = MAX(event_id, excluded.event_id)
+                """,
+                (owner_id, event_id),
+            )
+        return True
+
+    @staticmethod
+    def _notify_events():
+        """
+        Wake up `events_since` calls waiting in this process.
+        """
+        with Request._events_changed:
+            Request._event_writes += 1
+            Request._events_changed.notify_all()
+
+    @staticmethod
+    def _fill_requester_names(rows):
+        """
+        Look up the usernames a request listing could not join locally.
+
+        In sharded mode a requester may live on another shard than the owner, so the join with
+        `users` leaves their username empty; those are fetched from the requesters' shards.
+
+        Args:
+            rows (list): Requests in the format of `view_requests`.
+
+        Returns:
+            list: The same requests with every requester's username filled in.
+        """
+        shards = DBManager.get_shards()
+        missing = {row[4] for row in rows if row[5] is None}
+        if shards.count == 1 or not missing:
+            return rows
+
+        names = {}
+        for requester_id in missing:
+            with shards.use(shards.shard_of_id(requester_id)):
+                user = DBManager.fetch_one("SELECT username FROM users WHERE user_id = ?", (requester_id,))
+            if user is not None:
+                names[requester_id] = user[0]
+        return [row[:5] + (names.get(row[4]),) + row[6:] if row[5] is None else row for row in rows]
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import secrets
+import time
+from models.database import DBManager
+
+
+class Session:
+    """
+    Opaque session tokens issued after a successful password login.
+
+    A token lets a client authenticate again without sending the password, so repeat logins
+    cost one primary-key lookup instead of a bcrypt check. Only the SHA-256 digest of a token is
+    stored, so a leaked database does not leak usable tokens. Tokens expire after `ttl` seconds
+    (`BOOKMATE_SESSION_TTL`, default 24 hours) and can be revoked individually or per user;
+    revoking deletes the session row.
+
+    Sessions are stored on their user's shard. In sharded mode a token starts with the shard
+    number (`<shard>.<random>`), so it can be verified without asking every shard.
+    """
+    ttl = int(os.environ.get("BOOKMATE_SESSION_TTL", 24 * 60 * 60))
+
+    @staticmethod
+    def _digest(token):
+        """
+        Returns:
+            str: The hex SHA-256 digest under which a token is stored.
+        """
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _shard(token):
+        """
+        Returns:
+            int or None: The shard a token's session is stored on, or None for a malformed token.
+        """
+        shards = DBManager.get_shards()
+        prefix, dot, _ = token.partition(".")
+        if not dot:
+            return 0  # Unsharded token
+        if prefix.isdigit() and int(prefix) < shards.count:
+            return int(prefix)
+        return None
+
+    @staticmethod
+    def issue(user_id, ttl=None):
+        """
+        Create a new session for a user.
+
+        Args:
+            user_id (int): The user the session belongs to.
+            ttl (int, optional): Lifetime in seconds. Defaults to `Session.ttl`.
+
+        Returns:
+            str: The token to hand to the client.
+        """
+        shards = DBManager.get_shards()
+        shard = shards.shard_of_id(user_id)
+        token = secrets.token_urlsafe(32)  # URL-safe base64 never contains "."
+        if shards.count > 1:
+            token = f"{shard}.{token}"
+        now = int(time.time())
+        with shards.use(shard):
+            DBManager.execute_query(
+                "INSERT INTO sessions (token_hash, user_id, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (Session._digest(token), user_id, now, now + (Session.ttl if ttl is None else ttl)),
+            )
+        return token
+
+    @staticmethod
+    def lookup(token):
+        """
+        Resolve a token to the user it was issued to.
+
+        Args:
+            token (str): The session token presented by the client.
+
+        Returns:
+            tuple or None: `(user_id, username)` if the token exists and has not expired.
+        """
+        shard = Session._shard(token) if token else None
+        if shard is None:
+            return None
+        with DBManager.get_shards().use(shard):
+            return DBManager.fetch_one(
+                """SELECT users.user_id, users.username
+                   FROM sessions
+                   JOIN users ON users.user_id = sessions.user_id
+                   WHERE sessions.token_hash = ? AND sessions.expires_at > ?
+                """,
+                (Session._digest(token), int(time.time())),
+            )
+
+    @staticmethod
+    def revoke(token):
+        """
+        Revoke a single session.
+
+        Returns:
+            bool: True if a session was revoked.
+        """
+        shard = Session._shard(token)
+        if shard is None:
+            return False
+        with DBManager.get_shards().use(shard):
+            cursor = DBManager.execute_query(
+                "DELETE FROM sessions WHERE token_hash = ?",
+                (Session._digest(token),),
+            )
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def revoke_all(user_id):
+        """
+        Revoke every session of a user (e.g. after a password change).
+
+        Returns:
+            int: Number of sessions revoked.
+        """
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(user_id)):
+            cursor = DBManager.execute_query(
+                "DELETE FROM sessions WHERE user_id = ?",
+                (user_id,),
+            )
+        return cursor.rowcount
+
+    @staticmethod
+    def purge_expired():
+        """
+        Delete expired sessions (on every shard).
+
+        Returns:
+            int: Number of sessions deleted.
+        """
+        cursors = DBManager.get_shards().scatter(
+            DBManager.execute_query,
+            "DELETE FROM sessions WHERE expires_at <= ?",
+            (int(time.time()),),
+        )
+        return sum(cursor.rowcount for cursor in cursors)
@@ -1,6 +1,9 @@
-import bcrypt
 from controllers.base import BaseModel
+from controllers.password_hasher import PasswordHasher
+from controllers.session import Session
 from models.database import DBManager
+from models.errors import ConstraintError
+from models.workload import WorkloadRecorder
 
 
 class User(BaseModel):
@@ -11,6 +14,7 @@ class User(BaseModel):
         - user_id (int): Unique identifier for the user, fetched from the database.
         - username (str): Username chosen by the user.
         - password (str): User's password, stored in a hashed form.
+        - session_token (str): Session token issued at login, if one was requested.
     """
 
     def __init__(self):
@@ -22,6 +26,7 @@ class User(BaseModel):
         self.user_id = None
         self.username = None
         self.password = None
+        self.session_token = None
 
     def delete(self):
         """
@@ -32,36 +37,92 @@ class User(BaseModel):
         """
         raise NotImplementedError("Users cannot be deleted.")  # Prevent deletion of users.
 
-    def login(self, username, password):
+    @WorkloadRecorder.operation("User.login", capture=lambda user, username, password, issue_token=False: [username, None, issue_token])
+    def login(self, username, password, issue_token=False):
         """
         Authenticate a user by checking the provided username and password.
 
+        The bcrypt check runs on the `PasswordHasher` worker pool. If the stored hash was made with
+        a lower cost factor than the configured one, it is transparently re-hashed.
+
         Args:
             username (str): The username entered by the user.
             password (str): The password entered by the user.
+            issue_token (bool): If True, a session token is issued and stored in `session_token`,
+                                so later requests can authenticate with `login_with_token`.
 
         Returns:
             str or None: Returns the username if login is successful, otherwise returns None.
         """
-        # Fetch the user record from the database based on the username
-        user = DBManager.fetch_one(
-            "SELECT user_id, username, password FROM users WHERE username = ?",
-            (username,)  # Search for the user by username
-        )
+        # Fetch the user record from the database based on the username (on the shard `save` placed it on)
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_for_key(username)):
+            user = DBManager.fetch_one(
+                "SELECT user_id, username, password FROM users WHERE username = ?",
+                (username,)  # Search for the user by username
+            )
 
         # Check if the user exists and the password matches the stored hashed password
-        if user and bcrypt.checkpw(password.encode('utf-8'), user[2]):
+        if user and PasswordHasher.check(password, user[2]):
             self.user_id  = user[0]
             self.username = user[1]
             self.password = user[2]
+            if PasswordHasher.needs_rehash(user[2]):
+                self._rehash(password)
+            if issue_token:
+                self.session_token = Session.issue(self.user_id)
             return username  # Return the username upon successful login
         return None  # Return None if login fails
 
+    def login_with_token(self, token):
+        """
+        Authenticate a user with a session token from an earlier `login(..., issue_token=True)`.
+
+        This is a single indexed lookup; no password hashing is involved.
+
+        Args:
+            token (str): The session token.
+
+        Returns:
+            str or None: Returns the username if the token is valid, otherwise returns None.
+        """
+        session = Session.lookup(token)
+        if session is None:
+            return None
+        self.user_id, self.username = session
+        self.session_token = token
+        return self.username
+
+    def logout(self):
+        """
+        Log the user out, revoking their session token if one was issued.
+        """
+        if self.session_token:
+            Session.revoke(self.session_token)
+        self.__init__()
+
+    def _rehash(self, password):
+        """
+        Store a new hash of the (just verified) password using the current cost factor.
+        """
+        hashed_password = PasswordHasher.hash(password)
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(self.user_id)):
+            DBManager.execute_query(
+                "UPDATE users SET password = ? WHERE user_id = ?",
+                (hashed_password, self.user_id),
+            )
+        self.password = hashed_password
+
     @classmethod
+    @WorkloadRecorder.operation("User.save", capture=lambda cls, username, password: [username, None])
     def save(cls, username, password):
         """
         Create a new user account by hashing the password and storing the credentials in the database.
 
+        In sharded mode the account is placed on the shard picked by hashing the username, after
+        checking that no shard already has the username.
+
         Args:
             username (str): The desired username for the new user.
             password (str): The desired password for the new user.
@@ -69,17 +130,21 @@ class User(BaseModel):
         Returns:
             bool: True if the signup was successful, False otherwise.
         """
-        # Hash the password using bcrypt before storing it
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-
-        # Insert the username and hashed password into the database
-        if DBManager.execute_query(
-                "INSERT INTO users (username, password) VALUES (?, ?)",
-                (username, hashed_password)  # Insert the credentials into the database
-        ):
-            return True  # Return True if the insertion was successful
-        else:
-            return False  # Return False if there was an error during insertion
-
+        # Hash the password using bcrypt (on the hashing worker pool) before storing it
+        hashed_password = PasswordHasher.hash(password)
 
+        shards = DBManager.get_shards()
+        if shards.count > 1 and any(shards.scatter(
+                DBManager.fetch_one, "SELECT 1 FROM users WHERE username = ?", (username,))):
+            return False  # The username is taken (the UNIQUE constraint only covers one shard)
 
+        # Insert the username and hashed password into the database
+        with shards.use(shards.shard_for_key(username)):
+            try:
+                DBManager.execute_query(
+                    "INSERT INTO users (username, password) VALUES (?, ?)",
+                    (username, hashed_password)  # Insert the credentials into the database
+                )
+            except ConstraintError:
+                return False  # The username is taken
+        return True  # Return True if the insertion was successful
@@ -0,0 +1,86 @@
+from models.database import DBManager
+
+
+class UserStats:
+    """
+    Per-user counters: books owned and pending requests made to the user.
+
+    The counters live in the `user_stats` table and are kept up to date by triggers on `books` and
+    `requests` (see migration 9), so reading them is one primary-key lookup instead of a `COUNT(*)`.
+    `check` compares them with the tables and `rebuild` recomputes them, e.g. after rows were
+    changed with the triggers dropped. A user's counters are stored on their shard, next to their
+    books and the requests made to them.
+    """
+
+    @staticmethod
+    def get(user_id):
+        """
+        Args:
+            user_id (int): The user.
+
+        Returns:
+            tuple: (books_owned, pending_requests).
+        """
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(user_id)):
+            row = DBManager.fetch_one(
+                "SELECT books_owned, pending_requests FROM user_stats WHERE user_id = ?", (user_id,)
+            )
+        return tuple(row) if row else (0, 0)
+
+    @staticmethod
+    def check():
+        """
+        Compare the stored counters of every user with counts over the `books` and `requests` tables.
+
+        Returns:
+            list: One `(user_id, books_owned, actual_books, pending_requests, actual_pending)` tuple
+                  per user whose counters are wrong; empty if all are consistent.
+        """
+        per_shard = DBManager.get_shards().scatter(
+            DBManager.fetch_all,
+            """SELECT user_id, SUM(stored_books), SUM(books), SUM(stored_pending), SUM(pending)
+                FROM (
+                    SELECT user_id, books_owned AS stored_books, 0 AS books,
+                           pending_requests AS stored_pending, 0 AS pending
+                    FROM user_stats
+                    UNION ALL
+                    SELECT owner_id, 0, COUNT(*), 0, 0 FROM books GROUP BY owner_id
+                    UNION ALL
+                    SELECT owner_id, 0, 0, 0, COUNT(*) FROM requests WHERE status = 'Pending' GROUP BY owner_id
+                )
+                GROUP BY user_id
+                HAVING SUM(stored_books) != SUM(books) OR SUM(stored_pending) != SUM(pending)
+                ORDER BY user_id
+                -- allow-scan: the consistency check reads every row
+            """,
+        )
+        return [row for rows in per_shard for row in rows]
+
+    @staticmethod
+    def rebuild():
+        """
+        Recompute every user's counters from the `books` and `requests` tables, one transaction
+        per shard.
+
+        Returns:
+            int: Number of users with counters.
+        """
+        shards = DBManager.get_shards()
+        total = 0
+        for index in range(shards.count):
+            with shards.use(index):
+                with DBManager.transaction() as conn:
+                    conn.execute("DELETE FROM user_stats")
+                    total += conn.execute(
+                        """INSERT INTO user_stats (user_id, books_owned, pending_requests)
+                           SELECT user_id, SUM(books), SUM(pending) FROM (
+                               SELECT owner_id AS user_id, COUNT(*) AS books, 0 AS pending FROM books GROUP BY owner_id
+                               UNION ALL
+                               SELECT owner_id, 0, COUNT(*) FROM requests WHERE status = 'Pending' GROUP BY owner_id
+                           )
+                           GROUP BY user_id
+                           -- allow-scan: the rebuild reads every row
+                        """
+                    ).rowcount
+        return total
@@ -22,114 +22,160 @@ controllers, and views, organized into a clean and modular structure.
 """
 
 # Import necessary modules
+import logging
+import sys
+from views import cli                   # Non-interactive commands (JSON Lines output)
 from views.console_ui import ConsoleUI  # Handles user interactions
 from controllers.user import User       # Manages user authentication and actions
 from controllers.book import Book       # Manages book-related operations
 from controllers.request import Request # Handles book request functionality
+from controllers.user_stats import UserStats  # Per-user book and request counters
 from models.database import DBManager   # Manages database connections and setup
+from models.errors import ContentionError, DatabaseError  # Typed database errors
+from models.maintenance import DatabaseMaintenance  # Background ANALYZE, checkpoints and vacuum
+from models.query_stats import QueryStats  # Per-statement query instrumentation
+from models.retry import ContentionStats  # Busy/locked retries and backoff time
 
-def main():
+def main(argv=None):
     """
     The main function initializes the database and starts the application loop.
     Users can log in, sign up, and perform various book-related actions based on their authentication state.
+
+    With command-line arguments (e.g. `python main.py search tolkien`), runs them non-interactively
+    instead; see `views/cli.py`.
+
+    Returns:
+        int: The exit status.
     """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return cli.main(argv)
+
     # Initialize the database
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")  # Slow-query log
     DBManager.setup_database()
+    if DatabaseMaintenance.enabled:
+        DatabaseMaintenance().start()
 
     # Create instances for user interaction and tracking the current user
     ui = ConsoleUI()
     current_user = User()
 
     while True:
-        if not current_user.user_id:
-            # Display the welcome menu for unauthenticated users
-            ui.display_welcome_menu()
-            choice = ui.get_user_input("Enter your choice: ")
-
-            if choice == "1":
-                # Handle user login
-                username = ui.get_user_input("Enter username: ")
-                password = ui.get_user_password("Enter password: ")
-                current_user.login(username, password)
-                if current_user.user_id:
-                    ui.display_message(f"\nWelcome, {username}! ({current_user.user_id})", c="green")
-                else:
-                    ui.display_message("\nInvalid credentials. Try again.", c="red")
-
-            elif choice == "2":
-                # Handle user signup
-                username = ui.get_user_input("Enter new username: ")
-                password = ui.get_user_password("Enter new password: ")
-                if User.save(username, password):
-                    ui.display_message("\nSignup successful. You can now log in.", c="green")
-                else:
-                    ui.display_message("\nSignup failed", c="red")
+        try:
+            if not current_user.user_id:
+                # Display the welcome menu for unauthenticated users
+                ui.display_welcome_menu()
+                choice = ui.get_user_input("Enter your choice: ")
+
+                if choice == "1":
+                    # Handle user login
+                    username = ui.get_user_input("Enter username: ")
+                    password = ui.get_user_password("Enter password: ")
+                    current_user.login(username, password)
+                    if current_user.user_id:
+                        ui.display_message(f"\nWelcome, {username}! ({current_user.user_id})", c="green")
+                    else:
+                        ui.display_message("\nInvalid credentials. Try again.", c="red")
+
+                elif choice == "2":
+                    # Handle user signup
+                    username = ui.get_user_input("Enter new username: ")
+                    password = ui.get_user_password("Enter new password: ")
+                    if User.save(username, password):
+                        ui.display_message("\nSignup successful. You can now log in.", c="green")
+                    else:
+                        ui.display_message("\nSignup failed", c="red")
+
+                elif choice == "3":
+                    # Exit the application
+                    ui.display_message("\nExiting... Goodbye!", c="green")
+                    break
 
-            elif choice == "3":
-                # Exit the application
-                ui.display_message("\nExiting... Goodbye!", c="green")
-                break
+                else:
+                    ui.display_message("\nInvalid choice. Please try again.", c="red")
 
             else:
-                ui.display_message("\nInvalid choice. Please try again.", c="red")
-
-        else:
-            # Display the actions menu for authenticated users
-            ui.display_actions_menu()
-            choice = ui.get_user_input("Enter your choice: ")
-
-            if choice == "1":
-                # Logout the current user
-                current_user.user_id = None
-                ui.display_message("Logged out successfully.", c="green")
-
-            elif choice == "2":
-                # Add a new book
-                title = ui.get_user_input("Enter book title: ")
-                author = ui.get_user_input("Enter author: ")
-                isbn = ui.get_user_input("Enter ISBN: ")
-                book = Book(title, author, isbn, current_user.user_id)
-                if book.save():
-                    ui.display_message("Book added successfully.", c="green")
-                else:
-                    ui.display_message("Failed to add book.", c="red")
+                # Display the actions menu for authenticated users, with their counters and new requests
+                ui.display_actions_menu(
+                    Request.count_new_requests(current_user.user_id), UserStats.get(current_user.user_id)
+                )
+                choice = ui.get_user_input("Enter your choice: ")
+
+                if choice == "1":
+                    # Logout the current user
+                    current_user.logout()
+                    ui.display_message("Logged out successfully.", c="green")
+
+                elif choice == "2":
+                    # Add a new book
+                    title = ui.get_user_input("Enter book title: ")
+                    author = ui.get_user_input("Enter author: ")
+                    isbn = ui.get_user_input("Enter ISBN: ")
+                    book = Book(title, author, isbn, current_user.user_id)
+                    if book.save():
+                        ui.display_message("Book added successfully.", c="green")
+                    else:
+                        ui.display_message("Failed to add book.", c="red")
+
+                elif choice == "3":
+                    # Delete an existing book
+                    book_id = ui.get_user_input("Enter the ID of the book to delete: ")
+                    if Book.delete(book_id, current_user.user_id):
+                        ui.display_message("Book deleted successfully.", c="green")
+                    else:
+                        ui.display_message("Failed to remove book. Check the Book ID or your Ownership.", c="red")
+
+                elif choice == "4":
+                    # Search for books
+                    keyword, fuzzy = ui.get_search_keyword()
+                    if fuzzy:
+                        books = Book.fuzzy_search(keyword, limit=ui.PAGE_SIZE)
+                    else:
+                        books = Book.iter_search(keyword, page_size=ui.PAGE_SIZE)
+                    ui.display_books(books, page_size=ui.PAGE_SIZE)
+
+                elif choice == "5":
+                    # Request a book
+                    book_id = ui.get_user_input("Enter Book ID to request: ")
+                    req = Request(book_id, current_user.user_id)
+                    if req.save():
+                        ui.display_message("Book request sent.", c="green")
+                    else:
+                        ui.display_message("Book request failed.", c="red")
+
+                elif choice == "6":
+                    # Respond to pending book requests; everything up to now stops counting as new
+                    seen = Request.latest_event_id(current_user.user_id)
+                    Request.mark_events_seen(current_user.user_id, seen)
+                    _, pending = UserStats.get(current_user.user_id)
+                    ui.interact_requests(Request.iter_requests(current_user.user_id), total=pending)
+
+                elif choice == "7":
+                    # Show cache, lock contention and per-statement query statistics (admin)
+                    ui.display_cache_stats(Book.cache_stats())
+                    ui.display_contention_stats(ContentionStats.snapshot())
+                    if QueryStats.enabled:
+                        ui.display_query_stats(QueryStats.snapshot())
+                    elif ui.get_user_input("Query statistics are off. Enable them now? (y/n): ") == "y":
+                        QueryStats.enable()
+                        ui.display_message(f"Query statistics enabled (slow query threshold: {QueryStats.slow_query_ms:g} ms).", c="green")
+
+                elif choice == "8":
+                    # Exit the application
+                    ui.display_message("Exiting... Goodbye!", c="green")
+                    break
 
-            elif choice == "3":
-                # Delete an existing book
-                book_id = ui.get_user_input("Enter the ID of the book to delete: ")
-                if Book.delete(book_id, current_user.user_id):
-                    ui.display_message("Book deleted successfully.", c="green")
-                else:
-                    ui.display_message("Failed to remove book. Check the Book ID or your Ownership.", c="red")
-
-            elif choice == "4":
-                # Search for books
-                keyword = ui.get_user_input("Enter keyword to search (Enter to list all): ")
-                books = Book.search(keyword)
-                ui.display_books(books)
-
-            elif choice == "5":
-                # Request a book
-                book_id = ui.get_user_input("Enter Book ID to request: ")
-                req = Request(book_id, current_user.user_id)
-                if req.save():
-                    ui.display_message("Book request sent.", c="green")
                 else:
-                    ui.display_message("Book request failed.", c="red")
-
-            elif choice == "6":
-                # Respond to pending book requests
-                requests = Request.view_requests(current_user.user_id)
-                ui.interact_requests(requests)
+                    ui.display_message("Invalid choice. Please try again.")
+        except ContentionError:
+            # The database stayed locked through every retry; nothing was changed
+            ui.display_message("The database is busy right now. Please try again.", c="red")
+        except DatabaseError as e:
+            ui.display_message(f"Database error: {e}", c="red")
 
-            elif choice == "7":
-                # Exit the application
-                ui.display_message("Exiting... Goodbye!", c="green")
-                break
-
-            else:
-                ui.display_message("Invalid choice. Please try again.")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded least-recently-used cache.
+
+    Entries are evicted, least recently used first, once their estimated total size exceeds
+    `max_bytes`. Single values larger than `max_entry_bytes` are never stored, so one huge result
+    cannot flush the whole cache.
+
+    To avoid caching stale data, readers take `generation` *before* querying the database and
+    pass it to `put`. Every invalidation bumps the generation, so a value read before a write was
+    committed (and invalidated) is silently dropped instead of being cached.
+
+    With a `scope` function (e.g. the current tenant), keys are stored per scope, so callers in
+    different scopes never see each other's entries. Invalidations by predicate apply to every scope.
+
+    Attributes:
+        - name (str): Label used in statistics.
+        - max_bytes (int): Size budget in (estimated) bytes; 0 disables the cache.
+        - hits, misses, evictions (int): Counters for sizing the cache.
+    """
+
+    def __init__(self, name, max_bytes, max_entry_bytes=None, scope=None):
+        """
+        Args:
+            name (str): Label used in statistics.
+            max_bytes (int): Size budget in bytes; 0 disables caching.
+            max_entry_bytes (int, optional): Largest single value stored. Defaults to 1/8 of `max_bytes`.
+            scope (callable, optional): Returns the scope the calling thread's keys belong to.
+        """
+        self.name = name
+        self.scope = scope
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 8
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def sizeof(value):
+        """
+        Estimates the memory held by a value made of tuples, lists, strings and numbers.
+
+        Returns:
+            int: Approximate size in bytes.
+        """
+        size = sys.getsizeof(value)
+        if isinstance(value, (tuple, list)):
+            size += sum(LRUCache.sizeof(item) for item in value)
+        return size
+
+    def get(self, key, default=None):
+        """
+        Returns:
+            The cached value (marked as most recently used), or `default` on a miss.
+        """
+        key = self._scoped(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, generation):
+        """
+        Stores a value unless the cache was invalidated after `generation` was read.
+
+        Args:
+            key: Cache key (hashable).
+            value: Value to cache.
+            generation (int): `self.generation` as read before the value was loaded.
+        """
+        if self.max_bytes <= 0:
+            return
+        size = self.sizeof(value)
+        if size > self.max_entry_bytes:
+            return
+        key = self._scoped(key)
+        with self._lock:
+            if generation != self.generation:
+                return  # A write happened while the value was being loaded; it may be stale
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """
+        Removes one entry (if present).
+        """
+        key = self._scoped(key)
+        with self._lock:
+            self.generation += 1
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def invalidate_where(self, predicate):
+        """
+        Removes every entry for which `predicate(key, value)` is true.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        with self._lock:
+            self.generation += 1
+            stale = [
+                key for key, (value, _) in self._entries.items()
+                if predicate(key if self.scope is None else key[1], value)
+            ]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[1]
+            return len(stale)
+
+    def _scoped(self, key):
+        return key if self.scope is None else (self.scope(), key)
+
+    def clear(self):
+        """
+        Removes every entry. Counters are kept.
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss/eviction counters, hit rate, entry count and estimated size.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
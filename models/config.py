@@ -0,0 +1,59 @@
+import configparser
+import os
+
+
+class Config:
+    """
+    Settings read from the environment and an optional INI file.
+
+    A setting `name` is looked up in the environment variable `BOOKMATE_<NAME>` first, then under
+    `[bookmate]` in the config file, then falls back to the caller's default. The config file is
+    `BOOKMATE_CONFIG` if set, otherwise `bookmate.ini` in the working directory (if it exists).
+
+    Example `bookmate.ini`:
+        [bookmate]
+        db = /mnt/nvme/bookmate/library.db
+        shards = 4
+        tenant_dir = /mnt/nvme/bookmate/libraries
+    """
+    SECTION = "bookmate"
+
+    _parser = None  # Parsed config file, loaded on first use
+
+    @classmethod
+    def get(cls, name, default=None):
+        """
+        Args:
+            name (str): The setting, e.g. "db" (environment variable `BOOKMATE_DB`).
+            default: Returned when the setting is in neither place.
+
+        Returns:
+            str: The configured value, or `default`.
+        """
+        value = os.environ.get(f"BOOKMATE_{name.upper()}")
+        if value is not None:
+            return value
+        return cls._file().get(cls.SECTION, name, fallback=default)
+
+    @classmethod
+    def get_int(cls, name, default):
+        """
+        Returns:
+            int: The configured value of an integer setting, or `default`.
+        """
+        return int(cls.get(name, default))
+
+    @classmethod
+    def reload(cls):
+        """
+        Forgets the parsed config file, so the next lookup reads it again.
+        """
+        cls._parser = None
+
+    @classmethod
+    def _file(cls):
+        if cls._parser is None:
+            parser = configparser.ConfigParser()
+            parser.read(os.environ.get("BOOKMATE_CONFIG", "bookmate.ini"), encoding="utf-8")  # Missing files are skipped
+            cls._parser = parser
+        return cls._parser
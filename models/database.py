@@ -1,38 +1,278 @@
 import sqlite3
+import time
+from contextlib import contextmanager
+from models.config import Config
+from models.errors import DatabaseError
+from models.migrations import SchemaMigrator
+from models.query_stats import QueryStats
+from models.sharding import ShardSet
+from models.tenants import TenantRegistry
 
 class DBManager:
-    """Singleton class for managing SQLite database connection."""
-    _connection = None  # Static variable to hold the database connection
+    """
+    Singleton class for managing SQLite database connections.
+
+    Connections come from a `ConnectionPool`, which gives every thread its own connection to the
+    WAL-mode database. Reads (`fetch_all`, `fetch_one`) run in parallel; writes (`execute_query`,
+    `transaction`) are serialized so there is only ever one writer at a time. Single-statement
+    writes go through a `WriteQueue`, whose writer thread group-commits the statements of
+    concurrent callers.
+
+    The data can optionally be split across several database files (`BOOKMATE_SHARDS`, or the
+    `shards` argument of `configure`); see `ShardSet`. Every operation runs on the shard selected
+    with `get_shards().use(...)`, which is shard 0 (the configured database file) by default.
+
+    The database is `BOOKMATE_DB` (or `db` in the config file, see `Config`), by default
+    `book_management.db` in the working directory. It may be an SQLite URI, or ":memory:" for a
+    database that lives until `close_connections`.
+
+    Failed statements raise a `DatabaseError`: `ConstraintError` for constraint violations,
+    `ContentionError` when the database stayed busy or locked through the pool's `RetryPolicy`, and
+    `QueryError` for anything else (see `models/errors.py`). Busy and locked errors are retried with
+    jittered exponential backoff before they are raised.
+
+    In multi-tenant mode (`enable_tenants`, or `BOOKMATE_TENANT_DIR`) every library has its own
+    database in the tenant directory; operations inside a `use_tenant(name)` block run against that
+    library's database, and the rest against the configured one. See `TenantRegistry`.
+    """
+    _database = Config.get("db", "book_management.db")  # Path or URI of the SQLite database (shard 0)
+    _shard_count = Config.get_int("shards", 1)  # Number of database files
+    _shards = None  # Static variable to hold the shards (and their connection pools)
+    _tenants = None  # TenantRegistry in multi-tenant mode
+
+    @classmethod
+    def configure(cls, database, shards=None):
+        """
+        Points the DBManager at a different database file, closing any connections to the current one.
+
+        Args:
+            database (str): Path of the SQLite database file.
+            shards (int, optional): Number of database files to spread the data over.
+        """
+        cls.close_connections()
+        cls._database = database
+        if shards is not None:
+            cls._shard_count = shards
+
+    @classmethod
+    def database(cls):
+        """
+        Returns:
+            str: Path or URI of the configured database.
+        """
+        return cls._database
+
+    @classmethod
+    def get_shards(cls):
+        """
+        Returns the shard set, creating it on first use.
+
+        Returns:
+            ShardSet: The shards of the current tenant's database inside a `use_tenant` block,
+                      otherwise those of the configured database.
+        """
+        tenant = TenantRegistry.current()
+        if tenant is not None and cls._tenants is not None:
+            return cls._tenants.shards(tenant)
+        if cls._shards is None:
+            cls._shards = ShardSet(cls._database, cls._shard_count)
+        return cls._shards
+
+    @classmethod
+    def enable_tenants(cls, directory, max_open=None, idle_seconds=None):
+        """
+        Turns on multi-tenant mode, closing the tenants of an earlier call.
+
+        Args:
+            directory (str): Where the tenants' database files live.
+            max_open (int, optional): Most tenant databases kept open (`BOOKMATE_TENANT_MAX_OPEN`, default 64).
+            idle_seconds (float, optional): Idle time after which a tenant database is closed
+                                            (`BOOKMATE_TENANT_IDLE_SECONDS`, default 300).
+
+        Returns:
+            TenantRegistry: The registry of open tenants.
+        """
+        if cls._tenants is not None:
+            cls._tenants.close()
+        cls._tenants = TenantRegistry(
+            directory,
+            cls._shard_count,
+            max_open if max_open is not None else Config.get_int("tenant_max_open", 64),
+            idle_seconds if idle_seconds is not None else float(Config.get("tenant_idle_seconds", 300)),
+            setup=cls.setup_shards,
+        )
+        return cls._tenants
+
+    @classmethod
+    def disable_tenants(cls):
+        """
+        Turns off multi-tenant mode, closing every open tenant database.
+        """
+        if cls._tenants is not None:
+            cls._tenants.close()
+            cls._tenants = None
+
+    @classmethod
+    def get_tenants(cls):
+        """
+        Returns:
+            TenantRegistry or None: The tenant registry, or None outside multi-tenant mode.
+        """
+        return cls._tenants
+
+    @classmethod
+    def use_tenant(cls, tenant):
+        """
+        Context manager running the `DBManager` operations inside the block against a tenant's database.
+
+        Args:
+            tenant (str): The tenant (library) name.
+        """
+        if cls._tenants is None:
+            raise RuntimeError("Multi-tenant mode is off; call DBManager.enable_tenants() or set BOOKMATE_TENANT_DIR")
+        return cls._tenants.use(tenant)
+
+    @classmethod
+    def get_pool(cls):
+        """
+        Returns the connection pool of the current shard.
+
+        Returns:
+            ConnectionPool: The pool of the current shard.
+        """
+        return cls.get_shards().pool()
+
+    @classmethod
+    def get_writer(cls):
+        """
+        Returns the write queue of the current shard, creating it on first use.
+
+        Returns:
+            WriteQueue: The queue feeding the writer thread of the configured database.
+        """
+        return cls.get_shards().writer()
+
+    @classmethod
+    def submit_write(cls, query, params=()):
+        """
+        Queues a write query (INSERT, UPDATE, DELETE) without waiting for it.
+
+        Args:
+            query (str): The SQL query string to be executed.
+            params (tuple): The parameters to be passed into the SQL query.
+
+        Returns:
+            concurrent.futures.Future: Resolves to a `WriteResult` (rowcount, lastrowid) once committed.
+        """
+        return cls.get_writer().submit(query, params)
 
     @classmethod
     def get_connection(cls):
         """
-        Returns the current database connection. If no connection exists, it creates one.
+        Returns the calling thread's database connection. If it does not exist yet, it is created.
 
         Returns:
             sqlite3.Connection: The SQLite connection object.
         """
-        if cls._connection is None:
-            cls._connection = sqlite3.connect("book_management.db")  # Creates a new connection if none exists
-        return cls._connection
+        return cls._connect(cls.get_pool())
+
+    @staticmethod
+    def _connect(pool):
+        """
+        Returns the calling thread's connection of a pool, raising a `DatabaseError` if it cannot be opened.
+        """
+        try:
+            return pool.connection()
+        except sqlite3.Error as e:
+            raise DatabaseError.from_sqlite(e) from e
+
+    @classmethod
+    @contextmanager
+    def transaction(cls):
+        """
+        Context manager running several write statements as one atomic transaction.
+
+        Statements executed inside the block (directly on the yielded connection, or through
+        `execute_query`) are committed once when the block exits, or rolled back if it raises.
+        This is the unit of work for controller operations made of several statements; they
+        bypass the write queue and run on the calling thread while it holds the write lock.
+        SQLite errors leave the block as `DatabaseError`s.
+
+        Example:
+            with DBManager.transaction() as conn:
+                conn.execute("UPDATE books SET owner_id = ? WHERE book_id = ?", (2, 7))
+                conn.execute("UPDATE requests SET status = 'Accepted' WHERE request_id = ?", (3,))
+
+        Returns:
+            contextmanager: Yields the calling thread's `sqlite3.Connection`.
+        """
+        try:
+            with cls.get_pool().transaction() as conn:
+                yield conn
+        except DatabaseError:
+            raise
+        except sqlite3.Error as e:
+            raise DatabaseError.from_sqlite(e) from e
+
+    @classmethod
+    def close_connections(cls):
+        """
+        Closes every pooled database connection (including those of open tenants), after applying
+        any queued writes.
+        """
+        if cls._shards is not None:
+            cls._shards.close()  # Close the connections
+            cls._shards = None  # Set the shards to None
+        if cls._tenants is not None:
+            cls._tenants.close()
 
     @classmethod
     def __del__(cls):
         """
-        Destructor method to close the database connection when the DBManager object is deleted.
+        Destructor method to close the database connections when the DBManager object is deleted.
         """
-        if cls._connection:
-            cls._connection.close()  # Close the connection
-            cls._connection = None  # Set the connection to None
+        cls.close_connections()
 
     @classmethod
     def setup_database(cls):
         """
         Sets up the SQLite database with the necessary tables (users, books, and requests).
 
-        This method is used to initialize the database schema, creating tables if they do not already exist.
+        This method is used to initialize the database schema, creating tables if they do not already exist,
+        and then brings an existing database file up to date by applying any pending schema migrations.
+        In sharded mode every shard is set up, and book transfers interrupted by a crash are completed.
+        If `BOOKMATE_TENANT_DIR` (`tenant_dir` in the config file) is set and multi-tenant mode is not
+        on yet, it is turned on with that directory; tenant databases are set up on first use.
+        """
+        cls.setup_shards(cls.get_shards())
+        tenant_dir = Config.get("tenant_dir")
+        if tenant_dir and cls._tenants is None:
+            cls.enable_tenants(tenant_dir)
+
+    @classmethod
+    def setup_shards(cls, shards):
+        """
+        Sets up the schema of every shard of a shard set (see `setup_database`).
+
+        Args:
+            shards (ShardSet): The shards to set up.
+        """
+        for index, pool in enumerate(shards.pools):
+            with pool.write_lock:
+                conn = pool.connection()
+                cls.create_schema(conn)
+                shards.seed_sequences(conn, index)
+        for index in range(shards.count):
+            shards.apply_transfers(index)
+
+    @staticmethod
+    def create_schema(conn):
+        """
+        Creates the base tables on the given connection and applies all pending migrations.
+
+        Args:
+            conn (sqlite3.Connection): The connection whose database should be initialized.
         """
-        conn = cls.get_connection()
         cursor = conn.cursor()
 
         # Users Table
@@ -76,30 +316,61 @@ class DBManager:
             """
         )
 
-        conn.commit()  # Commit the changes to the database
+        conn.commit()  # Commit the base tables before migrating
+
+        # Indexes, triggers and later schema changes are applied as versioned migrations
+        SchemaMigrator.migrate(conn)
 
     @classmethod
     def execute_query(cls, query, params=()):
         """
         Executes a write query (INSERT, UPDATE, DELETE) on the database.
 
+        Outside a `transaction()` block the statement is handed to the writer thread, which commits
+        it together with the writes of other concurrent callers; this call waits until that group
+        commit is done, and resubmits the statement if the database was busy or locked. Inside a
+        `transaction()` block it runs on the block's connection and is committed with the rest of
+        the block (a failure fails the whole block, so it is not retried on its own).
+
         Args:
             query (str): The SQL query string to be executed.
             params (tuple): The parameters to be passed into the SQL query.
 
         Returns:
-            sqlite3.Cursor: The cursor object if the query is executed successfully.
+            WriteResult or sqlite3.Cursor: Exposes `rowcount` and `lastrowid`.
+
+        Raises:
+            ConstraintError: The statement violated a constraint; nothing was written.
+            ContentionError: The database stayed busy or locked through every retry.
+            QueryError: Any other failure.
         """
-        try:
-            conn = cls.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(query, params)  # Execute the query with the provided parameters
-            conn.commit()  # Commit the changes
-            return cursor  # Return the cursor for further use if needed (e.g., for debugging)
-        except Exception as e:
-            print(f"Error executing query: {query} with params: {params}")
-            print(f"Exception: {str(e)}")
-            conn.rollback()  # Rollback in case of an error
+        pool = cls.get_pool()
+        if not pool.in_transaction():
+            try:
+                return pool.retry.call("write", cls._write, query, params)
+            except sqlite3.Error as e:
+                raise DatabaseError.from_sqlite(e, query, params) from e
+
+        conn = pool.connection()  # Already open: the enclosing transaction() block uses it
+        started = time.perf_counter() if QueryStats.enabled else None
+        with pool.write_lock:  # Already held by the enclosing transaction() block
+            try:
+                cursor = conn.cursor()
+                cursor.execute(query, params)  # Execute the query; the transaction() block commits it
+                if started is not None:
+                    QueryStats.record(conn, query, params, time.perf_counter() - started, cursor.rowcount)
+                return cursor  # Return the cursor for further use if needed (e.g., for debugging)
+            except sqlite3.Error as e:
+                if started is not None:
+                    QueryStats.record(conn, query, params, time.perf_counter() - started, error=True)
+                raise DatabaseError.from_sqlite(e, query, params) from e  # The transaction() block rolls back
+
+    @classmethod
+    def _write(cls, query, params):
+        """
+        Queues one write and waits for its group commit.
+        """
+        return cls.submit_write(query, params).result()
 
     @classmethod
     def fetch_all(cls, query, params=()):
@@ -112,16 +383,11 @@ class DBManager:
 
         Returns:
             list: A list of tuples containing the query results.
+
+        Raises:
+            DatabaseError: The query failed (after retries, if the database was busy or locked).
         """
-        try:
-            conn = cls.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(query, params)  # Execute the query with the provided parameters
-            return cursor.fetchall()  # Return all rows as a list of tuples
-        except Exception as e:
-            print(f"Error fetching all results for query: {query} with params: {params}")
-            print(f"Exception: {str(e)}")
-            return []  # Return an empty list in case of an error
+        return cls._read("read", query, params, lambda cursor: cursor.fetchall(), len)
 
     @classmethod
     def fetch_one(cls, query, params=()):
@@ -134,13 +400,85 @@ class DBManager:
 
         Returns:
             tuple or None: The first row of the query result, or None if no result is found.
+
+        Raises:
+            DatabaseError: The query failed (after retries, if the database was busy or locked).
         """
-        try:
-            conn = cls.get_connection()
+        return cls._read("read", query, params, lambda cursor: cursor.fetchone(), lambda row: int(row is not None))
+
+    @classmethod
+    def _read(cls, kind, query, params, fetch, count):
+        """
+        Runs a read query with retries, recording it in `QueryStats`.
+
+        Args:
+            kind (str): The kind of operation, for `ContentionStats`.
+            fetch (callable): Takes the executed cursor and returns the result.
+            count (callable): Takes the result and returns the number of rows it holds.
+        """
+        pool = cls.get_pool()
+        conn = cls._connect(pool)
+        started = time.perf_counter() if QueryStats.enabled else None
+
+        def attempt():
             cursor = conn.cursor()
             cursor.execute(query, params)  # Execute the query with the provided parameters
-            return cursor.fetchone()  # Return the first result (or None if not found)
-        except Exception as e:
-            print(f"Error fetching one result for query: {query} with params: {params}")
-            print(f"Exception: {str(e)}")
-            return None  # Return None if an error occurs
\ No newline at end of file
+            return fetch(cursor)
+
+        try:
+            result = pool.retry.call(kind, attempt)
+        except sqlite3.Error as e:
+            if started is not None:
+                QueryStats.record(conn, query, params, time.perf_counter() - started, error=True)
+            raise DatabaseError.from_sqlite(e, query, params) from e
+        if started is not None:
+            QueryStats.record(conn, query, params, time.perf_counter() - started, count(result))
+        return result
+
+    @classmethod
+    def iter_rows(cls, query, params=(), chunk_size=500):
+        """
+        Executes a read query (SELECT) and streams the results in chunks.
+
+        Unlike `fetch_all`, rows are pulled from SQLite with `fetchmany`, so memory use stays
+        bounded by `chunk_size` no matter how many rows the query returns.
+
+        Args:
+            query (str): The SQL query string to be executed.
+            params (tuple): The parameters to be passed into the SQL query.
+            chunk_size (int): Number of rows fetched from SQLite at a time.
+
+        Returns:
+            generator: Yields one row of the query result at a time. The connection of the current
+                       shard is bound when `iter_rows` is called, not when iteration starts.
+        """
+        pool = cls.get_pool()
+        return cls._stream_rows(pool, cls._connect(pool), query, params, chunk_size)
+
+    @staticmethod
+    def _stream_rows(pool, conn, query, params, chunk_size):
+        """
+        Generator behind `iter_rows`. Starting the query is retried if the database is busy or
+        locked; a failure once rows have been handed out is raised to the consumer.
+        """
+        instrumented = QueryStats.enabled
+        elapsed, count, error = 0.0, 0, False  # Time spent in SQLite only, not in the consumer
+        cursor = conn.cursor()
+        try:
+            started = time.perf_counter()
+            pool.retry.call("stream", cursor.execute, query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                elapsed += time.perf_counter() - started
+                if not rows:
+                    break
+                count += len(rows)
+                yield from rows
+                started = time.perf_counter()
+        except sqlite3.Error as e:
+            error = True
+            raise DatabaseError.from_sqlite(e, query, params) from e
+        finally:
+            cursor.close()  # Release the read snapshot even if the caller stops early
+            if instrumented:
+                QueryStats.record(conn, query, params, elapsed, count, error)
@@ -0,0 +1,90 @@
+import sqlite3
+
+# Primary SQLite result codes of lock contention (extended codes keep these in their low byte)
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+CONTENTION_MESSAGES = ("database is locked", "database table is locked", "database is busy", "database schema is locked")
+
+
+class DatabaseError(sqlite3.Error):
+    """
+    A statement run through `DBManager` failed.
+
+    The subclasses tell apart the failures callers handle differently: a constraint violation is
+    the caller's answer (e.g. "username taken"), lock contention is transient and worth retrying
+    later, and anything else is a bug or a broken database. All of them are `sqlite3.Error`s, so
+    code catching those keeps working.
+
+    Attributes:
+        - query (str): The statement that failed (None if unknown).
+        - params (tuple): Its parameters.
+        - code (str): SQLite's error name, e.g. "SQLITE_CONSTRAINT_UNIQUE" (None if unknown).
+    """
+
+    def __init__(self, message, query=None, params=None, code=None):
+        super().__init__(message)
+        self.query = query
+        self.params = params
+        self.code = code
+
+    @classmethod
+    def from_sqlite(cls, error, query=None, params=None):
+        """
+        Wraps an exception raised by `sqlite3` in the matching typed error.
+
+        Args:
+            error (Exception): The exception raised by SQLite (or by the writer thread).
+            query (str, optional): The statement that failed.
+            params (tuple, optional): Its parameters.
+
+        Returns:
+            DatabaseError: A `ConstraintError`, `ContentionError` or `QueryError`; `error` itself
+                           if it already is a `DatabaseError`.
+        """
+        if isinstance(error, DatabaseError):
+            return error
+        if isinstance(error, sqlite3.IntegrityError):
+            kind = ConstraintError
+        elif is_contention(error):
+            kind = ContentionError
+        else:
+            kind = QueryError
+        return kind(str(error), query, params, getattr(error, "sqlite_errorname", None))
+
+
+class ConstraintError(DatabaseError):
+    """
+    The statement violated a UNIQUE, CHECK or NOT NULL constraint; nothing was written. (Foreign
+    keys are declared in the schema but not enforced, see `ConnectionPool.DEFAULT_PRAGMAS`.)
+    """
+
+
+class ContentionError(DatabaseError):
+    """
+    The database stayed busy or locked through every retry (see `RetryPolicy`); the statement
+    did not run. Trying again later may succeed.
+    """
+
+
+class QueryError(DatabaseError):
+    """
+    Any other failure: invalid SQL, a missing table, a read-only or corrupt database, ...
+    """
+
+
+def is_contention(error):
+    """
+    Args:
+        error (Exception): An exception raised by SQLite.
+
+    Returns:
+        bool: True if the error is SQLITE_BUSY or SQLITE_LOCKED (another connection holds the lock).
+    """
+    if isinstance(error, ContentionError):
+        return True
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, "sqlite_errorcode", None)  # Python 3.11+
+    if code is not None:
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    return str(error).startswith(CONTENTION_MESSAGES)
@@ -0,0 +1,46 @@
+"""
+ISBN normalization.
+
+Books are matched on their ISBN-13, computed from whatever the user typed: hyphens and spaces are
+ignored and ISBN-10s are converted, so `0-306-40615-2`, `0306406152` and `978-0-306-40615-7` are
+all the same book.
+"""
+import re
+
+_SEPARATORS = re.compile(r"[\s-]")
+_ISBN10 = re.compile(r"^\d{9}[\dX]$")
+_ISBN13 = re.compile(r"^97[89]\d{10}$")
+
+
+def isbn13_check_digit(first12):
+    """
+    Args:
+        first12 (str): The first twelve digits of an ISBN-13.
+
+    Returns:
+        str: The check digit completing them.
+    """
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(first12))
+    return str(-total % 10)
+
+
+def normalize_isbn(text):
+    """
+    Convert an ISBN-10 or ISBN-13, with or without separators, to a bare ISBN-13.
+
+    Args:
+        text (str): The ISBN as typed or scanned.
+
+    Returns:
+        str or None: The 13-digit ISBN, or None if `text` is not a valid ISBN (bad shape or check digit).
+    """
+    compact = _SEPARATORS.sub("", str(text or "")).upper()
+    if _ISBN13.match(compact):
+        return compact if isbn13_check_digit(compact[:12]) == compact[12] else None
+    if _ISBN10.match(compact):
+        total = sum((10 - i) * (10 if c == "X" else int(c)) for i, c in enumerate(compact))
+        if total % 11:
+            return None
+        first12 = "978" + compact[:9]
+        return first12 + isbn13_check_digit(first12)
+    return None
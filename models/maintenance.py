@@ -0,0 +1,238 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+from models.database import DBManager
+
+logger = logging.getLogger("bookmate.maintenance")
+
+# One maintenance task run: what ran where, how long it took and how many bytes it gave back
+MaintenanceRun = namedtuple("MaintenanceRun", ["task", "shard", "started_at", "elapsed", "reclaimed_bytes", "detail"])
+
+
+class DatabaseMaintenance:
+    """
+    Background thread that keeps the database files healthy without blocking the request path.
+
+    Tasks (per shard):
+        - checkpoint: `PRAGMA wal_checkpoint(PASSIVE)`, which copies the WAL into the database
+          without waiting for readers or writers. Once the WAL has grown past `wal_truncate_bytes`
+          and is fully checkpointed, it is truncated so the file gives the space back.
+        - optimize: `PRAGMA optimize`, refreshing the planner statistics of the tables that need it
+          (on SQLite older than 3.46, an `ANALYZE` bounded by `analysis_limit` rows per index).
+        - analyze: a full `ANALYZE`, for exact statistics after heavy churn.
+        - vacuum: `PRAGMA incremental_vacuum`, returning free pages left by deletes and archiving to
+          the file system a few pages at a time. Only files with `auto_vacuum=INCREMENTAL` (new
+          databases) can do this; others report how much a full `VACUUM` would reclaim (see
+          `tools/maintenance.py`).
+
+    A task is due once its interval has passed or once the shard has committed its threshold of row
+    changes (`ConnectionPool.changes`) since the task last ran. Tasks run one at a time with a pause
+    between them. Tasks that write only start if the shard's write lock is free within
+    `lock_timeout`, otherwise they are retried on the next tick; the maintenance connection uses a
+    short busy timeout, so it gives way to foreground writers instead of stalling them.
+
+    Every run is logged to the `bookmate.maintenance` logger and kept in `history` with its
+    duration and the bytes it reclaimed. The thread is started by the console application and the
+    HTTP service unless `BOOKMATE_MAINTENANCE=0`.
+
+    Attributes:
+        - tasks (dict): Task name -> (interval in seconds, row-change threshold).
+        - history (collections.deque): The most recent `MaintenanceRun`s, oldest first.
+    """
+
+    TASKS = {
+        "checkpoint": (60, 10_000),
+        "optimize": (3600, 50_000),
+        "analyze": (86400, 500_000),
+        "vacuum": (600, 50_000),
+    }
+    WRITE_TASKS = {"optimize", "analyze", "vacuum"}
+
+    enabled = os.environ.get("BOOKMATE_MAINTENANCE", "1") not in ("", "0")
+
+    def __init__(self, tick=5.0, pause=1.0, lock_timeout=0.05, busy_timeout_ms=100, analysis_limit=1000,
+                 vacuum_step_pages=256, vacuum_max_pages=25_600, wal_truncate_bytes=64 * 1024 * 1024,
+                 history_size=200, tasks=None):
+        """
+        Initialize the scheduler. Nothing runs until `start` (or `run_pending`) is called.
+
+        Args:
+            tick (float): Seconds between checks for due tasks.
+            pause (float): Seconds to wait after each task before the next one.
+            lock_timeout (float): Seconds a writing task waits for the write lock before deferring.
+            busy_timeout_ms (int): SQLite busy timeout of the maintenance connection.
+            analysis_limit (int): Rows sampled per index by `optimize` (see `PRAGMA analysis_limit`).
+            vacuum_step_pages (int): Pages freed per incremental vacuum step (one write-lock hold each).
+            vacuum_max_pages (int): Most pages freed per vacuum run.
+            wal_truncate_bytes (int): WAL size above which a complete checkpoint truncates the WAL.
+            history_size (int): Number of runs kept in `history`.
+            tasks (dict, optional): Overrides of `TASKS` intervals and thresholds.
+        """
+        self.tick = tick
+        self.pause = pause
+        self.lock_timeout = lock_timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.analysis_limit = analysis_limit
+        self.vacuum_step_pages = vacuum_step_pages
+        self.vacuum_max_pages = vacuum_max_pages
+        self.wal_truncate_bytes = wal_truncate_bytes
+        self.tasks = dict(self.TASKS, **(tasks or {}))
+        self.history = deque(maxlen=history_size)
+        self._last = {}  # (database path, task) -> (monotonic time, pool changes) of its last run
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the maintenance thread (once).
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="bookmate-maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops the maintenance thread, letting a running task finish its current step.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """
+        Maintenance thread: run due tasks every `tick` seconds until stopped.
+        """
+        while not self._stop.wait(self.tick):
+            try:
+                self.run_pending()
+            except Exception as e:  # Maintenance must never take the application down
+                logger.error("Maintenance failed: %s", e)
+
+    def run_pending(self):
+        """
+        Runs every task that is due, on every shard (of the configured database and of every open
+        tenant), after closing idle tenants.
+
+        Returns:
+            list: The `MaintenanceRun`s of the tasks that ran.
+        """
+        shard_sets = [DBManager.get_shards()]  # Looked up every time: DBManager may be reconfigured
+        tenants = DBManager.get_tenants()
+        if tenants is not None:
+            tenants.evict_idle()
+            shard_sets += tenants.open_shard_sets()
+
+        runs = []
+        for shards in shard_sets:
+            for index, pool in enumerate(shards.pools):
+                for name in self.tasks:
+                    if self._stop.is_set():
+                        return runs
+                    if self._due(pool, name):
+                        run = self.run_task(name, pool, index)
+                        if run is not None:
+                            runs.append(run)
+                            self._stop.wait(self.pause)
+        return runs
+
+    def _due(self, pool, name):
+        """
+        Returns:
+            bool: True if the task's interval has passed or its change threshold was reached on the pool.
+        """
+        interval, threshold = self.tasks[name]
+        key = (pool.database, name)
+        last = self._last.get(key)
+        if last is None or pool.changes < last[1]:
+            self._last[key] = (time.monotonic(), pool.changes)  # First sight of this pool: start counting
+            return False
+        return time.monotonic() - last[0] >= interval or pool.changes - last[1] >= threshold
+
+    def run_task(self, name, pool, shard=0):
+        """
+        Runs one task now.
+
+        Args:
+            name (str): One of `TASKS`.
+            pool (ConnectionPool): The pool of the database to maintain.
+            shard (int): The shard's index, for the record.
+
+        Returns:
+            MaintenanceRun or None: The record of the run, or None if it was deferred because the
+                                    write lock was busy.
+        """
+        func = getattr(self, f"_{name}")
+        started_at, started, changes = time.time(), time.perf_counter(), pool.changes
+        try:
+            conn = pool.connection()
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+            if name in self.WRITE_TASKS:
+                # Only a probe: the task takes the lock again for each of its own steps
+                if not pool.write_lock.acquire(timeout=self.lock_timeout):
+                    return None  # Foreground writes are busy; try again on the next tick
+                pool.write_lock.release()
+            reclaimed, detail = func(pool, conn)
+        except sqlite3.Error as e:
+            reclaimed, detail = 0, f"failed: {e}"
+        run = MaintenanceRun(name, shard, started_at, time.perf_counter() - started, reclaimed, detail)
+        self._last[(pool.database, name)] = (time.monotonic(), changes)
+        self.history.append(run)
+        logger.info(
+            "%s on shard %d (%s) took %.1f ms, reclaimed %d bytes (%s)",
+            name, shard, pool.database, run.elapsed * 1000, reclaimed, detail,
+        )
+        return run
+
+    def _checkpoint(self, pool, conn):
+        wal = f"{pool.path}-wal" if pool.path else None  # In-memory databases have no WAL file
+        size = os.path.getsize(wal) if wal and os.path.exists(wal) else 0
+        busy, frames, copied = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        detail = f"{copied}/{frames} frames checkpointed"
+        if busy == 0 and frames == copied and size > self.wal_truncate_bytes:
+            with pool.write_lock:  # Every frame is already copied, so this only waits for readers
+                busy = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0]
+            detail += ", WAL truncated" if busy == 0 else ", WAL busy"
+        after = os.path.getsize(wal) if wal and os.path.exists(wal) else 0
+        return max(0, size - after), detail
+
+    def _optimize(self, pool, conn):
+        with pool.write_lock:
+            conn.execute(f"PRAGMA analysis_limit = {int(self.analysis_limit)}")
+            try:
+                if sqlite3.sqlite_version_info >= (3, 46, 0):
+                    conn.execute("PRAGMA optimize = 0x10002").fetchall()  # Check every table, not only used ones
+                    return 0, "statistics refreshed where needed"
+                conn.execute("ANALYZE").fetchall()
+                return 0, f"statistics sampled ({self.analysis_limit} rows per index)"
+            finally:
+                conn.execute("PRAGMA analysis_limit = 0")
+
+    def _analyze(self, pool, conn):
+        with pool.write_lock:
+            conn.execute("ANALYZE").fetchall()
+        return 0, "statistics rebuilt"
+
+    def _vacuum(self, pool, conn):
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+            return 0, f"{free * page_size} bytes free; incremental vacuum needs a full VACUUM first"
+
+        freed = 0
+        while free > 0 and freed < self.vacuum_max_pages and not self._stop.is_set():
+            step = min(self.vacuum_step_pages, free, self.vacuum_max_pages - freed)
+            with pool.write_lock:  # One short step at a time, so writers get in between
+                # executescript steps the pragma to completion; execute() would free a single page
+                conn.executescript(f"PRAGMA incremental_vacuum({int(step)})")
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                break  # Nothing freed (e.g. the database was busy)
+            freed += free - remaining
+            free = remaining
+            self._stop.wait(self.pause / 10)
+        return freed * page_size, f"{freed} pages freed, {free} left"
@@ -0,0 +1,559 @@
+import time
+from models.isbn import normalize_isbn
+
+
+class SchemaMigrator:
+    """
+    Applies versioned schema migrations to an SQLite database.
+
+    The schema version of a database file is stored in `PRAGMA user_version`. Every migration
+    is registered with the version it upgrades the database to, and `migrate` applies the ones
+    newer than the stored version in order, each inside its own transaction. This lets existing
+    `book_management.db` files pick up new indexes and schema changes in place.
+
+    Adding a schema change:
+        Write a function taking a `sqlite3.Cursor`, decorate it with
+        `@SchemaMigrator.register(<next version>, "<description>")` at the bottom of this module.
+        Never edit a migration that has already been released; add a new one instead.
+    """
+    _migrations = {}  # Maps a schema version to its (description, function) pair
+
+    @classmethod
+    def register(cls, version, description):
+        """
+        Decorator registering a migration function for the given schema version.
+
+        Args:
+            version (int): The schema version the database is at after the migration runs.
+            description (str): Short human-readable summary of the change.
+
+        Returns:
+            callable: The decorator, which returns the function unchanged.
+        """
+        def decorator(func):
+            if version in cls._migrations:
+                raise ValueError(f"Duplicate migration version: {version}")
+            cls._migrations[version] = (description, func)
+            return func
+        return decorator
+
+    @classmethod
+    def latest_version(cls):
+        """
+        Returns:
+            int: The highest registered schema version (0 if no migrations are registered).
+        """
+        return max(cls._migrations, default=0)
+
+    @staticmethod
+    def current_version(conn):
+        """
+        Reads the schema version of the database behind the given connection.
+
+        Args:
+            conn (sqlite3.Connection): The database connection.
+
+        Returns:
+            int: The value of `PRAGMA user_version`.
+        """
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    @classmethod
+    def migrate(cls, conn):
+        """
+        Applies every migration newer than the database's current schema version.
+
+        Each migration and the matching `user_version` bump run in a single transaction, so an
+        interrupted or failing migration leaves the database at the previous version.
+
+        Args:
+            conn (sqlite3.Connection): The database connection to migrate.
+
+        Returns:
+            list: The versions that were applied, in order.
+        """
+        applied = []
+        current = cls.current_version(conn)
+        for version in sorted(v for v in cls._migrations if v > current):
+            description, func = cls._migrations[version]
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                func(cursor)
+                # PRAGMA does not accept bound parameters; version is always an int we registered.
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error applying migration {version} ({description})")
+                print(f"Exception: {str(e)}")
+                raise
+            applied.append(version)
+        return applied
+
+
+@SchemaMigrator.register(1, "FTS5 full-text index over books")
+def _books_fts(cursor):
+    """
+    Creates the `books_fts` FTS5 index used by `Book.search` and the triggers that keep it in sync.
+
+    `books_fts` is an external-content table: it stores only the index, while the text itself
+    is read back from `books`. Rows already present in `books` are backfilled once.
+    """
+    cursor.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author, isbn,
+            content = 'books',
+            content_rowid = 'book_id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """
+    )
+
+    # Index every new book
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_after_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author, isbn)
+            VALUES (new.book_id, new.title, new.author, new.isbn);
+        END
+        """
+    )
+
+    # Drop deleted books from the index
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_after_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author, isbn)
+            VALUES ('delete', old.book_id, old.title, old.author, old.isbn);
+        END
+        """
+    )
+
+    # Re-index a book whenever its row changes (including ownership transfers)
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_after_update AFTER UPDATE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author, isbn)
+            VALUES ('delete', old.book_id, old.title, old.author, old.isbn);
+            INSERT INTO books_fts (rowid, title, author, isbn)
+            VALUES (new.book_id, new.title, new.author, new.isbn);
+        END
+        """
+    )
+
+    # Backfill for databases created before the index existed ('rebuild' is idempotent)
+    cursor.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+
+@SchemaMigrator.register(2, "Indexes for pending-request and owner lookups")
+def _hot_query_indexes(cursor):
+    """
+    Adds the indexes behind `Request.view_requests` and the owner-scoped book queries.
+
+    The implicit rowid suffix of `idx_requests_owner_status` also returns the rows in
+    `request_id` order, so `view_requests` needs no separate sort.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_requests_owner_status ON requests (owner_id, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_owner ON books (owner_id)")
+
+
+@SchemaMigrator.register(3, "Index for resolving competing requests per book")
+def _requests_book_index(cursor):
+    """
+    Lets `Request.update_request_statuses` reject the other pending requests for an accepted book
+    without scanning the `requests` table.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_requests_book_status ON requests (book_id, status)")
+
+
+@SchemaMigrator.register(4, "Session tokens")
+def _sessions(cursor):
+    """
+    Stores the SHA-256 digest of every issued session token, so a token is verified with one
+    primary-key lookup instead of a bcrypt check.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        ) WITHOUT ROWID
+        """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+
+
+@SchemaMigrator.register(5, "Book locations and transfer outbox for sharded mode")
+def _shard_routing(cursor):
+    """
+    In sharded mode a book lives on its owner's shard and moves when it changes hands.
+
+    `book_locations` is kept on the shard a book was created on (its "home" shard, encoded in its
+    ID) and records where the book lives now, if it has moved away. `book_transfers` is an outbox
+    on the source shard: a book leaving it is written there in the same transaction as the accepted
+    request and is copied to the target shard afterwards, so a crash between the two shards cannot
+    lose the book.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS book_locations (
+            book_id INTEGER PRIMARY KEY,
+            shard INTEGER NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS book_transfers (
+            book_id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT NOT NULL,
+            owner_id INTEGER NOT NULL,
+            target_shard INTEGER NOT NULL
+        )
+        """
+    )
+
+
+@SchemaMigrator.register(6, "Trigram index over book titles and authors")
+def _books_trigram(cursor):
+    """
+    Creates the `books_trigram` index used by `Book.fuzzy_search`.
+
+    The FTS5 trigram tokenizer indexes every three-character substring of the (case-folded) title
+    and author, so a misspelled keyword still shares most of its trigrams with the right book.
+    Like `books_fts` it is an external-content table over `books`, kept in sync by triggers.
+    """
+    cursor.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_trigram USING fts5(
+            title, author,
+            content = 'books',
+            content_rowid = 'book_id',
+            tokenize = 'trigram'
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_trigram_after_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_trigram (rowid, title, author) VALUES (new.book_id, new.title, new.author);
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_trigram_after_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_trigram (books_trigram, rowid, title, author)
+            VALUES ('delete', old.book_id, old.title, old.author);
+        END
+        """
+    )
+    # Unlike books_fts, only title/author edits re-index; ownership transfers leave the index alone
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_trigram_after_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_trigram (books_trigram, rowid, title, author)
+            VALUES ('delete', old.book_id, old.title, old.author);
+            INSERT INTO books_trigram (rowid, title, author) VALUES (new.book_id, new.title, new.author);
+        END
+        """
+    )
+    cursor.execute("INSERT INTO books_trigram (books_trigram) VALUES ('rebuild')")
+
+
+@SchemaMigrator.register(7, "Normalized ISBN-13 column")
+def _books_isbn13(cursor):
+    """
+    Adds `books.isbn13`, the book's ISBN as a bare ISBN-13 (see `models/isbn.py`), with a unique
+    index so ISBN searches are a single index lookup and differently formatted copies of the same
+    ISBN are rejected.
+
+    Existing rows are backfilled. Rows whose ISBN is not valid, or normalizes to the ISBN-13 of an
+    earlier book, keep a NULL `isbn13`. The `books_fts` update trigger is narrowed to the indexed
+    columns first, so the backfill (and ownership transfers) no longer re-index the full-text index.
+    """
+    cursor.execute("DROP TRIGGER IF EXISTS books_fts_after_update")
+    cursor.execute(
+        """
+        CREATE TRIGGER books_fts_after_update AFTER UPDATE OF title, author, isbn ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author, isbn)
+            VALUES ('delete', old.book_id, old.title, old.author, old.isbn);
+            INSERT INTO books_fts (rowid, title, author, isbn)
+            VALUES (new.book_id, new.title, new.author, new.isbn);
+        END
+        """
+    )
+
+    cursor.execute("ALTER TABLE books ADD COLUMN isbn13 TEXT")
+    cursor.execute("ALTER TABLE book_transfers ADD COLUMN isbn13 TEXT")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_books_isbn13 ON books (isbn13)")
+
+    # Backfill in book_id order, so the earliest copy of an ISBN keeps it; OR IGNORE skips later duplicates
+    conn = cursor.connection
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT book_id, isbn FROM books WHERE book_id > ? ORDER BY book_id LIMIT 5000", (last_id,)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        cursor.executemany(
+            "UPDATE OR IGNORE books SET isbn13 = ? WHERE book_id = ?",
+            [(isbn13, book_id) for book_id, isbn13 in ((row[0], normalize_isbn(row[1])) for row in rows) if isbn13],
+        )
+
+
+@SchemaMigrator.register(8, "Request event log")
+def _request_events(cursor):
+    """
+    Adds `request_events`, an append-only log of request changes that owners read incrementally
+    (see `Request.events_since`) instead of re-running the pending-requests join.
+
+    Triggers append one event when a request is made and one each time its status changes, in
+    the same transaction as the change. `request_event_cursors` remembers, per owner, the last
+    event the console has shown them. Requests still pending are backfilled as events, so they
+    count as new for owners who have not looked at them since the upgrade.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS request_events (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner_id INTEGER NOT NULL,
+            request_id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            requester_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )
+        """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_request_events_owner ON request_events (owner_id, event_id)")
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS request_event_cursors (
+            owner_id INTEGER PRIMARY KEY,
+            event_id INTEGER NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO request_events (owner_id, request_id, book_id, requester_id, status)
+        SELECT owner_id, request_id, book_id, requester_id, status FROM requests
+        WHERE status = 'Pending' ORDER BY request_id
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS requests_event_after_insert AFTER INSERT ON requests BEGIN
+            INSERT INTO request_events (owner_id, request_id, book_id, requester_id, status)
+            VALUES (new.owner_id, new.request_id, new.book_id, new.requester_id, new.status);
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS requests_event_after_status AFTER UPDATE OF status ON requests
+        WHEN old.status IS NOT new.status BEGIN
+            INSERT INTO request_events (owner_id, request_id, book_id, requester_id, status)
+            VALUES (new.owner_id, new.request_id, new.book_id, new.requester_id, new.status);
+        END
+        """
+    )
+
+
+@SchemaMigrator.register(9, "Per-user book and pending-request counters")
+def _user_stats(cursor):
+    """
+    Adds `user_stats`, one row per user with the number of books they own and of pending requests
+    made to them, so both counts are a primary-key read (see `UserStats`).
+
+    Triggers on `books` and `requests` keep the counters in step with inserts, deletes, ownership
+    transfers and status changes, in the same transaction. Users without a row have no books and
+    no pending requests. The counters of existing databases are computed from the tables.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            books_owned INTEGER NOT NULL DEFAULT 0,
+            pending_requests INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_stats_after_insert AFTER INSERT ON books BEGIN
+            INSERT INTO user_stats (user_id, books_owned) VALUES (new.owner_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET books_owned = books_owned + 1;
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_stats_after_delete AFTER DELETE ON books BEGIN
+            UPDATE user_stats SET books_owned = books_owned - 1 WHERE user_id = old.owner_id;
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_stats_after_transfer AFTER UPDATE OF owner_id ON books
+        WHEN old.owner_id IS NOT new.owner_id BEGIN
+            UPDATE user_stats SET books_owned = books_owned - 1 WHERE user_id = old.owner_id;
+            INSERT INTO user_stats (user_id, books_owned) VALUES (new.owner_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET books_owned = books_owned + 1;
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS requests_stats_after_insert AFTER INSERT ON requests
+        WHEN new.status = 'Pending' BEGIN
+            INSERT INTO user_stats (user_id, pending_requests) VALUES (new.owner_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET pending_requests = pending_requests + 1;
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS requests_stats_after_delete AFTER DELETE ON requests
+        WHEN old.status = 'Pending' BEGIN
+            UPDATE user_stats SET pending_requests = pending_requests - 1 WHERE user_id = old.owner_id;
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS requests_stats_after_update AFTER UPDATE OF status, owner_id ON requests BEGIN
+            UPDATE user_stats SET pending_requests = pending_requests - 1
+            WHERE old.status = 'Pending' AND user_id = old.owner_id;
+            INSERT INTO user_stats (user_id, pending_requests) SELECT new.owner_id, 1 WHERE new.status = 'Pending'
+            ON CONFLICT (user_id) DO UPDATE SET pending_requests = pending_requests + 1;
+        END
+        """
+    )
+    cursor.execute("DELETE FROM user_stats")
+    cursor.execute(
+        """
+        INSERT INTO user_stats (user_id, books_owned, pending_requests)
+        SELECT user_id, SUM(books), SUM(pending) FROM (
+            SELECT owner_id AS user_id, COUNT(*) AS books, 0 AS pending FROM books GROUP BY owner_id
+            UNION ALL
+            SELECT owner_id, 0, COUNT(*) FROM requests WHERE status = 'Pending' GROUP BY owner_id
+        )
+        GROUP BY user_id
+        """
+    )
+
+
+@SchemaMigrator.register(10, "One pending request per book and requester; request history table")
+def _request_history(cursor):
+    """
+    Prepares `requests` for archiving resolved requests into `requests_history` (see
+    `Request.archive_resolved`), so the hot table only holds pending and recently resolved rows.
+
+    - `requests.resolved_at` records when a request was accepted or rejected. Requests resolved
+      before this migration are stamped with the time of the upgrade.
+    - A partial unique index allows at most one pending request per book and requester. Existing
+      duplicates are rejected first, keeping the oldest request of each pair.
+    - `requests_history` stores archived requests, with an index for an owner's history.
+    """
+    now = int(time.time())
+    cursor.execute("ALTER TABLE requests ADD COLUMN resolved_at INTEGER")
+    cursor.execute("UPDATE requests SET resolved_at = ? WHERE status != 'Pending'", (now,))
+    cursor.execute(
+        """
+        UPDATE requests SET status = 'Rejected', resolved_at = ?
+        WHERE status = 'Pending' AND request_id NOT IN (
+            SELECT MIN(request_id) FROM requests WHERE status = 'Pending' GROUP BY book_id, requester_id
+        )
+        """,
+        (now,),
+    )
+    cursor.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_pending_once ON requests (book_id, requester_id)
+        WHERE status = 'Pending'
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_requests_resolved_at ON requests (resolved_at) WHERE resolved_at IS NOT NULL"
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS requests_history (
+            request_id INTEGER PRIMARY KEY,
+            book_id INTEGER NOT NULL,
+            requester_id INTEGER NOT NULL,
+            owner_id INTEGER NOT NULL,
+            status TEXT NOT NULL CHECK(status IN ('Accepted', 'Rejected')),
+            resolved_at INTEGER NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_requests_history_owner ON requests_history (owner_id, request_id)"
+    )
+
+
+@SchemaMigrator.register(11, "Change timestamps for incremental exports")
+def _updated_at(cursor):
+    """
+    Adds an `updated_at` column (Unix time) to `users`, `books` and `requests`, so exports can
+    select the rows changed since the previous run (see `controllers/exporter.py`).
+
+    Triggers stamp a row when it is inserted and whenever one of its columns changes; existing
+    rows are stamped with the time of the upgrade. The indexes on `updated_at` (which SQLite keys by
+    the row ID as well) let an incremental export read the changed rows in change order.
+    `requests_history` rows never change; they get an index on `resolved_at` instead.
+    """
+    now = int(time.time())
+    tables = (
+        ("users", "user_id", "username, password"),
+        ("books", "book_id", "title, author, isbn, isbn13, owner_id"),
+        ("requests", "request_id", "book_id, requester_id, owner_id, status, resolved_at"),
+    )
+    for table, key, columns in tables:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN updated_at INTEGER")
+        cursor.execute(f"UPDATE {table} SET updated_at = ?", (now,))
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_updated_at ON {table} (updated_at)")
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_updated_at_after_insert AFTER INSERT ON {table} BEGIN
+                UPDATE {table} SET updated_at = CAST(strftime('%s', 'now') AS INTEGER) WHERE {key} = new.{key};
+            END
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_updated_at_after_update AFTER UPDATE OF {columns} ON {table} BEGIN
+                UPDATE {table} SET updated_at = CAST(strftime('%s', 'now') AS INTEGER) WHERE {key} = new.{key};
+            END
+            """
+        )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_requests_history_resolved_at ON requests_history (resolved_at)"
+    )
+
+
+@SchemaMigrator.register(12, "Previous owner and request of in-flight book transfers")
+def _transfer_undo(cursor):
+    """
+    Records, for every book in the `book_transfers` outbox, the owner it had before the transfer
+    and the request whose acceptance moved it. A book the target shard refuses (e.g. its ISBN is
+    taken there) is then given back to its previous owner and the request rejected, instead of
+    staying in the outbox. Transfers staged before the upgrade keep NULLs and are restored with
+    their new owner.
+    """
+    cursor.execute("ALTER TABLE book_transfers ADD COLUMN previous_owner_id INTEGER")
+    cursor.execute("ALTER TABLE book_transfers ADD COLUMN request_id INTEGER")
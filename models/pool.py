@@ -0,0 +1,176 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import unquote
+from models.query_stats import InstrumentedConnection
+from models.retry import RetryPolicy
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections to a single database file.
+
+    Every thread gets its own connection, created on first use and reused afterwards, so
+    threads never share a `sqlite3.Connection`. The database runs in WAL mode: any number of
+    threads can read at the same time while one thread writes. Writes are serialized through
+    `write_lock` so writers queue up in-process instead of spinning on SQLite's busy handler.
+
+    `database` may also be an SQLite URI (`file:...`). An in-memory database must be a shared-cache
+    URI (`file:<name>?mode=memory&cache=shared`) so every thread sees the same data; the pool keeps
+    one extra connection open so the database lives until `close_all`. In-memory databases have no
+    WAL: a reader waits for the table locks of an open write transaction, and only ever sees
+    committed data. SQLite reports those locks as "database table is locked" without calling the
+    busy handler, so the default `retry` of an in-memory pool keeps retrying them for up to
+    `busy_timeout` instead.
+
+    Attributes:
+        - database (str): Path or URI of the SQLite database.
+        - path (str): The database file (a URI's path, without `file:` and the query string);
+          None for an in-memory database.
+        - pragmas (dict): PRAGMA settings applied to every new connection.
+        - write_lock (threading.RLock): Held for the duration of every write or transaction.
+        - retry (RetryPolicy): How operations on the pool retry when the database is busy or locked.
+        - changes (int): Rows inserted, updated or deleted by committed writes (including by triggers);
+          the write volume `DatabaseMaintenance` schedules its tasks by.
+    """
+
+    # Defaults tuned for an interactive, read-mostly workload:
+    # - WAL lets readers run alongside the single writer.
+    # - synchronous=NORMAL is durable across application crashes in WAL mode and avoids an fsync per commit.
+    # - A negative cache_size is in KiB (here ~32 MB of page cache per connection).
+    # - auto_vacuum=INCREMENTAL (only takes effect on new or fully vacuumed files) lets maintenance
+    #   give freed pages back to the file system a few at a time.
+    # - foreign_keys stays at SQLite's default (off): the FOREIGN KEY clauses in the schema document
+    #   the relations but are not enforced. Requests and history rows keep pointing at deleted books,
+    #   and in sharded mode rows reference users and books on other shards. Controllers check the
+    #   references they rely on in their own statements (e.g. `Request.save`).
+    DEFAULT_PRAGMAS = {
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "WAL",
+        "busy_timeout": 5000,
+        "synchronous": "NORMAL",
+        "cache_size": -32000,
+        "temp_store": "MEMORY",
+    }
+
+    def __init__(self, database, pragmas=None, retry=None):
+        """
+        Initialize a pool for the given database. Connections are opened lazily.
+
+        Args:
+            database (str): Path of the SQLite database file.
+            pragmas (dict, optional): Overrides merged on top of `DEFAULT_PRAGMAS`.
+            retry (RetryPolicy, optional): Retry policy for busy or locked errors (default: from the config,
+                                           retrying for up to `busy_timeout` in memory).
+        """
+        self.database = database
+        self.uri = database.startswith("file:")
+        self.memory = self.uri and "mode=memory" in database
+        self.path = None if self.memory else self._file_path(database) if self.uri else database
+        self.pragmas = {**self.DEFAULT_PRAGMAS, **(pragmas or {})}
+        self.write_lock = threading.RLock()
+        self.retry = retry or RetryPolicy(timeout=int(self.pragmas["busy_timeout"]) / 1000 if self.memory else None)
+        self.changes = 0
+        self._local = threading.local()  # Per-thread connection and transaction depth
+        self._connections = set()  # Every open connection, so they can all be closed
+        self._connections_lock = threading.Lock()
+        self._keeper = None  # Holds an in-memory database open between thread connections
+
+    @staticmethod
+    def _file_path(uri):
+        """
+        Returns:
+            str: The file an SQLite `file:` URI names, e.g. `books.db` for `file:books.db?mode=ro`
+                 and `/data/books.db` for `file:///data/books.db`.
+        """
+        path = uri.partition("?")[0].partition("#")[0][len("file:"):]
+        if path.startswith("//"):
+            path = path[path.index("/", 2):] if "/" in path[2:] else ""  # Drop the (empty or localhost) authority
+        return unquote(path)
+
+    def connection(self):
+        """
+        Returns the calling thread's connection, opening and configuring it on first use.
+
+        Returns:
+            sqlite3.Connection: A connection owned by the current thread.
+        """
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            # check_same_thread is off only so close_all() can close connections from another thread;
+            # each connection is still used by the thread that created it.
+            conn = sqlite3.connect(self.database, check_same_thread=False, factory=InstrumentedConnection, uri=self.uri)
+            try:
+                for name, value in self.pragmas.items():
+                    # Some pragmas need a lock (e.g. journal_mode on a busy shared-cache database)
+                    self.retry.call("connect", conn.cursor().execute, f"PRAGMA {name} = {value}")
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self._local.connection = conn
+            self._local.depth = 0
+            with self._connections_lock:
+                self._connections.add(conn)
+                if self.memory and self._keeper is None:
+                    self._keeper = sqlite3.connect(self.database, check_same_thread=False, uri=True)
+        return conn
+
+    def in_transaction(self):
+        """
+        Returns:
+            bool: True if the calling thread is inside a `transaction()` block.
+        """
+        return getattr(self._local, "depth", 0) > 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs a block of statements as one atomic write transaction on the calling thread's connection.
+
+        The write lock is held for the whole block and the changes are committed once at the end,
+        or rolled back if the block raises. Nested `transaction()` blocks join the outer one.
+        Starting the transaction is retried per `retry` if another connection holds the database lock.
+
+        Yields:
+            sqlite3.Connection: The connection to execute the statements on.
+        """
+        conn = self.connection()
+        with self.write_lock:
+            if self._local.depth > 0:
+                # Already inside a transaction on this thread: join it.
+                self._local.depth += 1
+                try:
+                    yield conn
+                finally:
+                    self._local.depth -= 1
+                return
+
+            # Nothing has run yet, so a busy or locked BEGIN is safe to retry
+            self.retry.call("transaction", conn.execute, "BEGIN IMMEDIATE")
+            self._local.depth = 1
+            before = conn.total_changes
+            try:
+                yield conn
+                conn.commit()
+                self.changes += conn.total_changes - before
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._local.depth = 0
+
+    def close_all(self):
+        """
+        Closes every connection opened by the pool. Threads reconnect on their next use.
+        """
+        with self._connections_lock:
+            connections, self._connections = self._connections, set()
+            if self._keeper is not None:
+                connections.add(self._keeper)  # Closed last connection: an in-memory database is dropped
+                self._keeper = None
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
@@ -0,0 +1,167 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("bookmate.queries")
+
+
+class QueryStats:
+    """
+    Per-statement query instrumentation with a slow-query log.
+
+    When enabled, every statement run through `DBManager` (or directly on a pooled connection)
+    is recorded under its normalized SQL text: call count, total and max latency, rows returned
+    (or affected) and errors. Statements slower than `slow_query_ms` are logged to the
+    `bookmate.queries` logger together with their `EXPLAIN QUERY PLAN`.
+
+    Instrumentation is off by default; the only cost when disabled is one attribute check per
+    statement. Enable it with `QueryStats.enable()` or the environment variables
+    `BOOKMATE_QUERY_STATS=1` and `BOOKMATE_SLOW_QUERY_MS=<threshold>`.
+    """
+    enabled = os.environ.get("BOOKMATE_QUERY_STATS", "") not in ("", "0")
+    slow_query_ms = float(os.environ.get("BOOKMATE_SLOW_QUERY_MS", 100))
+
+    _stats = {}  # Normalized SQL -> [calls, total seconds, max seconds, rows, errors]
+    _lock = threading.Lock()
+
+    @classmethod
+    def enable(cls, slow_query_ms=None):
+        """
+        Turns instrumentation on.
+
+        Args:
+            slow_query_ms (float, optional): New slow-query threshold in milliseconds.
+        """
+        if slow_query_ms is not None:
+            cls.slow_query_ms = slow_query_ms
+        cls.enabled = True
+
+    @classmethod
+    def disable(cls):
+        """
+        Turns instrumentation off. Collected statistics are kept until `reset`.
+        """
+        cls.enabled = False
+
+    @classmethod
+    def reset(cls):
+        """
+        Discards all collected statistics.
+        """
+        with cls._lock:
+            cls._stats = {}
+
+    @staticmethod
+    def normalize(query):
+        """
+        Args:
+            query (str): SQL text as passed to the database.
+
+        Returns:
+            str: The statement with whitespace collapsed, used as the statistics key.
+        """
+        return re.sub(r"\s+", " ", query).strip()
+
+    @classmethod
+    def record(cls, conn, query, params, elapsed, rows=0, error=False):
+        """
+        Records one execution of a statement and logs it if it was slow.
+
+        Args:
+            conn (sqlite3.Connection): The connection that ran the statement (used for EXPLAIN).
+            query (str): The SQL text.
+            params (tuple): The bound parameters.
+            elapsed (float): Execution time in seconds.
+            rows (int): Rows returned or affected.
+            error (bool): Whether the statement raised.
+        """
+        key = cls.normalize(query)
+        with cls._lock:
+            entry = cls._stats.get(key)
+            if entry is None:
+                entry = cls._stats[key] = [0, 0.0, 0.0, 0, 0]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+            entry[3] += max(rows, 0)
+            entry[4] += int(error)
+
+        if elapsed * 1000 >= cls.slow_query_ms:
+            logger.warning(
+                "Slow query (%.1f ms, %d rows): %s params=%r\n  plan: %s",
+                elapsed * 1000, rows, key, params, cls.explain(conn, query, params),
+            )
+
+    @staticmethod
+    def explain(conn, query, params):
+        """
+        Returns:
+            str: The `EXPLAIN QUERY PLAN` steps of a statement joined with "; ", or the error raised.
+        """
+        if not params:
+            params = (None,) * query.count("?")  # executemany records no parameters; any values will do
+        try:
+            # Bypass any instrumented execute() so explaining is never recorded itself.
+            rows = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+            return "; ".join(row[3] for row in rows) or "no table access"
+        except sqlite3.Error as e:
+            return f"unavailable ({e})"
+
+    @classmethod
+    def snapshot(cls):
+        """
+        Returns:
+            list: One dict per statement (`query`, `calls`, `total_ms`, `avg_ms`, `max_ms`, `rows`,
+                  `errors`), sorted by total time spent, most expensive first.
+        """
+        with cls._lock:
+            items = [(key, list(entry)) for key, entry in cls._stats.items()]
+        stats = [
+            {
+                "query": key,
+                "calls": calls,
+                "total_ms": total * 1000,
+                "avg_ms": total * 1000 / calls,
+                "max_ms": longest * 1000,
+                "rows": rows,
+                "errors": errors,
+            }
+            for key, (calls, total, longest, rows, errors) in items
+        ]
+        return sorted(stats, key=lambda s: s["total_ms"], reverse=True)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    `sqlite3.Connection` that records `execute`/`executemany` calls in `QueryStats` when enabled.
+
+    Used by the connection pool so statements run directly on a connection (e.g. inside
+    `DBManager.transaction()`) are instrumented as well as those run through `DBManager`.
+    """
+
+    def execute(self, sql, parameters=()):
+        if not QueryStats.enabled:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            cursor = super().execute(sql, parameters)
+        except sqlite3.Error:
+            QueryStats.record(self, sql, parameters, time.perf_counter() - started, error=True)
+            raise
+        QueryStats.record(self, sql, parameters, time.perf_counter() - started, cursor.rowcount)
+        return cursor
+
+    def executemany(self, sql, seq_of_parameters):
+        if not QueryStats.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            cursor = super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error:
+            QueryStats.record(self, sql, (), time.perf_counter() - started, error=True)
+            raise
+        QueryStats.record(self, sql, (), time.perf_counter() - started, cursor.rowcount)
+        return cursor
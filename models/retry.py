@@ -0,0 +1,157 @@
+import logging
+import random
+import threading
+import time
+from models.config import Config
+from models.errors import is_contention
+
+logger = logging.getLogger("bookmate.contention")
+
+
+class ContentionStats:
+    """
+    Process-wide counters of lock contention and the retries it caused, per kind of operation
+    ("read", "write", "stream", "transaction").
+
+    For every kind: how many operations hit a busy or locked database at least once, how many
+    retries that took, how many then succeeded or gave up, and the total and longest time spent
+    backing off. Counters are only touched when contention happens, so they cost nothing otherwise.
+    Watch `retries` and `gave_up` grow with concurrency to see lock pressure build.
+    """
+
+    _stats = {}  # Kind -> [contended, retries, recovered, gave_up, wait seconds, max wait seconds]
+    _lock = threading.Lock()
+
+    @classmethod
+    def record(cls, kind, retries, waited, gave_up):
+        """
+        Records one operation that met contention.
+
+        Args:
+            kind (str): The kind of operation.
+            retries (int): Retries it took (0 if it gave up at once).
+            waited (float): Seconds spent backing off.
+            gave_up (bool): True if it still failed after the last retry.
+        """
+        with cls._lock:
+            entry = cls._stats.setdefault(kind, [0, 0, 0, 0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += retries
+            entry[2] += int(not gave_up)
+            entry[3] += int(gave_up)
+            entry[4] += waited
+            entry[5] = max(entry[5], waited)
+
+    @classmethod
+    def reset(cls):
+        """
+        Discards all counters.
+        """
+        with cls._lock:
+            cls._stats = {}
+
+    @classmethod
+    def snapshot(cls):
+        """
+        Returns:
+            list: One dict per kind of operation (kind, contended, retries, recovered, gave_up,
+                  wait_ms, max_wait_ms), most contended first.
+        """
+        with cls._lock:
+            items = [(kind, list(entry)) for kind, entry in cls._stats.items()]
+        stats = [
+            {
+                "kind": kind,
+                "contended": contended,
+                "retries": retries,
+                "recovered": recovered,
+                "gave_up": gave_up,
+                "wait_ms": waited * 1000,
+                "max_wait_ms": max_waited * 1000,
+            }
+            for kind, (contended, retries, recovered, gave_up, waited, max_waited) in items
+        ]
+        return sorted(stats, key=lambda s: s["contended"], reverse=True)
+
+
+class RetryPolicy:
+    """
+    Retries operations that fail with SQLITE_BUSY or SQLITE_LOCKED, using exponential backoff with
+    full jitter: before retry n the caller sleeps a random time between 0 and
+    `min(max_delay, base_delay * 2 ** n)`, so concurrent losers spread out instead of colliding again.
+
+    SQLite's own busy timeout already waits for most locks; what still fails fast are the cases it
+    does not wait for (a deferred read transaction that cannot be upgraded to a write, shared-cache
+    table locks in in-memory mode) and locks held past the timeout by another process. Other errors
+    are never retried.
+
+    Settings (`Config`): `BOOKMATE_RETRY_ATTEMPTS` (default 5, 1 turns retries off),
+    `BOOKMATE_RETRY_BASE_MS` (default 5) and `BOOKMATE_RETRY_MAX_MS` (default 500).
+
+    Attributes:
+        - attempts (int): Most tries per operation, the first included.
+        - base_delay, max_delay (float): Backoff bounds in seconds.
+        - timeout (float): Seconds an operation keeps retrying, however many tries that takes
+          (None: only `attempts` counts).
+    """
+
+    def __init__(self, attempts=None, base_delay=None, max_delay=None, timeout=None):
+        """
+        Args:
+            attempts (int, optional): Most tries per operation, the first included.
+            base_delay (float, optional): Upper bound of the first backoff, in seconds.
+            max_delay (float, optional): Upper bound of any backoff, in seconds.
+            timeout (float, optional): Keep retrying for at least this many seconds, standing in
+                                       for SQLite's busy timeout where it does not apply.
+        """
+        self.attempts = max(1, attempts if attempts is not None else Config.get_int("retry_attempts", 5))
+        self.base_delay = base_delay if base_delay is not None else float(Config.get("retry_base_ms", 5)) / 1000
+        self.max_delay = max_delay if max_delay is not None else float(Config.get("retry_max_ms", 500)) / 1000
+        self.timeout = timeout
+
+    def delay(self, retry):
+        """
+        Args:
+            retry (int): The retry about to be made (0 for the first).
+
+        Returns:
+            float: Seconds to sleep before it.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def call(self, kind, func, *args):
+        """
+        Calls `func(*args)`, retrying while it fails with lock contention.
+
+        Args:
+            kind (str): The kind of operation, for `ContentionStats`.
+            func (callable): The operation. It must be safe to repeat after a contention failure
+                             (nothing it did was committed).
+
+        Returns:
+            The result of `func`.
+
+        Raises:
+            Exception: The error of the last try if it was not contention or the retries ran out.
+        """
+        retries, waited = 0, 0.0
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        while True:
+            try:
+                result = func(*args)
+            except Exception as e:
+                if not is_contention(e):
+                    raise
+                if retries + 1 >= self.attempts and (deadline is None or time.monotonic() >= deadline):
+                    ContentionStats.record(kind, retries, waited, gave_up=True)
+                    logger.warning("%s gave up after %d tries (%.0f ms backing off): %s",
+                                   kind, retries + 1, waited * 1000, e)
+                    raise
+                pause = self.delay(retries)
+                time.sleep(pause)
+                retries += 1
+                waited += pause
+            else:
+                if retries:
+                    ContentionStats.record(kind, retries, waited, gave_up=False)
+                return result
@@ -0,0 +1,316 @@
+import contextvars
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from models.errors import ConstraintError, DatabaseError
+from models.pool import ConnectionPool
+from models.writer import WriteQueue
+
+logger = logging.getLogger("bookmate.sharding")
+
+SHARD_BITS = 40  # Row IDs of shard i start at i << SHARD_BITS, so an ID names the shard it was created on
+
+_current_shard = contextvars.ContextVar("bookmate_shard", default=0)
+_memory_ids = itertools.count(1)  # Distinguishes the in-memory databases of separate shard sets
+
+
+class ShardSet:
+    """
+    A set of SQLite database files ("shards") that together hold the application's data.
+
+    Data is partitioned by owner: a user lives on the shard picked by hashing their username, and
+    their books, the requests made for those books and their sessions live on the same shard.
+    Each shard has its own connection pool and writer thread, so writes to different shards run
+    in parallel. With a single shard this is exactly the unsharded database.
+
+    Row IDs are globally unique: the AUTOINCREMENT sequences of shard i start at `i << SHARD_BITS`,
+    so `shard_of_id` tells from an ID which shard the row was created on. Users and requests never
+    move. A book moves to its new owner's shard when a request for it is accepted; its ID stays
+    the same and its home shard (the one named by the ID) keeps a pointer in `book_locations`.
+
+    The shard used by `DBManager` is selected per thread/task with `use()`.
+
+    Attributes:
+        - count (int): Number of shards.
+        - paths (list): Database file of each shard; shard 0 is the configured database itself.
+        - pools (list): `ConnectionPool` of each shard.
+    """
+
+    def __init__(self, database, count=1):
+        """
+        Args:
+            database (str): Path or SQLite URI of the main database (shard 0). ":memory:" creates
+                            fresh shared-cache in-memory databases, dropped when the shard set is closed.
+            count (int): Number of shards.
+        """
+        if count < 1:
+            raise ValueError("At least one shard is required")
+        if database == ":memory:":
+            database = f"file:bookmate-memory-{os.getpid()}-{next(_memory_ids)}?mode=memory&cache=shared"
+        self.count = count
+        self.paths = self.paths_for(database, count)
+        self.pools = [ConnectionPool(path) for path in self.paths]
+        self._writers = [None] * count
+        self._executor = None  # Thread pool for scatter-gather reads, created on first use
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def paths_for(database, count):
+        """
+        Returns:
+            list: Database file of each shard, e.g. `books.db`, `books.shard1.db`, `books.shard2.db`.
+                  For URIs the suffix goes before the query string (`file:books.shard1.db?mode=ro`).
+        """
+        path, separator, query = database.partition("?") if database.startswith("file:") else (database, "", "")
+        root, ext = os.path.splitext(path)
+        return [database] + [f"{root}.shard{index}{ext}{separator}{query}" for index in range(1, count)]
+
+    @staticmethod
+    def current():
+        """
+        Returns:
+            int: The shard selected for the calling thread or task (0 by default).
+        """
+        return _current_shard.get()
+
+    @staticmethod
+    @contextmanager
+    def use(index):
+        """
+        Context manager selecting the shard `DBManager` operations run on inside the block.
+
+        Args:
+            index (int): The shard to use.
+        """
+        token = _current_shard.set(index)
+        try:
+            yield index
+        finally:
+            _current_shard.reset(token)
+
+    def pool(self, index=None):
+        """
+        Returns:
+            ConnectionPool: The pool of the given shard (default: the current one).
+        """
+        return self.pools[self.current() if index is None else index]
+
+    def writer(self, index=None):
+        """
+        Returns:
+            WriteQueue: The write queue of the given shard (default: the current one), created on first use.
+        """
+        index = self.current() if index is None else index
+        with self._lock:
+            if self._writers[index] is None:
+                self._writers[index] = WriteQueue(self.pools[index])
+            return self._writers[index]
+
+    def shard_of_id(self, row_id):
+        """
+        Args:
+            row_id (int): A user, book or request ID.
+
+        Returns:
+            int: The shard the row was created on.
+        """
+        index = int(row_id) >> SHARD_BITS
+        if not 0 <= index < self.count:
+            raise ValueError(f"ID {row_id} belongs to shard {index}, but only {self.count} shards are configured")
+        return index
+
+    def shard_for_key(self, key):
+        """
+        Returns:
+            int: The shard a new row partitioned by `key` (e.g. a username) is placed on.
+        """
+        return zlib.crc32(str(key).encode("utf-8")) % self.count
+
+    def scatter(self, func, *args):
+        """
+        Run `func(*args)` once on every shard, in parallel, and gather the results.
+
+        Each call runs on a worker thread with its shard selected, so `DBManager` calls inside
+        `func` go to that shard. With a single shard, `func` runs inline; so do all calls made
+        from inside a transaction, which only the calling thread's connections can see.
+
+        Returns:
+            list: The result of each shard, in shard order.
+        """
+        if self.count == 1:
+            with self.use(0):
+                return [func(*args)]
+        if any(pool.in_transaction() for pool in self.pools):
+            return [self._run_on(index, func, args) for index in range(self.count)]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.count, thread_name_prefix="bookmate-shard")
+            executor = self._executor
+        futures = [executor.submit(self._run_on, index, func, args) for index in range(self.count)]
+        return [future.result() for future in futures]
+
+    def _run_on(self, index, func, args):
+        with self.use(index):
+            return func(*args)
+
+    def seed_sequences(self, conn, index):
+        """
+        Start the AUTOINCREMENT sequences of a shard at its ID range.
+
+        Args:
+            conn (sqlite3.Connection): A connection to the shard.
+            index (int): The shard's index.
+        """
+        base = index << SHARD_BITS
+        if base == 0:
+            return
+        for table in ("users", "books", "requests"):
+            conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                (table, base, table),
+            )
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?", (base, table, base))
+        conn.commit()
+
+    def stage_transfer(self, conn, book_id, target, previous_owner_id=None, request_id=None):
+        """
+        Move a book out of the current shard as part of the caller's transaction.
+
+        The book (already updated to its new owner) is copied into the `book_transfers` outbox and
+        deleted from `books`. Once the transaction has committed, call `apply_transfers` to copy it
+        to the target shard.
+
+        Args:
+            conn (sqlite3.Connection): The source shard's connection, inside a transaction.
+            book_id (int): The book to move.
+            target (int): The shard of the book's new owner.
+            previous_owner_id (int, optional): The owner the book goes back to if it cannot be delivered.
+            request_id (int, optional): The accepted request, rejected if the book cannot be delivered.
+        """
+        conn.execute(
+            """INSERT OR REPLACE INTO book_transfers
+                   (book_id, title, author, isbn, isbn13, owner_id, target_shard, previous_owner_id, request_id)
+               SELECT book_id, title, author, isbn, isbn13, owner_id, ?, ?, ? FROM books WHERE book_id = ?
+            """,
+            (target, previous_owner_id, request_id, book_id),
+        )
+        conn.execute("DELETE FROM books WHERE book_id = ?", (book_id,))
+
+    def apply_transfers(self, source):
+        """
+        Deliver every book waiting in a shard's transfer outbox to its target shard.
+
+        Each step is idempotent, so a transfer interrupted by a crash is completed by the next call
+        (`DBManager.setup_database` calls this for every shard). Shards are locked one at a time,
+        never nested, so concurrent transfers in opposite directions cannot deadlock.
+
+        A book the target shard refuses with a constraint violation (e.g. another copy of its ISBN
+        is already there) is never delivered, so the transfer is undone: the book goes back into the
+        source shard with its previous owner and the accepted request is marked "Rejected". Other
+        failures (e.g. the target stayed locked) leave the book in the outbox for the next call.
+        Both are logged to the `bookmate.sharding` logger.
+
+        Args:
+            source (int): The shard whose outbox is drained.
+
+        Returns:
+            list: The IDs of the requests whose transfer was undone.
+        """
+        pending = self.pools[source].connection().execute(
+            "SELECT book_id, title, author, isbn, isbn13, owner_id, target_shard, previous_owner_id, request_id"
+            " FROM book_transfers -- allow-scan: the outbox only holds in-flight transfers"
+        ).fetchall()
+
+        undone = []
+        for book_id, title, author, isbn, isbn13, owner_id, target, previous_owner_id, request_id in pending:
+            try:
+                self._deliver(source, target, book_id, (title, author, isbn, isbn13, owner_id))
+            except sqlite3.Error as e:
+                error = DatabaseError.from_sqlite(e)
+                if not isinstance(error, ConstraintError):
+                    logger.warning("Book %s stays in the outbox of shard %d (target shard %d): %s",
+                                   book_id, source, target, error)
+                    continue
+                logger.error("Shard %d refused book %s from shard %d, undoing the transfer: %s",
+                             target, book_id, source, error)
+                try:
+                    restored_owner = previous_owner_id if previous_owner_id is not None else owner_id
+                    self._undo_transfer(source, book_id, (title, author, isbn, isbn13), restored_owner, request_id)
+                except sqlite3.Error as e:
+                    logger.error("Could not undo the transfer of book %s; it stays in the outbox of shard %d: %s",
+                                 book_id, source, DatabaseError.from_sqlite(e))
+                    continue
+                if request_id is not None:
+                    undone.append(request_id)
+        return undone
+
+    def _deliver(self, source, target, book_id, book):
+        """
+        Copy one book from the outbox of `source` to `target`, then complete the transfer.
+        """
+        # Step 1: Insert the book on the target shard under its original ID
+        with self.pools[target].transaction() as conn:
+            self._insert_book(conn, book_id, book)
+
+        # Step 2: Point the book's home shard at its new location
+        home = self.shard_of_id(book_id)
+        with self.pools[home].transaction() as conn:
+            if home == target:
+                conn.execute("DELETE FROM book_locations WHERE book_id = ?", (book_id,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO book_locations (book_id, shard) VALUES (?, ?)", (book_id, target))
+
+        # Step 3: The transfer is complete
+        with self.pools[source].transaction() as conn:
+            conn.execute("DELETE FROM book_transfers WHERE book_id = ?", (book_id,))
+
+    def _undo_transfer(self, source, book_id, book, owner_id, request_id):
+        """
+        Put a book the target shard refused back into `source` with `owner_id`, in one transaction
+        with rejecting the request that moved it. The book's location is unchanged: it never left.
+        """
+        with self.pools[source].transaction() as conn:
+            self._insert_book(conn, book_id, (*book, owner_id))
+            if request_id is not None:
+                conn.execute(
+                    "UPDATE requests SET status = 'Rejected' WHERE request_id = ? AND status = 'Accepted'",
+                    (request_id,),
+                )
+            conn.execute("DELETE FROM book_transfers WHERE book_id = ?", (book_id,))
+
+    @staticmethod
+    def _insert_book(conn, book_id, book):
+        """
+        Insert a book coming from another shard under its original ID.
+        """
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'books'").fetchone()
+        conn.execute(
+            """INSERT INTO books (book_id, title, author, isbn, isbn13, owner_id) VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (book_id) DO UPDATE SET owner_id = excluded.owner_id
+            """,
+            (book_id, *book),
+        )
+        if seq is not None:
+            # A book from a higher shard must not advance this shard's ID sequence
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'books'", (seq[0],))
+
+    def close(self):
+        """
+        Stop the writer threads (after applying queued writes) and close every connection.
+        """
+        with self._lock:
+            writers, self._writers = self._writers, [None] * self.count
+            executor, self._executor = self._executor, None
+        for writer in writers:
+            if writer is not None:
+                writer.close()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for pool in self.pools:
+            pool.close_all()
@@ -0,0 +1,225 @@
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from models.sharding import ShardSet
+
+_current_tenant = contextvars.ContextVar("bookmate_tenant", default=None)
+
+TENANT_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}")  # Also a safe file name
+
+
+class _Tenant:
+    """
+    An open tenant: its shard set, when it was last used and how many blocks are using it.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.last_used = time.monotonic()
+        self.active = 0
+        self.ready = False
+        self.setup_lock = threading.Lock()
+
+
+class TenantRegistry:
+    """
+    Keeps the databases of many independent libraries ("tenants") open in one process.
+
+    Every tenant has its own database file (`<directory>/<tenant>.db`, plus shard files in
+    sharded mode) with its own connection pools and writer threads. At most `max_open` tenants
+    are open at a time: opening another closes the least recently used idle one, and tenants idle
+    for longer than `idle_seconds` are closed as well, so file descriptors and writer threads stay
+    bounded however many tenants there are. Idle tenants are looked for by `evict_idle` (run by
+    `DatabaseMaintenance`) and, so they are closed with maintenance turned off too, whenever the
+    registry is used, at most every `idle_seconds / 2`. A closed tenant is reopened on its next use. Tenants in
+    use (inside a `use` block) are never closed; if all are in use, `max_open` is exceeded until one
+    is released.
+
+    The tenant of the calling thread or task is selected with `use`; `DBManager` then runs every
+    operation against that tenant's database.
+
+    Attributes:
+        - directory (str): Where the tenants' database files live.
+        - max_open (int): Most tenants kept open.
+        - idle_seconds (float): Idle time after which an open tenant is closed.
+        - opened, evicted (int): Number of times a tenant was opened and closed.
+    """
+
+    def __init__(self, directory, shards=1, max_open=64, idle_seconds=300.0, setup=None):
+        """
+        Args:
+            directory (str): Where the tenants' database files live (created if missing).
+            shards (int): Number of shards of every tenant's database.
+            max_open (int): Most tenants kept open.
+            idle_seconds (float): Idle time after which an open tenant is closed.
+            setup (callable, optional): Called with a tenant's `ShardSet` the first time it is opened
+                                        in the process (e.g. to create the schema).
+        """
+        self.directory = directory
+        self.shard_count = shards
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.setup = setup
+        self.opened = 0
+        self.evicted = 0
+        self._open = OrderedDict()  # Tenant -> _Tenant, least recently used first
+        self._idle_check_at = time.monotonic() + idle_seconds / 2  # Next look for idle tenants on access
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def current():
+        """
+        Returns:
+            str or None: The tenant selected for the calling thread or task.
+        """
+        return _current_tenant.get()
+
+    @contextmanager
+    def use(self, tenant):
+        """
+        Context manager selecting the tenant `DBManager` operations run on inside the block.
+        The tenant's database stays open until the block exits. Entering the block does no I/O,
+        so it is safe on an event loop.
+
+        Args:
+            tenant (str): The tenant name (letters, digits, "_" and "-"; at most 64 characters).
+        """
+        self._validate(tenant)
+        with self._lock:
+            entry = self._acquire(tenant)
+            entry.active += 1
+        token = _current_tenant.set(tenant)
+        try:
+            yield tenant  # The database is set up by its first operation (see `shards`), not here
+        finally:
+            _current_tenant.reset(token)
+            with self._lock:
+                entry.active -= 1
+                entry.last_used = time.monotonic()
+                stale = self._take_evictable(idle_only=False) if len(self._open) > self.max_open else []
+            self._close(stale)
+
+    def shards(self, tenant):
+        """
+        Returns:
+            ShardSet: The shards of a tenant's database, opened (and set up) if needed.
+        """
+        with self._lock:
+            entry = self._acquire(tenant)
+        self._ensure_ready(entry)
+        return entry.shards
+
+    def path_for(self, tenant):
+        """
+        Returns:
+            str: The database file of a tenant (its shard 0).
+        """
+        self._validate(tenant)
+        return os.path.join(self.directory, f"{tenant}.db")
+
+    def open_shard_sets(self):
+        """
+        Returns:
+            list: The `ShardSet` of every open tenant.
+        """
+        with self._lock:
+            return [entry.shards for entry in self._open.values() if entry.ready]
+
+    def evict_idle(self):
+        """
+        Closes every tenant not used for `idle_seconds`.
+
+        Returns:
+            int: Number of tenants closed.
+        """
+        with self._lock:
+            stale = self._take_evictable(idle_only=True)
+        self._close(stale)
+        return len(stale)
+
+    def close(self):
+        """
+        Closes every open tenant (used at shutdown).
+        """
+        with self._lock:
+            entries, self._open = list(self._open.values()), OrderedDict()
+        for entry in entries:
+            entry.shards.close()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Open, active, opened and evicted tenant counts.
+        """
+        with self._lock:
+            return {
+                "open": len(self._open),
+                "active": sum(1 for entry in self._open.values() if entry.active),
+                "max_open": self.max_open,
+                "opened": self.opened,
+                "evicted": self.evicted,
+            }
+
+    def _acquire(self, tenant):
+        """
+        Returns the tenant's entry, opening it if needed and marking it most recently used.
+        Called with `_lock` held; tenants pushed out by the LRU are closed on another thread.
+        """
+        entry = self._open.get(tenant)
+        if entry is not None:
+            self._open.move_to_end(tenant)
+            entry.last_used = time.monotonic()
+            stale = self._take_evictable(idle_only=True, keep=tenant) if entry.last_used >= self._idle_check_at else []
+        else:
+            entry = self._open[tenant] = _Tenant(ShardSet(self.path_for(tenant), self.shard_count))
+            self.opened += 1
+            stale = self._take_evictable(idle_only=False, keep=tenant)
+        if stale:
+            # Closing joins writer threads; never do that while holding the registry lock
+            threading.Thread(target=self._close, args=(stale,), name="bookmate-tenant-close", daemon=True).start()
+        return entry
+
+    def _take_evictable(self, idle_only, keep=None):
+        """
+        Removes and returns the entries to close: idle ones, and (unless `idle_only`) the least
+        recently used ones beyond `max_open`, except `keep`. Called with `_lock` held.
+        """
+        now = time.monotonic()
+        self._idle_check_at = now + self.idle_seconds / 2
+        stale = []
+        excess = len(self._open) - self.max_open
+        for tenant, entry in list(self._open.items()):
+            if entry.active or tenant == keep:
+                continue
+            if (not idle_only and excess > 0) or now - entry.last_used >= self.idle_seconds:
+                stale.append(self._open.pop(tenant))
+                excess -= 1
+        self.evicted += len(stale)
+        return stale
+
+    def _ensure_ready(self, entry):
+        """
+        Runs `setup` on a newly opened tenant; concurrent first users wait for it.
+        """
+        if entry.ready:
+            return
+        with entry.setup_lock:
+            if not entry.ready:
+                if self.setup is not None:
+                    self.setup(entry.shards)
+                entry.ready = True
+
+    @staticmethod
+    def _close(entries):
+        for entry in entries:
+            entry.shards.close()
+
+    @staticmethod
+    def _validate(tenant):
+        if not isinstance(tenant, str) or not TENANT_NAME.fullmatch(tenant):
+            raise ValueError(f"Invalid tenant name: {tenant!r}")
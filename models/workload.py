@@ -0,0 +1,170 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_session = contextvars.ContextVar("bookmate_workload_session", default=None)
+_recording = contextvars.ContextVar("bookmate_workload_depth", default=0)
+
+
+class WorkloadRecorder:
+    """
+    Records the controller operations sessions perform, as an operation log for `tools/replay.py`.
+
+    When enabled, each call of a controller method marked with `WorkloadRecorder.operation` is
+    appended to the log as one JSON line: the session it belongs to, the operation name, its
+    arguments, when it started (`at`, Unix time), how long it took (`ms`) and whether it raised
+    (`ok`). Streaming operations also record how many rows the caller consumed (`rows`), and
+    their `ms` only counts the time spent producing those rows. Only the outermost operation is
+    recorded; operations called by other operations are part of the caller's timing.
+
+    Passwords are never written to the log (they are recorded as null). Session token lookups
+    are not recorded either, since the tokens would not be valid on another copy of the database.
+
+    Recording is off by default; the only cost when disabled is one attribute check per call.
+    Enable it with `WorkloadRecorder.enable(path)` or the environment variable
+    `BOOKMATE_RECORD=<path>`. Several processes may append to the same log.
+    """
+    enabled = False
+    path = None
+
+    _file = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def enable(cls, path):
+        """
+        Starts appending operations to a log file.
+
+        Args:
+            path (str): The operation log (JSON Lines), created if missing.
+        """
+        with cls._lock:
+            if cls._file is not None:
+                cls._file.close()
+            cls._file = open(path, "a", encoding="utf-8", buffering=1)  # Line-buffered: one write per operation
+            cls.path = path
+            cls.enabled = True
+
+    @classmethod
+    def disable(cls):
+        """
+        Stops recording and closes the log.
+        """
+        with cls._lock:
+            cls.enabled = False
+            if cls._file is not None:
+                cls._file.close()
+                cls._file = None
+
+    @staticmethod
+    @contextmanager
+    def session(name):
+        """
+        Context manager naming the session operations inside the block belong to (e.g. one HTTP
+        client or one logged-in user). Outside any block, the session is the process and thread.
+
+        Args:
+            name (str): The session name.
+        """
+        token = _session.set(str(name))
+        try:
+            yield
+        finally:
+            _session.reset(token)
+
+    @classmethod
+    def operation(cls, name, capture=None):
+        """
+        Decorator marking a controller method as a recordable operation.
+
+        Args:
+            name (str): The operation name in the log, e.g. "Book.search".
+            capture (callable, optional): Maps the call's arguments to the JSON list recorded as
+                `args` (e.g. to leave out `self` or a password). Defaults to the positional arguments,
+                with keyword arguments recorded as `kwargs`.
+        """
+        def decorate(func):
+            if inspect.isgeneratorfunction(func):
+                @functools.wraps(func)
+                def wrapper(*args, **kwargs):
+                    if not cls.enabled or _recording.get():
+                        return func(*args, **kwargs)
+                    return cls._record_stream(name, func, capture, args, kwargs)
+            else:
+                @functools.wraps(func)
+                def wrapper(*args, **kwargs):
+                    if not cls.enabled or _recording.get():
+                        return func(*args, **kwargs)
+                    at, started, ok = time.time(), time.perf_counter(), False
+                    depth = _recording.set(1)
+                    try:
+                        result = func(*args, **kwargs)
+                        ok = True
+                        return result
+                    finally:
+                        _recording.reset(depth)
+                        cls._write(name, capture, args, kwargs, at, time.perf_counter() - started, ok)
+            return wrapper
+        return decorate
+
+    @classmethod
+    def _record_stream(cls, name, func, capture, args, kwargs):
+        """
+        Generator behind a recorded streaming operation; records it once the caller is done with it.
+        """
+        at, elapsed, rows, ok = time.time(), 0.0, 0, False
+        stream = func(*args, **kwargs)
+        try:
+            while True:
+                started = time.perf_counter()
+                depth = _recording.set(1)
+                try:
+                    row = next(stream)
+                except StopIteration:
+                    ok = True
+                    return
+                finally:
+                    _recording.reset(depth)
+                    elapsed += time.perf_counter() - started
+                rows += 1
+                yield row
+        except GeneratorExit:
+            ok = True  # The caller stopped early, e.g. after the first page
+            raise
+        finally:
+            stream.close()
+            cls._write(name, capture, args, kwargs, at, elapsed, ok, rows)
+
+    @classmethod
+    def _write(cls, name, capture, args, kwargs, at, elapsed, ok, rows=None):
+        """
+        Appends one operation to the log.
+        """
+        session = _session.get()
+        if session is None:
+            session = f"{os.getpid()}-{threading.current_thread().name}"
+        entry = {
+            "session": session,
+            "op": name,
+            "args": capture(*args, **kwargs) if capture else list(args),
+            "at": round(at, 6),
+            "ms": round(elapsed * 1000, 3),
+            "ok": ok,
+        }
+        if kwargs and not capture:
+            entry["kwargs"] = kwargs
+        if rows is not None:
+            entry["rows"] = rows
+        line = json.dumps(entry, default=str) + "\n"
+        with cls._lock:
+            if cls._file is not None:
+                cls._file.write(line)
+
+
+if os.environ.get("BOOKMATE_RECORD"):
+    WorkloadRecorder.enable(os.environ["BOOKMATE_RECORD"])
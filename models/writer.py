@@ -0,0 +1,150 @@
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+# Outcome of one queued write: what callers used to read from the cursor.
+WriteResult = namedtuple("WriteResult", ["rowcount", "lastrowid"])
+
+
+class WriteQueue:
+    """
+    Single writer thread that applies queued write statements in group commits.
+
+    Callers `submit()` a statement and get a `Future`. The writer thread takes the first queued
+    statement, keeps collecting more for up to `window` seconds (or until `max_batch` statements
+    are queued), and applies the whole batch in one transaction with one commit. Each statement
+    runs inside its own savepoint, so a failing statement (e.g. a UNIQUE violation) is rolled
+    back on its own and only its future receives the exception. Futures are resolved after the
+    commit, so a successful result means the write is durable.
+
+    The writer holds the pool's `write_lock` while it applies a batch, so batches and
+    `ConnectionPool.transaction()` blocks never overlap.
+
+    Attributes:
+        - pool (ConnectionPool): Pool the writer thread takes its connection from.
+        - max_batch (int): Most statements per commit (`BOOKMATE_WRITE_BATCH`, default 64).
+        - window (float): Seconds to wait for more statements (`BOOKMATE_WRITE_WINDOW_MS`, default 2 ms).
+        - batches, writes (int): Number of commits and of statements applied so far.
+    """
+
+    def __init__(self, pool, max_batch=None, window=None):
+        """
+        Initialize a write queue. The writer thread starts on the first submitted statement.
+
+        Args:
+            pool (ConnectionPool): Pool the writer thread takes its connection from.
+            max_batch (int, optional): Most statements per commit.
+            window (float, optional): Seconds to wait for more statements before committing.
+        """
+        self.pool = pool
+        self.max_batch = max_batch or int(os.environ.get("BOOKMATE_WRITE_BATCH", 64))
+        self.window = window if window is not None else float(os.environ.get("BOOKMATE_WRITE_WINDOW_MS", 2)) / 1000
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def submit(self, query, params=()):
+        """
+        Queue a write statement.
+
+        Args:
+            query (str): The SQL statement (INSERT, UPDATE, DELETE).
+            params (tuple): The parameters to be passed into the SQL statement.
+
+        Returns:
+            concurrent.futures.Future: Resolves to a `WriteResult` once committed, or to the exception.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The write queue has been closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="bookmate-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((query, params, future))
+        return future
+
+    def close(self):
+        """
+        Apply every statement queued so far, then stop the writer thread.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(None)  # Sentinel: everything before it is still written
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        """
+        Writer thread: collect batches from the queue and commit them until closed.
+        """
+        conn = self.pool.connection()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+
+            # Group commit: wait up to `window` for more writers to queue statements
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._apply(conn, batch)
+
+    def _apply(self, conn, batch):
+        """
+        Apply one batch in a single transaction and resolve its futures after the commit.
+        """
+        results = []
+        control = conn.cursor()  # Transaction control runs on a plain cursor so it stays out of QueryStats
+        with self.pool.write_lock:
+            before = conn.total_changes
+            try:
+                control.execute("BEGIN IMMEDIATE")
+                for query, params, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        results.append(None)  # Cancelled before it was written
+                        continue
+                    control.execute("SAVEPOINT queued_write")
+                    try:
+                        cursor = conn.execute(query, params)
+                    except Exception as e:
+                        control.execute("ROLLBACK TO queued_write")
+                        results.append(e)
+                    else:
+                        results.append(WriteResult(cursor.rowcount, cursor.lastrowid))
+                    control.execute("RELEASE queued_write")
+                conn.commit()
+                self.pool.changes += conn.total_changes - before
+            except Exception as e:
+                conn.rollback()
+                results = [e] * len(batch)  # Nothing in the batch was committed
+
+        self.batches += 1
+        for (_, _, future), result in zip(batch, results):
+            if future.cancelled():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                self.writes += 1
+                future.set_result(result)
@@ -0,0 +1,201 @@
+"""
+Local load-test client for the BookMate HTTP service.
+
+Opens a number of keep-alive connections, each acting as one simulated user that repeatedly
+picks an endpoint from a weighted mix (search, add book, request book, view and answer
+requests, login). At the end it prints throughput and p50/p99 latency per endpoint.
+
+Usage:
+    python -m service.server --port 8080 &
+    python -m service.load_test --port 8080 --clients 50 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import defaultdict
+
+
+def percentile(samples, fraction):
+    """
+    Args:
+        samples (list): Sorted latency samples.
+        fraction (float): The percentile as a fraction (e.g. 0.99).
+
+    Returns:
+        float: The nearest-rank percentile, or 0.0 for no samples.
+    """
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+
+class HTTPClient:
+    """A minimal keep-alive HTTP/1.1 JSON client over one asyncio connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.token = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+
+    async def call(self, method, path, payload=None):
+        """
+        Sends one request and waits for the response.
+
+        Returns:
+            tuple: (status code, decoded JSON body).
+        """
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        if self.token:
+            head += f"Authorization: Bearer {self.token}\r\n"
+        self.writer.write((head + "\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length) if length else b"{}"
+        return status, json.loads(data)
+
+
+class LoadTest:
+    """
+    Drives simulated users against the service and aggregates per-endpoint latencies.
+    """
+
+    # Relative weight of each operation in the request mix
+    MIX = {
+        "search": 50,
+        "add_book": 15,
+        "request_book": 15,
+        "view_requests": 12,
+        "respond": 5,
+        "login": 3,
+    }
+    PASSWORD = "load-test-password"
+    SEARCH_WORDS = ("the", "book", "history", "love", "war", "data", "python", "night")
+
+    def __init__(self, host, port, clients, duration):
+        self.host = host
+        self.port = port
+        self.clients = clients
+        self.duration = duration
+        self.run_id = uuid.uuid4().hex[:8]  # Keeps usernames and ISBNs unique across runs
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.book_ids = []
+
+    async def timed(self, client, name, method, path, payload=None):
+        """
+        Performs one call and records its latency under `name`.
+
+        Returns:
+            tuple: (status code, decoded JSON body).
+        """
+        started = time.perf_counter()
+        try:
+            status, data = await client.call(method, path, payload)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            self.errors[name] += 1
+            raise
+        self.latencies[name].append(time.perf_counter() - started)
+        if status >= 500:
+            self.errors[name] += 1
+        return status, data
+
+    async def simulated_user(self, number, deadline):
+        client = HTTPClient(self.host, self.port)
+        await client.connect()
+        username = f"load-{self.run_id}-{number}"
+        try:
+            await self.timed(client, "signup", "POST", "/signup", {"username": username, "password": self.PASSWORD})
+            _, data = await self.timed(client, "login", "POST", "/login", {"username": username, "password": self.PASSWORD})
+            client.token = data.get("token")
+
+            operations = list(self.MIX)
+            weights = list(self.MIX.values())
+            counter = 0
+            while time.perf_counter() < deadline:
+                counter += 1
+                operation = random.choices(operations, weights)[0]
+                if operation == "search":
+                    word = random.choice(self.SEARCH_WORDS)
+                    await self.timed(client, operation, "GET", f"/books?q={word}&limit=20")
+                elif operation == "add_book":
+                    isbn = f"{self.run_id}-{number}-{counter}"
+                    await self.timed(client, operation, "POST", "/books",
+                                     {"title": f"The {random.choice(self.SEARCH_WORDS)} book {counter}",
+                                      "author": f"Author {number}", "isbn": isbn})
+                    _, data = await client.call("GET", f"/books?q={isbn}&limit=1")
+                    self.book_ids.extend(book["book_id"] for book in data.get("books", []))
+                elif operation == "request_book" and self.book_ids:
+                    await self.timed(client, operation, "POST", "/requests", {"book_id": random.choice(self.book_ids)})
+                elif operation == "view_requests":
+                    await self.timed(client, operation, "GET", "/requests?limit=20")
+                elif operation == "respond":
+                    _, data = await client.call("GET", "/requests?limit=5")
+                    decisions = [{"request_id": r["request_id"], "status": random.choice(("Accepted", "Rejected"))}
+                                 for r in data.get("requests", [])]
+                    if decisions:
+                        await self.timed(client, operation, "POST", "/requests/respond", {"decisions": decisions})
+                elif operation == "login":
+                    await self.timed(client, operation, "POST", "/login",
+                                     {"username": username, "password": self.PASSWORD})
+        finally:
+            await client.close()
+
+    async def run(self):
+        started = time.perf_counter()
+        deadline = started + self.duration
+        results = await asyncio.gather(
+            *(self.simulated_user(number, deadline) for number in range(self.clients)), return_exceptions=True
+        )
+        elapsed = time.perf_counter() - started
+        failed = [r for r in results if isinstance(r, BaseException)]
+        if failed:
+            print(f"{len(failed)} simulated users stopped early: {failed[0]!r}")
+        self.report(elapsed)
+
+    def report(self, elapsed):
+        total = sum(len(samples) for samples in self.latencies.values())
+        print(f"\n{total} requests in {elapsed:.1f}s from {self.clients} clients: {total / elapsed:,.1f} req/s\n")
+        print(f"{'endpoint':<15}{'count':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name in sorted(self.latencies):
+            samples = sorted(self.latencies[name])
+            print(
+                f"{name:<15}{len(samples):>8}{self.errors[name]:>8}{len(samples) / elapsed:>10.1f}"
+                f"{percentile(samples, 0.50) * 1000:>10.2f}{percentile(samples, 0.99) * 1000:>10.2f}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test a running BookMate HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--clients", type=int, default=20, help="concurrent simulated users (default: 20)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run (default: 10)")
+    args = parser.parse_args(argv)
+    asyncio.run(LoadTest(args.host, args.port, args.clients, args.duration).run())
+
+
+if __name__ == "__main__":
+    main()
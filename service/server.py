@@ -0,0 +1,491 @@
+"""
+Asyncio HTTP/JSON front-end for BookMate.
+
+The server speaks a small subset of HTTP/1.1 (keep-alive, Content-Length bodies) using only the
+standard library, and maps each endpoint onto the existing `User`, `Book` and `Request`
+controllers. Controller calls block on SQLite (and bcrypt for login/signup), so they run on two
+bounded thread pools instead of the event loop: one for database work and one for password
+checks (which hand the bcrypt work itself to the `PasswordHasher` process pool), each with a
+cap on the number of queued jobs. Bearer tokens are `Session` tokens stored in the database.
+
+Endpoints (JSON in, JSON out; authenticated ones need `Authorization: Bearer <token>`):
+    POST   /signup                    {"username", "password"}
+    POST   /login                     {"username", "password"} -> {"token", "user_id"}
+    POST   /logout                    (auth)
+    GET    /books?q=&after=&limit=    keyset-paginated search -> {"books", "next_after"}
+    GET    /books?q=&fuzzy=1&limit=   typo-tolerant search ranked by similarity
+    POST   /books                     (auth) {"title", "author", "isbn"}
+    DELETE /books/<book_id>           (auth)
+    POST   /requests                  (auth) {"book_id"}
+    GET    /requests?before=&limit=   (auth) pending requests for your books -> {"requests", "next_before"}
+    GET    /requests/history?before=&limit=
+                                      (auth) resolved requests for your books -> {"requests", "next_before"}
+    GET    /requests/events?after=&wait=&limit=
+                                      (auth) changes to your requests after a cursor, long-polling
+                                      up to `wait` seconds -> {"events", "cursor"}
+    POST   /requests/respond          (auth) {"decisions": [{"request_id", "status"}, ...]}
+                                      -> {"resolved", "rejected"} (IDs resolved as asked; IDs
+                                      accepted whose book was deleted or had changed hands)
+
+IDs, cursors and `limit` must be integers (`limit` at least 1, capped at 500), otherwise the
+request answers 400. A database that stays locked through every retry answers 503 (safe to retry:
+nothing was written), a constraint violation 409, and any other failure 500.
+
+In multi-tenant mode (`--tenant-dir` or `BOOKMATE_TENANT_DIR`), every request names its library
+in an `X-BookMate-Tenant` header and is served from that library's database.
+
+Usage:
+    python -m service.server --host 127.0.0.1 --port 8080
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from controllers.book import Book
+from controllers.password_hasher import PasswordHasher
+from controllers.request import Request
+from controllers.session import Session
+from controllers.user import User
+from models.database import DBManager
+from models.errors import ConstraintError, ContentionError, DatabaseError
+from models.maintenance import DatabaseMaintenance
+from models.workload import WorkloadRecorder
+
+logger = logging.getLogger("bookmate.server")
+
+class HTTPError(Exception):
+    """Raised by a handler to end the request with an HTTP error status and a JSON message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class BoundedExecutor:
+    """
+    A thread pool that also limits how many jobs may be queued or running at once.
+
+    When the limit is reached, further `run` calls wait on the event loop (applying backpressure
+    to clients) instead of piling up unbounded work in the pool's queue.
+    """
+
+    def __init__(self, max_workers, max_pending, name):
+        """
+        Args:
+            max_workers (int): Number of worker threads.
+            max_pending (int): Maximum number of jobs submitted but not finished.
+            name (str): Thread name prefix, handy in stack dumps.
+        """
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_pending)
+
+    async def run(self, func, *args):
+        """
+        Runs a blocking function on the pool and returns its result.
+
+        The function runs in a copy of the caller's context, so context variables (e.g. the
+        workload session) carry over to the worker thread.
+        """
+        job = functools.partial(contextvars.copy_context().run, func, *args)
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, job)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+class BookMateServer:
+    """
+    HTTP/JSON server exposing the BookMate controllers.
+    """
+
+    MAX_BODY = 1024 * 1024  # Largest accepted request body, in bytes
+    MAX_WAIT = 30  # Longest long-poll on /requests/events, in seconds
+    MAX_LIMIT = 500  # Largest page size a client may ask for
+
+    def __init__(self, db_workers=8, auth_workers=4, max_pending=256):
+        """
+        Initialize the server. Executors are created when the server starts.
+
+        Args:
+            db_workers (int): Threads running SQLite work.
+            auth_workers (int): Threads running signups and password logins.
+            max_pending (int): Queue limit of each executor.
+        """
+        self.db_workers = db_workers
+        self.auth_workers = auth_workers
+        self.max_pending = max_pending
+        self.db = None
+        self.auth = None
+        self.routes = {
+            ("POST", "signup"): self.signup,
+            ("POST", "login"): self.login,
+            ("POST", "logout"): self.logout,
+            ("GET", "books"): self.search_books,
+            ("POST", "books"): self.add_book,
+            ("DELETE", "books"): self.delete_book,
+            ("POST", "requests"): self.request_book,
+            ("GET", "requests"): self.view_requests,
+            ("GET", "requests/history"): self.request_history,
+            ("GET", "requests/events"): self.request_events,
+            ("POST", "requests/respond"): self.respond,
+        }
+
+    async def serve(self, host, port):
+        """
+        Runs the server until cancelled.
+        """
+        DBManager.setup_database()
+        maintenance = DatabaseMaintenance()
+        if DatabaseMaintenance.enabled:
+            maintenance.start()
+        self.db = BoundedExecutor(self.db_workers, self.max_pending, "bookmate-db")
+        self.auth = BoundedExecutor(self.auth_workers, self.max_pending, "bookmate-auth")
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"BookMate service listening on http://{host}:{port}")
+        tenants = DBManager.get_tenants()
+        if tenants is not None:
+            print(f"Multi-tenant mode: libraries in {tenants.directory} (X-BookMate-Tenant header required)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            maintenance.stop()
+            self.db.shutdown()
+            self.auth.shutdown()
+            PasswordHasher.shutdown()
+
+    # ---- HTTP plumbing -------------------------------------------------------------------
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves requests on one client connection until the client closes it or asks to.
+        Each connection is one session in the workload log (see `WorkloadRecorder`).
+        """
+        host, port = (writer.get_extra_info("peername") or ("unknown", id(writer)))[:2]
+        try:
+            with WorkloadRecorder.session(f"http-{host}:{port}"):
+                await self._serve_requests(reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # Malformed request or client went away; just drop the connection
+        except Exception:
+            logger.exception("Connection from %s:%s failed", host, port)
+        finally:
+            writer.close()
+
+    async def _serve_requests(self, reader, writer):
+        """
+        Reads and answers requests on one connection until it is closed.
+        """
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, version = request_line.decode("latin-1").split(" ", 2)
+            headers = await self._read_headers(reader)
+
+            length = int(headers.get("content-length", 0))
+            if length > self.MAX_BODY:
+                await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body too large"}, False)
+                break
+            body = await reader.readexactly(length) if length else b""
+
+            keep_alive = headers.get("connection", "").lower() != "close" and version.strip() == "HTTP/1.1"
+            status, payload = await self.dispatch(method, target, headers, body)
+            await self._respond(writer, status, payload, keep_alive)
+            if not keep_alive:
+                break
+
+    @staticmethod
+    async def _read_headers(reader):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method, target, headers, body):
+        """
+        Routes one request to its handler.
+
+        Returns:
+            tuple: (HTTPStatus, JSON-serializable payload).
+        """
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        # "/books/12" routes to the "books" handler with "12" as the resource ID.
+        resource_id = parts.pop() if len(parts) == 2 and parts[1].isdigit() else None
+        handler = self.routes.get((method, "/".join(parts)))
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, {"error": f"no route for {method} {url.path}"}
+
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "request body must be a JSON object")
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            with self._tenant(headers):
+                token = self._bearer_token(headers)
+                user_id = await self._authenticate(token)
+                return await handler(data=data, query=query, resource_id=resource_id, user_id=user_id, token=token)
+        except HTTPError as e:
+            return e.status, {"error": e.message}
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except ContentionError:
+            # Locked through every retry; nothing was written, so the client can simply try again
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "database busy, try again"}
+        except ConstraintError as e:
+            return HTTPStatus.CONFLICT, {"error": str(e)}
+        except DatabaseError:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "database error"}
+        except Exception:
+            # A bug in a handler: answer it, so the client is not left with a dropped connection
+            logger.exception("%s %s failed", method, url.path)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+
+    @staticmethod
+    def _tenant(headers):
+        """
+        Returns:
+            contextmanager: Selects the library named by the `X-BookMate-Tenant` header in multi-tenant
+                            mode (the selection carries over to the executor threads); a no-op otherwise.
+        """
+        if DBManager.get_tenants() is None:
+            return contextlib.nullcontext()
+        tenant = headers.get("x-bookmate-tenant")
+        if not tenant:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "missing X-BookMate-Tenant header")
+        return DBManager.use_tenant(tenant)  # Invalid names raise ValueError (400)
+
+    @staticmethod
+    def _bearer_token(headers):
+        """
+        Returns:
+            str or None: The token from an `Authorization: Bearer <token>` header.
+        """
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token.strip():
+            return None
+        return token.strip()
+
+    async def _authenticate(self, token):
+        """
+        Returns:
+            int or None: The user ID of a valid session token, if any (one indexed lookup, no bcrypt).
+        """
+        if token is None:
+            return None
+        session = await self.db.run(Session.lookup, token)
+        return session[0] if session else None
+
+    @staticmethod
+    def _require_user(user_id):
+        if user_id is None:
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, "login required")
+        return user_id
+
+    @staticmethod
+    def _integer(value, name):
+        """
+        Returns:
+            int: `value` (a query parameter or JSON field) as an integer; 400 if it is not one.
+        """
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+            return int(value)
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+
+    @classmethod
+    def _limit(cls, query, default):
+        """
+        Returns:
+            int: The `limit` query parameter (at most `MAX_LIMIT`); 400 unless it is a positive integer.
+        """
+        limit = cls._integer(query.get("limit", default), "limit")
+        if limit < 1:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "limit must be at least 1")
+        return min(limit, cls.MAX_LIMIT)
+
+    @staticmethod
+    def _require_fields(data, *fields):
+        values = []
+        for field in fields:
+            value = data.get(field)
+            if value is None or (isinstance(value, str) and not value.strip()):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"missing field: {field}")
+            values.append(value)
+        return values
+
+    # ---- Endpoints -----------------------------------------------------------------------
+
+    async def signup(self, data, **_):
+        username, password = self._require_fields(data, "username", "password")
+        if not await self.auth.run(User.save, username, password):
+            raise HTTPError(HTTPStatus.CONFLICT, "signup failed")
+        return HTTPStatus.CREATED, {"username": username}
+
+    async def login(self, data, **_):
+        username, password = self._require_fields(data, "username", "password")
+        user = User()
+        if not await self.auth.run(user.login, username, password, True):
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, "invalid credentials")
+        return HTTPStatus.OK, {"token": user.session_token, "user_id": user.user_id}
+
+    async def logout(self, user_id, token, **_):
+        self._require_user(user_id)
+        await self.db.run(Session.revoke, token)
+        return HTTPStatus.OK, {}
+
+    async def search_books(self, query, **_):
+        after = self._integer(query.get("after", 0), "after")
+        limit = self._limit(query, 50)
+        if query.get("fuzzy") in ("1", "true"):
+            # Typo-tolerant results are ranked by similarity, so there is no next page
+            books = await self.db.run(Book.fuzzy_search, query.get("q", ""), limit)
+            return HTTPStatus.OK, {
+                "books": [
+                    {"book_id": b[0], "title": b[1], "author": b[2], "isbn": b[3], "owner": b[4]} for b in books
+                ],
+                "next_after": None,
+            }
+        books = await self.db.run(Book.search_page, query.get("q", ""), after, limit)
+        return HTTPStatus.OK, {
+            "books": [
+                {"book_id": b[0], "title": b[1], "author": b[2], "isbn": b[3], "owner": b[4]} for b in books
+            ],
+            "next_after": books[-1][0] if len(books) == limit else None,
+        }
+
+    async def add_book(self, data, user_id, **_):
+        self._require_user(user_id)
+        title, author, isbn = self._require_fields(data, "title", "author", "isbn")
+        if not await self.db.run(Book(title, author, isbn, user_id).save):
+            raise HTTPError(HTTPStatus.CONFLICT, "failed to add book")
+        return HTTPStatus.CREATED, {}
+
+    async def delete_book(self, resource_id, user_id, **_):
+        self._require_user(user_id)
+        if resource_id is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "book ID required")
+        if not await self.db.run(Book.delete, self._integer(resource_id, "book ID"), user_id):
+            raise HTTPError(HTTPStatus.NOT_FOUND, "no such book owned by you")
+        return HTTPStatus.OK, {}
+
+    async def request_book(self, data, user_id, **_):
+        self._require_user(user_id)
+        (book_id,) = self._require_fields(data, "book_id")
+        if not await self.db.run(Request(self._integer(book_id, "book_id"), user_id).save):
+            raise HTTPError(HTTPStatus.NOT_FOUND, "book request failed")
+        return HTTPStatus.CREATED, {}
+
+    async def view_requests(self, query, user_id, **_):
+        self._require_user(user_id)
+        before = self._integer(query["before"], "before") if "before" in query else None
+        limit = self._limit(query, 50)
+        requests = await self.db.run(Request.view_requests_page, user_id, before, limit)
+        return HTTPStatus.OK, {
+            "requests": [
+                {"request_id": r[0], "book_id": r[1], "title": r[2], "author": r[3],
+                 "requester_id": r[4], "requester": r[5], "status": r[6]}
+                for r in requests
+            ],
+            "next_before": requests[-1][0] if len(requests) == limit else None,
+        }
+
+    async def request_history(self, query, user_id, **_):
+        self._require_user(user_id)
+        before = self._integer(query["before"], "before") if "before" in query else None
+        limit = self._limit(query, 50)
+        requests = await self.db.run(Request.history, user_id, before, limit)
+        return HTTPStatus.OK, {
+            "requests": [
+                {"request_id": r[0], "book_id": r[1], "requester_id": r[2], "status": r[3], "resolved_at": r[4]}
+                for r in requests
+            ],
+            "next_before": requests[-1][0] if len(requests) == limit else None,
+        }
+
+    async def request_events(self, query, user_id, **_):
+        self._require_user(user_id)
+        after = self._integer(query.get("after", 0), "after")
+        limit = self._limit(query, 100)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(float(query.get("wait", 0)), self.MAX_WAIT)
+        while True:
+            # Long-poll on the event loop, so waiting clients do not hold database workers
+            events = await self.db.run(Request.events_since, user_id, after, limit)
+            remaining = deadline - loop.time()
+            if events or remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, Request.EVENT_POLL_INTERVAL))
+        return HTTPStatus.OK, {
+            "events": [
+                {"event_id": e[0], "request_id": e[1], "book_id": e[2], "requester_id": e[3],
+                 "status": e[4], "created_at": e[5]}
+                for e in events
+            ],
+            "cursor": events[-1][0] if events else after,
+        }
+
+    async def respond(self, data, user_id, **_):
+        self._require_user(user_id)
+        (decisions,) = self._require_fields(data, "decisions")
+        try:
+            pairs = [(self._integer(d["request_id"], "request_id"), d["status"]) for d in decisions]
+        except (KeyError, TypeError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "each decision needs request_id and status")
+        results = await self.db.run(Request.update_request_statuses, pairs, user_id)
+        return HTTPStatus.OK, {
+            "resolved": [request_id for (request_id, status), outcome in zip(pairs, results) if outcome == status],
+            # Accepted, but the book had been deleted or had changed hands
+            "rejected": [request_id for (request_id, status), outcome in zip(pairs, results)
+                         if outcome is not None and outcome != status],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the BookMate HTTP/JSON service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db-workers", type=int, default=8, help="threads for SQLite work (default: 8)")
+    parser.add_argument("--auth-workers", type=int, default=4, help="threads for password logins (default: 4)")
+    parser.add_argument("--max-pending", type=int, default=256, help="queued jobs per executor (default: 256)")
+    parser.add_argument("--tenant-dir", help="serve one library per database file in this directory "
+                                             "(default: BOOKMATE_TENANT_DIR; unset serves a single library)")
+    args = parser.parse_args(argv)
+
+    if args.tenant_dir:
+        DBManager.enable_tenants(args.tenant_dir)
+    server = BookMateServer(args.db_workers, args.auth_workers, args.max_pending)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+from controllers.book import Book
+from controllers.password_hasher import PasswordHasher
+from controllers.user import User
+from models.database import DBManager
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Runs every test against a fresh database in a temporary directory.
+
+    Passwords are hashed inline with the lowest bcrypt cost, so creating users is fast.
+
+    Attributes:
+        - shards (int): Number of database files (override for sharded tests).
+        - directory (str): The temporary directory holding the database.
+    """
+    shards = 1
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="bookmate-test-")
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.addCleanup(PasswordHasher.configure, PasswordHasher.rounds, PasswordHasher.workers)
+        PasswordHasher.configure(rounds=4, workers=0)
+        self._previous = DBManager.database(), DBManager.get_shards().count
+        DBManager.configure(os.path.join(self.directory, "test.db"), shards=self.shards)
+        DBManager.setup_database()
+        Book.clear_caches()
+
+    def tearDown(self):
+        DBManager.configure(*self._previous)
+        Book.clear_caches()
+
+    def add_user(self, username, password="secret"):
+        """
+        Signs up a user and returns their ID.
+        """
+        self.assertTrue(User.save(username, password))
+        user = User()
+        self.assertEqual(user.login(username, password), username)
+        return user.user_id
+
+    def add_book(self, title, owner_id, author="Author", isbn=None):
+        """
+        Saves a book and returns its ID.
+        """
+        book = Book(title, author, isbn or f"isbn-{title}", owner_id)
+        self.assertTrue(book.save())
+        return book.book_id
@@ -0,0 +1,91 @@
+from unittest import mock
+from controllers.book import Book
+from controllers.request import Request
+from models.database import DBManager
+from tests.base import DatabaseTestCase
+
+
+class IterSearchTest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.owner = self.add_user("owner")
+        self.reader = self.add_user("reader")
+        for i in range(12):
+            self.add_book(f"Python Recipes {i}", self.owner)
+
+    def test_keyword_results_match_search(self):
+        self.assertEqual(list(Book.iter_search("python", page_size=5)), Book.search("python"))
+
+    def test_write_then_read_after_partial_iteration(self):
+        books = Book.iter_search("python", page_size=5)
+        first = next(books)  # Suspended half way through the first page
+
+        new_id = self.add_book("Python Cookbook", self.owner)
+        self.assertIn(new_id, [book[0] for book in Book.search("python")])
+
+        request = Request(first[0], self.reader)
+        self.assertTrue(request.save())
+        self.assertTrue(Request.update_request_status(request.request_id, "Accepted", self.owner))
+        self.assertEqual(Book.get_owner_id(first[0]), self.reader)
+
+        rest = [book[0] for book in books]
+        self.assertEqual(len(rest), len(set(rest)))
+        self.assertNotIn(first[0], rest)
+        self.assertLessEqual({book[0] for book in Book.search("python")} - {first[0], new_id}, set(rest))
+
+
+class ShardedIterSearchTest(IterSearchTest):
+    shards = 3
+
+
+class ResolveRequestTest(DatabaseTestCase):
+
+    def test_accepting_a_book_that_changed_hands_rejects_the_request(self):
+        owner, reader, other = self.add_user("owner"), self.add_user("reader"), self.add_user("other")
+        book_id = self.add_book("Dune", owner)
+        request = Request(book_id, reader)
+        self.assertTrue(request.save())
+        DBManager.execute_query("UPDATE books SET owner_id = ? WHERE book_id = ?", (other, book_id))
+        Book.invalidate(book_id)
+
+        self.assertEqual(Request.update_request_statuses([(request.request_id, "Accepted")], owner), ["Rejected"])
+        self.assertEqual(Book.get_owner_id(book_id), other)
+        self.assertEqual(Request.update_request_statuses([(request.request_id, "Accepted")], owner), [None])
+
+
+class SearchCacheTest(DatabaseTestCase):
+    shards = 2
+
+    def test_new_book_on_lower_shard_invalidates_cached_pages(self):
+        shards = DBManager.get_shards()
+        names = {}
+        for i in range(100):
+            names.setdefault(shards.shard_for_key(f"user{i}"), f"user{i}")
+        low, high = self.add_user(names[0]), self.add_user(names[1])
+        for i in range(3):
+            self.add_book(f"Python Recipes {i}", high)
+        page = Book.search_page("python", 0, 3)
+        self.assertEqual(len(page), 3)  # A full page, cached
+
+        new_id = self.add_book("Python Cookbook", low)  # A lower ID than every book on the page
+        self.assertLess(new_id, page[0][0])
+        self.assertIn(new_id, [book[0] for book in Book.search_page("python", 0, 3)])
+
+
+class DeleteBookTest(DatabaseTestCase):
+
+    def test_requested_book_can_be_deleted(self):
+        owner, reader = self.add_user("owner"), self.add_user("reader")
+        book_id = self.add_book("Dune", owner)
+        self.assertTrue(Request(book_id, reader).save())
+        self.assertTrue(Book.delete(book_id, owner))
+        self.assertIsNone(Book.get(book_id))
+
+    def test_request_for_deleted_book_is_not_saved(self):
+        owner, reader = self.add_user("owner"), self.add_user("reader")
+        book_id = self.add_book("Dune", owner)
+        request = Request(book_id, reader)
+        with mock.patch.object(Book, "get_owner_id", return_value=owner):  # Looked up before the delete
+            self.assertTrue(Book.delete(book_id, owner))
+            self.assertFalse(request.save())
@@ -0,0 +1,61 @@
+import contextlib
+import io
+import json
+import os
+import sqlite3
+from unittest import mock
+from models.database import DBManager
+from tests.base import DatabaseTestCase
+from views.cli import CommandRunner, main, run_batch
+
+
+class BatchTest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_user("bob")
+        self.missing = os.path.join(self.directory, "missing.csv")
+
+    def run_lines(self, *commands):
+        records = []
+        succeeded = run_batch(CommandRunner("bob", "secret"), [json.dumps(c) for c in commands], records.append)
+        return succeeded, records
+
+    def test_failed_command_does_not_undo_the_others(self):
+        succeeded, records = self.run_lines(
+            {"cmd": "add-book", "title": "Dune", "author": "Herbert", "isbn": "0441172717"},
+            {"cmd": "import", "path": self.missing},
+            {"cmd": "search", "keyword": "dune"},
+        )
+        self.assertFalse(succeeded)
+        self.assertEqual([(r["line"], r["ok"]) for r in records[:2]], [(1, True), (2, False)])
+        self.assertIn("missing.csv", records[1]["error"])
+        self.assertTrue(any(r.get("title") == "Dune" for r in records[2:]))
+
+    def test_failed_commit_reports_every_line(self):
+        pool = DBManager.get_shards().pools[0]
+        transaction = pool.transaction
+
+        @contextlib.contextmanager
+        def failing_transaction():
+            with transaction() as conn:
+                yield conn
+                raise sqlite3.OperationalError("disk I/O error")
+
+        with mock.patch.object(pool, "transaction", failing_transaction):
+            succeeded, records = self.run_lines(
+                {"cmd": "add-book", "title": "Dune", "author": "Herbert", "isbn": "0441172717"},
+                {"cmd": "stats"},
+            )
+        self.assertFalse(succeeded)
+        self.assertEqual([(r["line"], r["ok"]) for r in records], [(1, False), (2, False)])
+        self.assertEqual(self.run_lines({"cmd": "search", "keyword": "dune"})[1], [])
+
+    def test_single_command_failure_prints_a_record(self):
+        out = io.StringIO()
+        with mock.patch.dict(os.environ, {"BOOKMATE_PASSWORD": "secret"}), contextlib.redirect_stdout(out):
+            code = main(["--user", "bob", "import", self.missing])
+        self.assertEqual(code, 1)
+        record = json.loads(out.getvalue())
+        self.assertFalse(record["ok"])
+        self.assertIn("missing.csv", record["error"])
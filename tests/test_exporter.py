@@ -0,0 +1,47 @@
+import io
+import json
+from controllers.exporter import Exporter
+from models.database import DBManager
+from tests.base import DatabaseTestCase
+
+
+class IncrementalExportTest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.owner = self.add_user("owner")
+        self.exporter = Exporter()
+        self.exporter.overlap = 60
+
+    def export(self, since=None):
+        out = io.StringIO()
+        report = self.exporter.export("books", out, "jsonl", since)
+        return report, [json.loads(line)["book_id"] for line in out.getvalue().splitlines()]
+
+    def stamp(self, book_id, updated_at):
+        DBManager.execute_query("UPDATE books SET updated_at = ? WHERE book_id = ?", (updated_at, book_id))
+
+    def test_next_since_overlaps_latest_change(self):
+        first = self.add_book("Dune", self.owner)
+        self.stamp(first, 1000)
+        report, exported = self.export()
+        self.assertEqual(exported, [first])
+        self.assertEqual(report.last_change, 1000)
+        self.assertEqual(report.next_since, 940)
+
+    def test_late_commit_with_earlier_time_is_exported(self):
+        first = self.add_book("Dune", self.owner)
+        self.stamp(first, 1000)
+        report, _ = self.export()
+
+        # Committed after the export, but stamped before the latest row it wrote
+        late = self.add_book("Emma", self.owner)
+        self.stamp(late, 990)
+        _, exported = self.export(report.next_since)
+        self.assertIn(late, exported)
+
+    def test_empty_export_keeps_since(self):
+        self.add_book("Dune", self.owner)
+        report, exported = self.export(since=2 ** 40)
+        self.assertEqual(exported, [])
+        self.assertEqual(report.next_since, 2 ** 40)
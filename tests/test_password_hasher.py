@@ -0,0 +1,28 @@
+import bcrypt
+from controllers.password_hasher import PasswordHasher
+from controllers.user import User
+from tests.base import DatabaseTestCase
+
+
+class NeedsRehashTest(DatabaseTestCase):
+
+    def test_lower_cost_is_rehashed(self):
+        PasswordHasher.configure(rounds=5)
+        self.assertTrue(PasswordHasher.needs_rehash(bcrypt.hashpw(b"secret", bcrypt.gensalt(4))))
+
+    def test_same_cost_is_kept(self):
+        self.assertFalse(PasswordHasher.needs_rehash(bcrypt.hashpw(b"secret", bcrypt.gensalt(4))))
+
+    def test_higher_cost_is_kept(self):
+        self.assertFalse(PasswordHasher.needs_rehash(bcrypt.hashpw(b"secret", bcrypt.gensalt(5))))
+
+    def test_login_keeps_higher_cost_hash(self):
+        PasswordHasher.configure(rounds=5)
+        self.add_user("reader")
+        PasswordHasher.configure(rounds=4)
+        user = User()
+        self.assertEqual(user.login("reader", "secret"), "reader")
+        self.assertEqual(user.password.split(b"$")[2], b"05")
+
+    def test_not_bcrypt_is_rehashed(self):
+        self.assertTrue(PasswordHasher.needs_rehash(b"plain"))
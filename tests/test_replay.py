@@ -0,0 +1,36 @@
+import logging
+from unittest import mock
+from controllers.book import Book
+from models.errors import ContentionError, QueryError
+from tests.base import DatabaseTestCase
+from tools.replay import Replay
+
+
+class ReplayTest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.book_id = self.add_book("Dune", self.add_user("owner"))
+
+    def replay(self, *operations):
+        session = [{"op": name, "args": args, "at": number, "ms": 1} for number, (name, args) in enumerate(operations)]
+        return Replay([session], users=1, password="secret").run()
+
+    def test_failing_operation_is_counted(self):
+        errors = [QueryError("no such table: books"), ContentionError("database is locked")]
+        with mock.patch.object(Book, "get", side_effect=errors):
+            report = self.replay(("Book.get", [self.book_id]), ("Book.get", [self.book_id]), ("Book.search", ["dune"]))
+        get = report["operations"]["Book.get"]
+        self.assertEqual((get["calls"], get["failures"], get["errors"], get["busy_errors"]), (2, 2, 2, 1))
+        self.assertEqual(report["operations"]["Book.search"]["errors"], 0)
+        self.assertEqual(report["busy_errors"], 1)
+
+    def test_logged_transfer_error_is_counted(self):
+        def stuck(book_id):
+            logging.getLogger("bookmate.sharding").warning("Book %s stays in the outbox: database is locked", book_id)
+            return None
+
+        with mock.patch.object(Book, "get", side_effect=stuck), self.assertLogs("bookmate.sharding", "WARNING"):
+            report = self.replay(("Book.get", [self.book_id]))
+        get = report["operations"]["Book.get"]
+        self.assertEqual((get["failures"], get["errors"], get["busy_errors"]), (0, 1, 1))
@@ -0,0 +1,49 @@
+import asyncio
+import json
+from http import HTTPStatus
+from unittest import mock
+from controllers.session import Session
+from service.server import BookMateServer, BoundedExecutor
+from tests.base import DatabaseTestCase
+
+
+class DispatchTest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server = BookMateServer()
+        self.server.db = BoundedExecutor(2, 16, "test-db")
+        self.server.auth = BoundedExecutor(1, 16, "test-auth")
+        self.addCleanup(self.server.db.shutdown)
+        self.addCleanup(self.server.auth.shutdown)
+        user_id = self.add_user("owner")
+        self.book_id = self.add_book("Dune", user_id)
+        self.token = Session.issue(user_id)
+
+    def call(self, method, target, body=None):
+        headers = {"authorization": f"Bearer {self.token}"}
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        return asyncio.run(self.server.dispatch(method, target, headers, data))
+
+    def test_search(self):
+        status, payload = self.call("GET", "/books?q=dune&limit=1")
+        self.assertEqual(status, HTTPStatus.OK)
+        self.assertEqual(payload["next_after"], self.book_id)
+
+    def test_limit_below_one_is_rejected(self):
+        for target in ("/books?limit=0", "/requests?limit=0", "/requests/history?limit=-1", "/requests/events?limit=0"):
+            self.assertEqual(self.call("GET", target)[0], HTTPStatus.BAD_REQUEST, target)
+
+    def test_non_integer_ids_are_rejected(self):
+        for book_id in ([1], {"id": 1}, 1.5, "abc", True):
+            self.assertEqual(self.call("POST", "/requests", {"book_id": book_id})[0], HTTPStatus.BAD_REQUEST, book_id)
+        decisions = {"decisions": [{"request_id": [1], "status": "Accepted"}]}
+        self.assertEqual(self.call("POST", "/requests/respond", decisions)[0], HTTPStatus.BAD_REQUEST)
+        self.assertEqual(self.call("GET", "/books?after=x")[0], HTTPStatus.BAD_REQUEST)
+
+    def test_handler_bug_answers_500(self):
+        self.server.routes[("GET", "books")] = mock.AsyncMock(side_effect=RuntimeError("boom"))
+        with self.assertLogs("bookmate.server", "ERROR"):
+            status, payload = self.call("GET", "/books")
+        self.assertEqual(status, HTTPStatus.INTERNAL_SERVER_ERROR)
+        self.assertEqual(payload, {"error": "internal error"})
@@ -0,0 +1,10 @@
+from controllers.session import Session
+from tests.base import DatabaseTestCase
+
+
+class SessionTest(DatabaseTestCase):
+
+    def test_zero_ttl_token_is_expired(self):
+        user_id = self.add_user("owner")
+        self.assertIsNotNone(Session.lookup(Session.issue(user_id)))
+        self.assertIsNone(Session.lookup(Session.issue(user_id, ttl=0)))
@@ -0,0 +1,59 @@
+from controllers.book import Book
+from controllers.importer import BookImporter
+from controllers.request import Request
+from controllers.user_stats import UserStats
+from models.database import DBManager
+from tests.base import DatabaseTestCase
+
+
+class ShardedBookTest(DatabaseTestCase):
+    shards = 2
+
+    def setUp(self):
+        super().setUp()
+        self.owner = self.add_user("owner")
+        # A requester whose account lives on the other shard, so accepted books move there
+        shards = DBManager.get_shards()
+        name = next(f"reader{i}" for i in range(100)
+                    if shards.shard_for_key(f"reader{i}") != shards.shard_of_id(self.owner))
+        self.reader = self.add_user(name)
+
+    def test_isbn_unique_across_shards(self):
+        self.add_book("Dune", self.owner, isbn="978-0-441-17271-9")
+        self.assertFalse(Book("Dune", "Herbert", "0441172717", self.reader).save())
+
+    def test_import_rejects_isbn_taken_on_another_shard(self):
+        self.add_book("Dune", self.owner, isbn="9780441172719")
+        report = BookImporter(self.reader).import_rows([(1, {"title": "Dune", "author": "Herbert", "isbn": "0441172717"})])
+        self.assertEqual(report.inserted, 0)
+        self.assertEqual(report.failures, [(1, "0441172717", "duplicate isbn")])
+
+    def test_accepted_book_moves_to_new_owner(self):
+        book_id = self.add_book("Dune", self.owner, isbn="978-0-441-17271-9")
+        request = Request(book_id, self.reader)
+        self.assertTrue(request.save())
+        self.assertEqual(Request.update_request_statuses([(request.request_id, "Accepted")]), ["Accepted"])
+        self.assertEqual(Book.get_owner_id(book_id), self.reader)
+
+    def test_refused_transfer_is_undone(self):
+        book_id = self.add_book("Dune", self.owner, isbn="978-0-441-17271-9")
+        request = Request(book_id, self.reader)
+        self.assertTrue(request.save())
+        # A legacy copy of the ISBN on the requester's shard makes that shard refuse the book
+        shards = DBManager.get_shards()
+        with shards.use(shards.shard_of_id(self.reader)):
+            DBManager.execute_query(
+                "INSERT INTO books (title, author, isbn, isbn13, owner_id) VALUES (?, ?, ?, ?, ?)",
+                ("Dune", "Herbert", "9780441172719", "9780441172719", self.reader),
+            )
+
+        with self.assertLogs("bookmate.sharding", "ERROR"):
+            results = Request.update_request_statuses([(request.request_id, "Accepted")])
+        self.assertEqual(results, ["Rejected"])
+        self.assertEqual(Book.get_owner_id(book_id), self.owner)
+        with shards.use(shards.shard_of_id(self.owner)):
+            status = DBManager.fetch_one("SELECT status FROM requests WHERE request_id = ?", (request.request_id,))
+            outbox = DBManager.fetch_one("SELECT COUNT(*) FROM book_transfers")
+        self.assertEqual(status, ("Rejected",))
+        self.assertEqual(outbox, (0,))
+        self.assertEqual(UserStats.check(), [])
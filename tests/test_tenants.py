@@ -0,0 +1,53 @@
+import os
+import time
+from unittest import mock
+from controllers.book import Book
+from models.database import DBManager
+from models.tenants import TenantRegistry
+from service.server import BookMateServer, HTTPError
+from tests.base import DatabaseTestCase
+
+
+class TenantDirTest(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tenant_dir = os.path.join(self.directory, "libraries")
+        self.addCleanup(DBManager.disable_tenants)
+        with mock.patch.dict(os.environ, {"BOOKMATE_TENANT_DIR": self.tenant_dir}):
+            DBManager.setup_database()
+
+    def test_env_var_turns_on_tenants(self):
+        tenants = DBManager.get_tenants()
+        self.assertIsNotNone(tenants)
+        self.assertEqual(tenants.directory, self.tenant_dir)
+
+    def test_tenants_are_isolated(self):
+        with DBManager.use_tenant("alpha"):
+            owner = self.add_user("owner")
+            self.add_book("Dune", owner)
+            self.assertEqual(len(Book.search("dune")), 1)
+        with DBManager.use_tenant("beta"):
+            self.assertEqual(Book.search("dune"), [])
+        self.assertEqual(Book.search("dune"), [])
+        self.assertTrue(os.path.exists(os.path.join(self.tenant_dir, "alpha.db")))
+
+    def test_server_requires_tenant_header(self):
+        with self.assertRaises(HTTPError):
+            BookMateServer._tenant({})
+        with BookMateServer._tenant({"x-bookmate-tenant": "alpha"}) as tenant:
+            self.assertEqual(tenant, "alpha")
+
+
+class TenantEvictionTest(DatabaseTestCase):
+
+    def test_idle_tenant_closed_on_access_without_maintenance(self):
+        tenants = TenantRegistry(os.path.join(self.directory, "libraries"), idle_seconds=0.05)
+        self.addCleanup(tenants.close)
+        with tenants.use("alpha"), tenants.use("beta"):
+            pass
+        time.sleep(0.1)
+        with tenants.use("beta"):
+            pass
+        self.assertEqual(tenants.stats()["open"], 1)
+        self.assertEqual(tenants.stats()["evicted"], 1)
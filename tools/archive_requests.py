@@ -0,0 +1,40 @@
+"""
+Moves resolved requests older than the retention window from `requests` to `requests_history`.
+
+Usage:
+    python -m tools.archive_requests                      # BOOKMATE_REQUEST_RETENTION, default 30 days
+    python -m tools.archive_requests --retention-days 7 --batch-size 5000
+
+Safe to run while BookMate is in use (e.g. from cron): requests are moved in short batches.
+"""
+import argparse
+import sys
+import time
+
+from controllers.request import Request
+from models.database import DBManager
+
+
+def main(argv=None):
+    """
+    Runs the archival job and prints how many requests were moved.
+
+    Returns:
+        int: 0.
+    """
+    parser = argparse.ArgumentParser(description="Archive resolved BookMate requests.")
+    parser.add_argument("--retention-days", type=float,
+                        help=f"keep requests resolved in the last N days (default: {Request.retention / 86400:g})")
+    parser.add_argument("--batch-size", type=int, default=1000, help="requests moved per transaction (default: 1000)")
+    args = parser.parse_args(argv)
+
+    DBManager.setup_database()
+    retention = None if args.retention_days is None else int(args.retention_days * 86400)
+    started = time.perf_counter()
+    archived = Request.archive_resolved(retention, args.batch_size)
+    print(f"Archived {archived} resolved requests in {time.perf_counter() - started:.2f}s.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Query plan check for the SQL used by the controllers.
+
+Every SQL string literal passed to a database call in `controllers/` is run through
+`EXPLAIN QUERY PLAN` against a freshly migrated, empty database. The check fails when a
+statement falls back to a full table scan, so a missing index is caught before it ships.
+
+Statements that scan on purpose (e.g. listing the whole catalog) must say so with an
+`-- allow-scan: <reason>` comment inside the SQL string.
+
+Usage:
+    python -m tools.check_query_plans [--verbose]
+"""
+import argparse
+import ast
+import os
+import re
+import sqlite3
+import sys
+
+from models.database import DBManager
+
+# Call names taking an SQL statement (the first string argument; `scatter` takes the read function first)
+SQL_CALLS = {"execute", "executemany", "execute_query", "fetch_all", "fetch_one", "iter_rows", "scatter"}
+
+# Plan steps that read a whole table ("SCAN books", "SCAN books USING COVERING INDEX ...")
+SCAN_PATTERN = re.compile(r"^SCAN (\w+)")
+ALLOW_SCAN_MARKER = "-- allow-scan"
+
+CONTROLLERS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "controllers")
+
+
+def collect_queries(directory=CONTROLLERS_DIR):
+    """
+    Collects the SQL string literals passed to database calls in every module of a directory.
+
+    Args:
+        directory (str): The directory to scan for `.py` files.
+
+    Returns:
+        list: (location, sql) tuples, where location is `file:line`.
+    """
+    queries = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".py"):
+            continue
+        path = os.path.join(directory, name)
+        with open(path, encoding="utf-8") as source:
+            tree = ast.parse(source.read(), filename=path)
+        calls = sorted((n for n in ast.walk(tree) if isinstance(n, ast.Call)), key=lambda n: n.lineno)
+        for node in calls:
+            if not isinstance(node.func, ast.Attribute):
+                continue
+            if node.func.attr not in SQL_CALLS or not node.args:
+                continue
+            first = next((arg for arg in node.args if isinstance(arg, ast.Constant)), None)
+            # Only literal statements can be checked statically; built-up SQL is skipped.
+            if first is not None and isinstance(first.value, str):
+                if re.match(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b", first.value, re.IGNORECASE):
+                    queries.append((f"{os.path.relpath(path)}:{node.lineno}", first.value))
+    return queries
+
+
+def explain(conn, sql):
+    """
+    Runs `EXPLAIN QUERY PLAN` for a statement, binding NULL to every parameter.
+
+    Args:
+        conn (sqlite3.Connection): A connection to a database with the application schema.
+        sql (str): The statement to explain.
+
+    Returns:
+        list: The `detail` column of each plan step.
+    """
+    params = (None,) * sql.count("?")
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def find_table_scans(plan):
+    """
+    Args:
+        plan (list): Plan step details as returned by `explain`.
+
+    Returns:
+        list: The plan steps that scan a whole table (virtual-table scans are index lookups, and
+              "SCAN CONSTANT ROW" is the single row of a `SELECT` without `FROM`; both are ignored).
+    """
+    return [
+        step for step in plan
+        if SCAN_PATTERN.match(step) and "VIRTUAL TABLE" not in step and not step.startswith("SCAN CONSTANT ROW")
+    ]
+
+
+def main(argv=None):
+    """
+    Checks every controller query and prints the offending plans.
+
+    Returns:
+        int: 0 if no query falls back to a table scan, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Fail when a controller query falls back to a table scan.")
+    parser.add_argument("--verbose", action="store_true", help="print the plan of every query")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(":memory:")
+    DBManager.create_schema(conn)
+
+    failures = 0
+    for location, sql in collect_queries():
+        try:
+            plan = explain(conn, sql)
+        except sqlite3.Error as e:
+            print(f"ERROR {location}: {e}")
+            failures += 1
+            continue
+
+        scans = [] if ALLOW_SCAN_MARKER in sql else find_table_scans(plan)
+        if scans:
+            failures += 1
+            print(f"SCAN  {location}: {'; '.join(scans)}")
+        elif args.verbose:
+            print(f"OK    {location}: {'; '.join(plan) or 'no table access'}")
+
+    if failures:
+        print(f"\n{failures} quer{'y' if failures == 1 else 'ies'} failed the plan check.")
+        return 1
+    print("All controller queries use an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Streaming export of BookMate tables and listings to CSV or JSONL.
+
+Usage:
+    python -m tools.export books books.csv
+    python -m tools.export request_details requests.jsonl --since 2026-10-01
+    python -m tools.export catalog - --format jsonl | gzip > catalog.jsonl.gz
+
+Datasets: users, books, requests, request_history, catalog (books with their owner's username)
+and request_details (requests with book titles and requester usernames); see
+`controllers/exporter.py` for the columns. `--since` (Unix time or ISO date/time) only exports
+rows changed since then; the summary prints the value to pass to the next incremental export
+(it overlaps this one by `BOOKMATE_EXPORT_OVERLAP` seconds, so apply rows by their ID).
+Memory use is bounded by `--chunk-size` and `--buffer-size`, however large the export.
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from controllers.exporter import Exporter
+from models.database import DBManager
+
+
+def parse_since(value):
+    """
+    Args:
+        value (str): A Unix time, or an ISO 8601 date or date and time (local time unless it has an offset).
+
+    Returns:
+        int: The Unix time.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a Unix time or ISO date: {value!r}") from None
+
+
+def print_progress(report):
+    """
+    Prints a one-line progress update after each chunk.
+
+    Args:
+        report (ExportReport): The running export report.
+    """
+    print(f"\r{report.rows} rows exported ({report.rows_per_second:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    """
+    Runs the export and prints a summary to stderr (stdout may be the export itself).
+
+    Returns:
+        int: 0.
+    """
+    parser = argparse.ArgumentParser(description="Export BookMate data to CSV or JSONL.")
+    parser.add_argument("dataset", choices=sorted(Exporter.DATASETS), help="what to export")
+    parser.add_argument("path", help="output file, or - for stdout")
+    parser.add_argument("--format", choices=Exporter.FORMATS, help="file format (default: from extension; jsonl for stdout)")
+    parser.add_argument("--since", type=parse_since, help="only rows changed since this Unix time or ISO date")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="rows fetched and written at a time (default: 1000)")
+    parser.add_argument("--buffer-size", type=int, default=1 << 20, help="output buffer in bytes (default: 1 MiB)")
+    args = parser.parse_args(argv)
+
+    DBManager.setup_database()
+    exporter = Exporter(args.chunk_size, args.buffer_size, progress=print_progress)
+    if args.path == "-":
+        report = exporter.export(args.dataset, sys.stdout, args.format or "jsonl", args.since)
+    else:
+        report = exporter.export_file(args.dataset, args.path, args.format, args.since)
+    print(file=sys.stderr)
+
+    summary = f"Exported {report.rows} {args.dataset} rows in {report.elapsed:.2f}s ({report.rows_per_second:,.0f} rows/s"
+    if report.bytes is not None:
+        summary += f", {report.bytes / 1e6:.1f} MB at {report.bytes_per_second / 1e6:.1f} MB/s"
+    print(summary + ").", file=sys.stderr)
+    if report.next_since is not None:
+        print(f"Next incremental export: --since {report.next_since}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
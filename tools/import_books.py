@@ -0,0 +1,85 @@
+"""
+Bulk import of books from a CSV or JSONL file.
+
+Usage:
+    python -m tools.import_books catalog.csv --owner alice
+    python -m tools.import_books catalog.jsonl --owner-id 3 --batch-size 5000 --failures rejected.jsonl
+
+CSV files need a header row with `title`, `author`, `isbn` and optionally `owner_id`;
+JSONL files need one object per line with the same keys.
+"""
+import argparse
+import json
+import sys
+
+from controllers.importer import BookImporter
+from models.database import DBManager
+
+
+def print_progress(report):
+    """
+    Prints a one-line progress update after each batch.
+
+    Args:
+        report (ImportReport): The running import report.
+    """
+    print(
+        f"\r{report.processed} rows processed, {report.inserted} inserted, "
+        f"{len(report.failures)} rejected ({report.rows_per_second:,.0f} rows/s)",
+        end="",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def main(argv=None):
+    """
+    Runs the import and prints a summary.
+
+    Returns:
+        int: 0 on success, 1 if the owner could not be resolved, 2 if some rows were rejected.
+    """
+    parser = argparse.ArgumentParser(description="Bulk import books into BookMate.")
+    parser.add_argument("path", help="CSV or JSONL file to import")
+    owner = parser.add_mutually_exclusive_group(required=True)
+    owner.add_argument("--owner", help="username owning rows without an owner_id")
+    owner.add_argument("--owner-id", type=int, help="user_id owning rows without an owner_id")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="file format (default: from extension)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per transaction (default: 1000)")
+    parser.add_argument("--failures", help="write rejected rows as JSONL to this file")
+    args = parser.parse_args(argv)
+
+    DBManager.setup_database()
+
+    owner_id = args.owner_id
+    if args.owner is not None:
+        user = DBManager.fetch_one("SELECT user_id FROM users WHERE username = ?", (args.owner,))
+        if user is None:
+            print(f"Unknown user: {args.owner}", file=sys.stderr)
+            return 1
+        owner_id = user[0]
+
+    importer = BookImporter(owner_id, batch_size=args.batch_size, progress=print_progress)
+    report = importer.import_file(args.path, args.format)
+    print(file=sys.stderr)
+
+    print(
+        f"Imported {report.inserted} books, rejected {len(report.failures)} rows "
+        f"in {report.elapsed:.2f}s ({report.rows_per_second:,.0f} rows/s)."
+    )
+    failures = sorted(report.failures, key=lambda failure: failure[0])
+    if args.failures:
+        with open(args.failures, "w", encoding="utf-8") as out:
+            for row_number, isbn, reason in failures:
+                out.write(json.dumps({"row": row_number, "isbn": isbn, "reason": reason}) + "\n")
+    else:
+        for row_number, isbn, reason in failures[:20]:
+            print(f"  row {row_number}: {reason} (isbn: {isbn})")
+        if len(failures) > 20:
+            print(f"  ... {len(failures) - 20} more (use --failures to save them all)")
+
+    return 2 if report.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
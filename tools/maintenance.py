@@ -0,0 +1,92 @@
+"""
+Runs BookMate's database maintenance tasks on demand, or shows what they would do.
+
+Usage:
+    python -m tools.maintenance status                 # WAL size, free pages and vacuum mode per shard
+    python -m tools.maintenance run                    # every task, on every shard
+    python -m tools.maintenance run --task checkpoint --task optimize
+    python -m tools.maintenance full-vacuum            # offline: rewrite each file, enable incremental vacuum
+
+The console application and the HTTP service run the same tasks in the background (see
+`models/maintenance.py`). `full-vacuum` rewrites every file and blocks all writers while it runs,
+so run it with the application stopped; afterwards the background vacuum can reclaim space
+incrementally.
+"""
+import argparse
+import os
+import sys
+import time
+
+from models.database import DBManager
+from models.maintenance import DatabaseMaintenance
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def file_size(path):
+    """
+    Returns:
+        int: Size of a file in bytes, 0 if it does not exist (or `path` is None, for an in-memory database).
+    """
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+def print_run(run):
+    """
+    Prints one `MaintenanceRun`.
+    """
+    print(f"  shard {run.shard}: {run.task:<10} {run.elapsed * 1000:>9.1f} ms  "
+          f"{run.reclaimed_bytes / 1e6:>8.2f} MB reclaimed  ({run.detail})")
+
+
+def main(argv=None):
+    """
+    Runs the requested action and prints the outcome.
+
+    Returns:
+        int: 0.
+    """
+    parser = argparse.ArgumentParser(description="Run BookMate database maintenance.")
+    parser.add_argument("action", choices=("status", "run", "full-vacuum"))
+    parser.add_argument("--task", action="append", choices=sorted(DatabaseMaintenance.TASKS),
+                        help="task to run (repeatable; default: all)")
+    args = parser.parse_args(argv)
+
+    DBManager.setup_database()
+    shards = DBManager.get_shards()
+
+    if args.action == "status":
+        for index, pool in enumerate(shards.pools):
+            conn = pool.connection()
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            mode = AUTO_VACUUM_MODES.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0], "unknown")
+            print(f"  shard {index}: {pool.database} {file_size(pool.path) / 1e6:.2f} MB, "
+                  f"WAL {file_size(pool.path and pool.path + '-wal') / 1e6:.2f} MB, "
+                  f"{free * page_size / 1e6:.2f} MB free, auto_vacuum={mode}")
+        return 0
+
+    if args.action == "run":
+        maintenance = DatabaseMaintenance(lock_timeout=5.0)
+        for index, pool in enumerate(shards.pools):
+            for name in args.task or DatabaseMaintenance.TASKS:
+                run = maintenance.run_task(name, pool, index)
+                if run is not None:
+                    print_run(run)
+        return 0
+
+    for index, pool in enumerate(shards.pools):
+        conn = pool.connection()
+        before = file_size(pool.path)
+        started = time.perf_counter()
+        with pool.write_lock:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")  # Applied by the VACUUM that follows
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        print(f"  shard {index}: vacuumed in {time.perf_counter() - started:.2f}s, "
+              f"{(before - file_size(pool.path)) / 1e6:.2f} MB reclaimed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
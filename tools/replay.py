@@ -0,0 +1,349 @@
+"""
+Replays recorded workloads against a copy of a database with many concurrent simulated users.
+
+Record a workload first by running BookMate (the console, `main.py` commands or the HTTP
+service) with `BOOKMATE_RECORD=workload.jsonl`; see `models/workload.py`. The replay copies the
+database (with the SQLite backup API, so it may be in use), then starts `--users` threads. Replay
+against a snapshot taken before the recording, or the recorded inserts fail as duplicates. Each
+simulated user replays one recorded session after another, in order, cycling through the
+sessions so that every user has work even when there are more users than sessions.
+
+The report gives the overall throughput and, per operation, the call count, failures, latency
+percentiles (p50/p95/p99/max) and the number of lock-contention ("database is locked/busy")
+errors left after retries. It also shows how much contention the retries absorbed (see
+`ContentionStats`): retries and backoff time grow first as concurrency rises, before operations
+start to fail.
+
+Usage:
+    python -m tools.replay workload.jsonl --database book_management.db --users 32
+    python -m tools.replay workload.jsonl --database prod.db --users 8 --speed 1 --output replay.json
+
+Passwords are not recorded, so logins and signups use `--password` (by default the password of
+the synthetic users made by `benchmarks/datagen.py`).
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from itertools import islice
+
+from benchmarks import datagen
+from controllers.book import Book
+from controllers.request import Request
+from controllers.user import User
+from models.database import DBManager
+from models.errors import CONTENTION_MESSAGES, ContentionError, is_contention
+from models.retry import ContentionStats
+from models.sharding import ShardSet
+from models.workload import WorkloadRecorder
+
+def _login(password, username, _password=None, issue_token=False):
+    return User().login(username, password, issue_token) is not None
+
+
+def _stream(func, rows):
+    """
+    Returns:
+        callable: Replays a streaming operation, consuming as many rows as were recorded.
+    """
+    def replay(password, *args, **kwargs):
+        list(islice(func(*args, **kwargs), rows))
+        return True
+    return replay
+
+
+# Operation name -> callable(password, *args, **kwargs) returning False if the operation failed
+OPERATIONS = {
+    "User.login": _login,
+    "User.save": lambda password, username, _password=None: User.save(username, password),
+    "Book.save": lambda password, title, author, isbn, owner_id: Book(title, author, isbn, owner_id).save(),
+    "Book.delete": lambda password, *args, **kwargs: Book.delete(*args, **kwargs),
+    "Book.search": lambda password, *args, **kwargs: Book.search(*args, **kwargs),
+    "Book.search_page": lambda password, *args, **kwargs: Book.search_page(*args, **kwargs),
+    "Book.find_by_isbn": lambda password, *args, **kwargs: Book.find_by_isbn(*args, **kwargs),
+    "Book.fuzzy_search": lambda password, *args, **kwargs: Book.fuzzy_search(*args, **kwargs),
+    "Book.get": lambda password, *args, **kwargs: Book.get(*args, **kwargs),
+    "Request.save": lambda password, book_id, requester_id: Request(book_id, requester_id).save(),
+    "Request.view_requests": lambda password, *args, **kwargs: Request.view_requests(*args, **kwargs),
+    "Request.view_requests_page": lambda password, *args, **kwargs: Request.view_requests_page(*args, **kwargs),
+    "Request.update_request_statuses":
+        lambda password, *args, **kwargs: any(Request.update_request_statuses(*args, **kwargs)),
+}
+STREAMS = {"Book.iter_search": Book.iter_search, "Request.iter_requests": Request.iter_requests}
+
+
+class ErrorCounter(logging.Handler):
+    """
+    Counts the errors raised by replayed operations (the `DatabaseError`s of `models/errors.py`,
+    or any other exception), and, as a handler on the `bookmate.sharding` logger, the ones that
+    are only logged (e.g. a book transfer left in the outbox).
+
+    Errors are attributed to the operation running on the reporting thread (or "other"). A
+    `ContentionError`, or another error with SQLite's busy/locked message, counts as a busy error.
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.counts = {}  # Operation -> [errors, busy errors]
+        self._current = threading.local()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def operation(self, name):
+        self._current.name = name
+        try:
+            yield
+        finally:
+            self._current.name = None
+
+    def count(self, error, name=None):
+        name = name or getattr(self._current, "name", None) or "other"
+        if isinstance(error, Exception):
+            busy = isinstance(error, ContentionError) or is_contention(error)
+        else:
+            busy = any(text in error for text in CONTENTION_MESSAGES)
+        with self._lock:
+            entry = self.counts.setdefault(name, [0, 0])
+            entry[0] += 1
+            entry[1] += int(busy)
+
+    def emit(self, record):
+        self.count(record.exc_info[1] if record.exc_info else record.getMessage())
+
+
+def load_sessions(paths):
+    """
+    Args:
+        paths (list): Operation logs written by `WorkloadRecorder`.
+
+    Returns:
+        list: The recorded sessions, each a list of operations in the order they started.
+    """
+    sessions = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as log:
+            for line in log:
+                if line.strip():
+                    entry = json.loads(line)
+                    sessions.setdefault(entry["session"], []).append(entry)
+    return [sorted(ops, key=lambda op: op["at"]) for _, ops in sorted(sessions.items())]
+
+
+def copy_database(database, shards, directory):
+    """
+    Copies a database (every shard of it) into `directory` with the SQLite backup API.
+
+    Returns:
+        str: The path of the copy.
+    """
+    copy = os.path.join(directory, os.path.basename(database))
+    for source, target in zip(ShardSet.paths_for(database, shards), ShardSet.paths_for(copy, shards)):
+        with contextlib.closing(sqlite3.connect(source)) as src, contextlib.closing(sqlite3.connect(target)) as dst:
+            src.backup(dst)
+    return copy
+
+
+def percentile(ordered, p):
+    """
+    Returns:
+        float: The nearest-rank `p`th percentile of an ascending list.
+    """
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+class Replay:
+    """
+    Drives simulated users through recorded sessions and collects per-operation latencies.
+    """
+
+    def __init__(self, sessions, users, password, speed=0.0, loops=1):
+        """
+        Args:
+            sessions (list): Recorded sessions (see `load_sessions`).
+            users (int): Number of concurrent simulated users.
+            password (str): Password used for logins and signups.
+            speed (float): Replay recorded think time between operations divided by this factor
+                           (1 = real time); 0 replays operations back to back.
+            loops (int): Times each user goes through its share of the sessions.
+        """
+        self.sessions = sessions
+        self.users = users
+        self.password = password
+        self.speed = speed
+        self.loops = loops
+        self.latencies = {}  # Operation -> [seconds, ...]
+        self.failures = {}  # Operation -> count of calls that returned a failure
+        self.errors = ErrorCounter()
+        self._lock = threading.Lock()
+
+    def run(self):
+        """
+        Runs the replay.
+
+        Returns:
+            dict: The report (see `report`).
+        """
+        threads = [
+            threading.Thread(target=self._user, args=(number,), name=f"replay-user-{number}")
+            for number in range(self.users)
+        ]
+        ContentionStats.reset()
+        started = time.perf_counter()
+        logger = logging.getLogger("bookmate.sharding")
+        logger.addHandler(self.errors)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            logger.removeHandler(self.errors)
+        return self.report(time.perf_counter() - started)
+
+    def _user(self, number):
+        """
+        One simulated user: replays sessions number, number + users, number + 2 * users, ...
+        """
+        mine = self.sessions[number % len(self.sessions)::self.users]
+        for _ in range(self.loops):
+            for session in mine:
+                previous_end = None
+                for op in session:
+                    if self.speed and previous_end is not None:
+                        time.sleep(max(0.0, op["at"] - previous_end) / self.speed)  # Recorded think time
+                    previous_end = op["at"] + op["ms"] / 1000
+                    self._call(op)
+
+    def _call(self, op):
+        """
+        Replays one operation and records its latency and outcome.
+        """
+        name = op["op"]
+        if name in STREAMS:
+            func = _stream(STREAMS[name], op.get("rows"))
+        else:
+            func = OPERATIONS.get(name)
+        if func is None:
+            return  # Not replayable (e.g. an operation added after the replay tool)
+        with self.errors.operation(name):
+            started = time.perf_counter()
+            try:
+                ok = func(self.password, *op["args"], **op.get("kwargs", {})) is not False
+            except Exception as e:
+                self.errors.count(e, name)
+                ok = False
+            elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies.setdefault(name, []).append(elapsed)
+            if not ok:
+                self.failures[name] = self.failures.get(name, 0) + 1
+
+    def report(self, elapsed):
+        """
+        Args:
+            elapsed (float): Wall-clock duration of the replay in seconds.
+
+        Returns:
+            dict: Overall throughput, per-operation calls, failures, errors, busy errors and
+                  latency percentiles in milliseconds, and the retries per kind of database operation.
+        """
+        operations = {}
+        for name, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            errors, busy = self.errors.counts.get(name, (0, 0))
+            operations[name] = {
+                "calls": len(ordered),
+                "failures": self.failures.get(name, 0),
+                "errors": errors,
+                "busy_errors": busy,
+                "p50_ms": percentile(ordered, 50) * 1000,
+                "p95_ms": percentile(ordered, 95) * 1000,
+                "p99_ms": percentile(ordered, 99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        calls = sum(op["calls"] for op in operations.values())
+        return {
+            "users": self.users,
+            "sessions": len(self.sessions),
+            "calls": calls,
+            "elapsed_s": elapsed,
+            "ops_per_second": calls / elapsed if elapsed > 0 else 0.0,
+            "busy_errors": sum(busy for _, busy in self.errors.counts.values()),
+            "operations": operations,
+            "contention": ContentionStats.snapshot(),
+        }
+
+
+def print_report(report):
+    """
+    Prints the report as a table.
+    """
+    print(
+        f"{report['calls']} operations from {report['sessions']} sessions by {report['users']} users "
+        f"in {report['elapsed_s']:.2f}s ({report['ops_per_second']:,.0f} ops/s), "
+        f"{report['busy_errors']} busy/locked errors"
+    )
+    print(f"{'operation':<34}{'calls':>8}{'failed':>8}{'busy':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, op in report["operations"].items():
+        print(
+            f"{name:<34}{op['calls']:>8}{op['failures']:>8}{op['busy_errors']:>6}"
+            f"{op['p50_ms']:>10.2f}{op['p95_ms']:>10.2f}{op['p99_ms']:>10.2f}{op['max_ms']:>10.2f}"
+        )
+    for s in report["contention"]:
+        print(
+            f"contention ({s['kind']}): {s['contended']} operations hit a busy/locked database, "
+            f"{s['retries']} retries, {s['recovered']} recovered, {s['gave_up']} gave up, "
+            f"{s['wait_ms']:.1f} ms backing off (max {s['max_wait_ms']:.1f} ms)"
+        )
+
+
+def main(argv=None):
+    """
+    Runs the replay and prints (or saves) the report.
+
+    Returns:
+        int: 0 on success, 1 if the logs hold no sessions.
+    """
+    parser = argparse.ArgumentParser(description="Replay recorded BookMate workloads concurrently.")
+    parser.add_argument("logs", nargs="+", help="operation logs recorded with BOOKMATE_RECORD")
+    parser.add_argument("--database", default=DBManager.database(), help="database to copy (default: %(default)s)")
+    parser.add_argument("--shards", type=int, default=DBManager._shard_count, help="number of shards of the database")
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated users (default: 8)")
+    parser.add_argument("--loops", type=int, default=1, help="times each user replays its sessions (default: 1)")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="replay recorded think time divided by this factor; 0 = back to back (default)")
+    parser.add_argument("--password", default=datagen.PASSWORD, help="password for logins and signups")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    sessions = load_sessions(args.logs)
+    if not sessions:
+        print("No operations in the workload logs.", file=sys.stderr)
+        return 1
+
+    WorkloadRecorder.disable()  # Never record the replay itself
+    directory = tempfile.mkdtemp(prefix="bookmate-replay-")
+    try:
+        DBManager.configure(copy_database(args.database, args.shards, directory), shards=args.shards)
+        DBManager.setup_database()
+        report = Replay(sessions, args.users, args.password, args.speed, args.loops).run()
+        DBManager.close_connections()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            json.dump(report, out, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
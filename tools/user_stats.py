@@ -0,0 +1,43 @@
+"""
+Consistency check and rebuild of the per-user counters in `user_stats`.
+
+Usage:
+    python -m tools.user_stats check      # exit status 1 if any counter is wrong
+    python -m tools.user_stats rebuild    # recompute every counter from books and requests
+"""
+import argparse
+import sys
+
+from controllers.user_stats import UserStats
+from models.database import DBManager
+
+
+def main(argv=None):
+    """
+    Runs the check or the rebuild and prints the outcome.
+
+    Returns:
+        int: 0 if the counters are consistent (or were rebuilt), 1 if the check found wrong counters.
+    """
+    parser = argparse.ArgumentParser(description="Check or rebuild BookMate's per-user counters.")
+    parser.add_argument("action", choices=("check", "rebuild"))
+    args = parser.parse_args(argv)
+
+    DBManager.setup_database()
+    if args.action == "rebuild":
+        print(f"Rebuilt the counters of {UserStats.rebuild()} users.")
+        return 0
+
+    wrong = UserStats.check()
+    for user_id, books, actual_books, pending, actual_pending in wrong:
+        print(f"  user {user_id}: books_owned {books} (actual {actual_books}), "
+              f"pending_requests {pending} (actual {actual_pending})")
+    if wrong:
+        print(f"{len(wrong)} users have wrong counters; run `python -m tools.user_stats rebuild`.")
+        return 1
+    print("All counters are consistent.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
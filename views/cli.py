@@ -0,0 +1,383 @@
+"""
+Non-interactive command line for scripting BookMate.
+
+Every command writes its results to stdout as JSON Lines (one JSON object per line); anything
+else the application prints goes to stderr. The exit status is 0 if every command succeeded and
+1 if any reported `"ok": false`.
+
+Usage:
+    python main.py search tolkien --limit 20
+    python main.py --user alice add-book --title "The Hobbit" --author "J.R.R. Tolkien" --isbn 9780261103344
+    python main.py --user alice login                     # prints a session token
+    python main.py --token TOKEN respond --accept 12 13 --reject 14
+    python main.py --token TOKEN batch commands.jsonl     # or "-" / nothing for stdin
+
+Commands that act as a user authenticate with `--token` (or `BOOKMATE_TOKEN`), or with `--user`
+and the password from `BOOKMATE_PASSWORD` (prompted for if unset and a terminal is attached).
+
+In batch mode each input line is one command, e.g.
+    {"cmd": "add-book", "title": "Dune", "author": "Frank Herbert", "isbn": "9780441172719"}
+    {"cmd": "respond", "accept": [12, 13], "reject": [14]}
+    {"cmd": "login", "username": "bob", "password": "secret"}
+The keys are the command's option names (with "_" for "-"). All commands run in one process and
+are committed `--commit-every` at a time; each command runs in its own savepoint, so a failing
+command is rolled back on its own. Every output record carries the number of its input line.
+"""
+import argparse
+import contextlib
+import getpass
+import json
+import os
+import sqlite3
+import sys
+from itertools import islice
+
+from controllers.book import Book
+from controllers.importer import BookImporter
+from controllers.request import Request
+from controllers.user import User
+from controllers.user_stats import UserStats
+from models.database import DBManager
+
+
+class CommandError(Exception):
+    """
+    A command could not be carried out; the message is reported to the caller as is.
+    """
+
+
+class CommandRunner:
+    """
+    Runs commands on behalf of one user and reports their results as JSON-ready dicts.
+
+    The user is authenticated lazily, on the first command that needs it.
+
+    Attributes:
+        - user (User): The user commands act as.
+    """
+    COMMANDS = (
+        "signup", "login", "logout", "search", "add-book", "delete-book",
+        "request", "requests", "history", "events", "respond", "import", "stats",
+    )
+
+    def __init__(self, username=None, password=None, token=None):
+        """
+        Args:
+            username (str, optional): The user to log in as.
+            password (str, optional): Their password (prompted for when needed if not given).
+            token (str, optional): A session token; takes precedence over `username`.
+        """
+        self.user = User()
+        self._username = username
+        self._password = password
+        self._token = token
+
+    def run(self, name, **options):
+        """
+        Run one command.
+
+        Args:
+            name (str): The command, one of `COMMANDS`.
+            **options: The command's options.
+
+        Returns:
+            list: The result records (dicts) of the command.
+
+        Raises:
+            CommandError: If the command is unknown, its options are invalid or it failed.
+        """
+        if name not in self.COMMANDS:
+            raise CommandError(f"Unknown command: {name!r}")
+        handler = getattr(self, "_" + name.replace("-", "_"))
+        try:
+            return list(handler(**options))
+        except TypeError as e:
+            raise CommandError(f"Invalid options for {name}: {e}") from None
+        except (ValueError, OSError) as e:  # E.g. an import file that cannot be read
+            raise CommandError(f"{name}: {e}") from None
+
+    def _require_user(self):
+        """
+        Authenticate with the configured token or credentials, unless already logged in.
+        """
+        if self.user.user_id:
+            return
+        if self._token:
+            if not self.user.login_with_token(self._token):
+                raise CommandError("Invalid or expired session token")
+        elif self._username:
+            if not self.user.login(self._username, self._password_for(self._username)):
+                raise CommandError("Invalid credentials")
+        else:
+            raise CommandError("This command needs --token or --user")
+
+    def _password_for(self, username):
+        if self._password is None:
+            if not sys.stdin.isatty():
+                raise CommandError("Set BOOKMATE_PASSWORD to authenticate without a terminal")
+            self._password = getpass.getpass(f"Password for {username}: ")
+        return self._password
+
+    def _signup(self, username, password=None):
+        if not User.save(username, password if password is not None else self._password_for(username)):
+            raise CommandError(f"Signup failed: username {username!r} may be taken")
+        yield {"ok": True, "username": username}
+
+    def _login(self, username=None, password=None):
+        # Log in (again), issuing a token; in batch mode this switches the user later commands act as
+        self.user = User()
+        if username is not None:
+            self._username, self._password, self._token = username, password, None
+        if not self._username:
+            raise CommandError("login needs --user")
+        if not self.user.login(self._username, self._password_for(self._username), issue_token=True):
+            raise CommandError("Invalid credentials")
+        self._token = self.user.session_token
+        yield {"ok": True, "user_id": self.user.user_id, "username": self.user.username, "token": self._token}
+
+    def _logout(self):
+        self._require_user()
+        self.user.logout()
+        self._token = None
+        yield {"ok": True}
+
+    def _search(self, keyword="", fuzzy=False, limit=None):
+        if fuzzy:
+            books = Book.fuzzy_search(keyword, limit=limit or 20)
+        else:
+            books = islice(Book.iter_search(keyword), limit)
+        for book_id, title, author, isbn, owner in books:
+            yield {"book_id": book_id, "title": title, "author": author, "isbn": isbn, "owner": owner}
+
+    def _add_book(self, title, author, isbn):
+        self._require_user()
+        book = Book(title, author, isbn, self.user.user_id)
+        if not book.save():
+            raise CommandError("Failed to add book: its ISBN may already be in the catalog")
+        yield {"ok": True, "book_id": book.book_id}
+
+    def _delete_book(self, book_id):
+        self._require_user()
+        if not Book.delete(int(book_id), self.user.user_id):
+            raise CommandError(f"Book {book_id} not found or not owned by {self.user.username}")
+        yield {"ok": True, "book_id": int(book_id)}
+
+    def _request(self, book_id):
+        self._require_user()
+        request = Request(int(book_id), self.user.user_id)
+        if not request.save():
+            raise CommandError(f"Book {book_id} not found")
+        yield {"ok": True, "request_id": request.request_id}
+
+    def _requests(self):
+        self._require_user()
+        for request_id, book_id, title, author, requester_id, requester, status in Request.iter_requests(self.user.user_id):
+            yield {
+                "request_id": request_id, "book_id": book_id, "title": title, "author": author,
+                "requester_id": requester_id, "requester": requester, "status": status,
+            }
+
+    def _history(self, limit=None):
+        self._require_user()
+        before_id = None
+        while limit is None or limit > 0:
+            page = Request.history(self.user.user_id, before_id, 500 if limit is None else min(limit, 500))
+            for request_id, book_id, requester_id, status, resolved_at in page:
+                yield {
+                    "request_id": request_id, "book_id": book_id, "requester_id": requester_id,
+                    "status": status, "resolved_at": resolved_at,
+                }
+            if len(page) < 500:
+                return
+            before_id = page[-1][0]
+            limit = None if limit is None else limit - len(page)
+
+    def _events(self, after=0, wait=0, limit=100):
+        self._require_user()
+        for event_id, request_id, book_id, requester_id, status, created_at in Request.events_since(
+                self.user.user_id, int(after), int(limit), float(wait)):
+            yield {
+                "event_id": event_id, "request_id": request_id, "book_id": book_id,
+                "requester_id": requester_id, "status": status, "created_at": created_at,
+            }
+
+    def _respond(self, accept=(), reject=()):
+        self._require_user()
+        decisions = [(int(request_id), "Accepted") for request_id in accept or ()]
+        decisions += [(int(request_id), "Rejected") for request_id in reject or ()]
+        if not decisions:
+            raise CommandError("respond needs request IDs to accept or reject")
+        resolved = Request.update_request_statuses(decisions, owner_id=self.user.user_id)
+        for (request_id, status), outcome in zip(decisions, resolved):
+            record = {"ok": outcome == status, "request_id": request_id, "status": outcome or status}
+            if outcome is None:
+                record["error"] = "Request not found or no longer pending"
+            elif outcome != status:
+                record["error"] = "The book was deleted or has changed hands, so the request was rejected"
+            yield record
+
+    def _stats(self):
+        self._require_user()
+        books_owned, pending_requests = UserStats.get(self.user.user_id)
+        yield {"user_id": self.user.user_id, "books_owned": books_owned, "pending_requests": pending_requests}
+
+    def _import(self, path, format=None, batch_size=1000):
+        self._require_user()
+        report = BookImporter(self.user.user_id, batch_size=int(batch_size)).import_file(path, format)
+        for row_number, isbn, reason in sorted(report.failures, key=lambda failure: failure[0]):
+            yield {"ok": False, "row": row_number, "isbn": isbn, "error": reason}
+        yield {"ok": True, "inserted": report.inserted, "rejected": len(report.failures),
+               "elapsed": round(report.elapsed, 3)}
+
+
+def run_batch(runner, lines, emit, commit_every=500):
+    """
+    Run newline-delimited JSON commands, committing `commit_every` commands at a time.
+
+    A chunk holds a write transaction open on every shard; each command runs inside its own
+    savepoint, so a command that fails is rolled back without affecting the rest of the chunk.
+    The records of a chunk are only emitted once it has committed; if the commit fails, every
+    line of the chunk gets an error record instead, since none of its commands took effect.
+
+    Args:
+        runner (CommandRunner): Runs the commands.
+        lines (iterable): The input lines; blank lines are skipped.
+        emit (callable): Called with each result record, tagged with its input line number.
+        commit_every (int): Commands per transaction.
+
+    Returns:
+        bool: True if every command succeeded.
+    """
+    numbered = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+    pools = DBManager.get_shards().pools
+    succeeded = True
+    while True:
+        chunk = list(islice(numbered, commit_every))  # Read ahead so no lock is held while waiting for input
+        if not chunk:
+            return succeeded
+        results = []  # (line number, record), emitted once the chunk has committed
+        try:
+            with contextlib.ExitStack() as stack:
+                # Transaction control runs on plain cursors so it stays out of QueryStats
+                cursors = [stack.enter_context(pool.transaction()).cursor() for pool in pools]
+                for number, line in chunk:
+                    for cursor in cursors:
+                        cursor.execute("SAVEPOINT batch_command")
+                    try:
+                        command = json.loads(line)
+                        if not isinstance(command, dict) or "cmd" not in command:
+                            raise CommandError('Each line must be a JSON object with a "cmd" key')
+                        records = runner.run(command.pop("cmd"), **command)
+                    except (CommandError, ValueError, OSError, sqlite3.Error) as e:
+                        for cursor in cursors:
+                            cursor.execute("ROLLBACK TO batch_command")
+                        Book.clear_caches()  # They may hold rows the rolled back command read
+                        records = [{"ok": False, "error": str(e)}]
+                    for cursor in cursors:
+                        cursor.execute("RELEASE batch_command")
+                    results.extend((number, record) for record in records)
+        except sqlite3.Error as e:
+            Book.clear_caches()
+            results = [(number, {"ok": False, "error": f"Not committed: {e}"}) for number, _ in chunk]
+        for number, record in results:
+            succeeded = succeeded and record.get("ok") is not False
+            emit({"line": number, **record})
+
+
+def build_parser():
+    """
+    Returns:
+        argparse.ArgumentParser: The parser for the command line.
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="BookMate. Without a command, starts the interactive menu; commands print JSON Lines.",
+    )
+    parser.add_argument("--user", help="username to act as (password from BOOKMATE_PASSWORD or a prompt)")
+    parser.add_argument("--token", default=os.environ.get("BOOKMATE_TOKEN"),
+                        help="session token to act with (default: BOOKMATE_TOKEN)")
+    commands = parser.add_subparsers(dest="cmd", metavar="command", required=True)
+
+    signup = commands.add_parser("signup", help="create an account")
+    signup.add_argument("username")
+
+    commands.add_parser("login", help="log in as --user and print a session token")
+    commands.add_parser("logout", help="revoke the session token")
+
+    search = commands.add_parser("search", help="search books by title, author or ISBN")
+    search.add_argument("keyword", nargs="?", default="", help="search keyword (omit to list all books)")
+    search.add_argument("--fuzzy", action="store_true", help="typo-tolerant search")
+    search.add_argument("--limit", type=int, help="maximum number of books")
+
+    add_book = commands.add_parser("add-book", help="add a book")
+    add_book.add_argument("--title", required=True)
+    add_book.add_argument("--author", required=True)
+    add_book.add_argument("--isbn", required=True)
+
+    delete_book = commands.add_parser("delete-book", help="delete one of your books")
+    delete_book.add_argument("book_id", type=int)
+
+    request = commands.add_parser("request", help="request a book")
+    request.add_argument("book_id", type=int)
+
+    commands.add_parser("requests", help="list the pending requests for your books")
+
+    history = commands.add_parser("history", help="resolved requests for your books, newest first")
+    history.add_argument("--limit", type=int, help="maximum number of requests")
+
+    events = commands.add_parser("events", help="changes to the requests for your books after a cursor")
+    events.add_argument("--after", type=int, default=0, metavar="EVENT_ID", help="last event already seen")
+    events.add_argument("--wait", type=float, default=0, metavar="SECONDS", help="long-poll for new events")
+    events.add_argument("--limit", type=int, default=100)
+
+    respond = commands.add_parser("respond", help="accept or reject pending requests")
+    respond.add_argument("--accept", type=int, nargs="+", default=[], metavar="ID")
+    respond.add_argument("--reject", type=int, nargs="+", default=[], metavar="ID")
+
+    commands.add_parser("stats", help="how many books you own and how many requests are waiting")
+
+    import_books = commands.add_parser("import", help="bulk import books from a CSV or JSONL file")
+    import_books.add_argument("path")
+    import_books.add_argument("--format", choices=("csv", "jsonl"), help="file format (default: from extension)")
+    import_books.add_argument("--batch-size", type=int, default=1000, help="rows per transaction (default: 1000)")
+
+    batch = commands.add_parser("batch", help="run newline-delimited JSON commands from a file or stdin")
+    batch.add_argument("file", nargs="?", default="-", help='command file (default: "-", stdin)')
+    batch.add_argument("--commit-every", type=int, default=500, help="commands per transaction (default: 500)")
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs one command (or a batch of them) and prints the results as JSON Lines.
+
+    Returns:
+        int: 0 if every command succeeded, 1 otherwise.
+    """
+    args = build_parser().parse_args(argv)
+    options = {key: value for key, value in vars(args).items() if key not in ("user", "token", "cmd")}
+    runner = CommandRunner(args.user, os.environ.get("BOOKMATE_PASSWORD"), args.token)
+    out = sys.stdout
+
+    def emit(record):
+        out.write(json.dumps(record) + "\n")
+
+    DBManager.setup_database()
+    succeeded = True
+    try:
+        with contextlib.redirect_stdout(sys.stderr):  # Keep stdout for the JSON results
+            if args.cmd == "batch":
+                with contextlib.ExitStack() as stack:
+                    source = sys.stdin if args.file == "-" else stack.enter_context(open(args.file, encoding="utf-8"))
+                    succeeded = run_batch(runner, source, emit, args.commit_every)
+            else:
+                try:
+                    records = runner.run(args.cmd, **options)
+                except (CommandError, OSError, sqlite3.Error) as e:
+                    records = [{"ok": False, "error": str(e)}]
+                for record in records:
+                    succeeded = succeeded and record.get("ok") is not False
+                    emit(record)
+    finally:
+        DBManager.close_connections()
+    return 0 if succeeded else 1
@@ -1,5 +1,6 @@
 import getpass
 from controllers.request import Request
+from views.table_renderer import Column, TableRenderer
 
 """
 ConsoleUI class provides methods to interact with the user through the command-line interface (CLI).
@@ -14,6 +15,24 @@ class ConsoleUI:
         yellow="\033[33m",  # Yellow color code
         reset="\033[0m"  # Reset to default color
     )
+    PAGE_SIZE = 20  # Number of rows shown before asking for the next page
+    WRITE_CHUNK = 1000  # Rows formatted and written at a time when not paging
+
+    # Table layouts of the `Book.search` and `Request.view_requests` row tuples
+    BOOK_COLUMNS = [
+        Column("ID", 0, 20, ">"),
+        Column("Title", 1, 48),
+        Column("Author", 2, 32),
+        Column("ISBN", 3, 17),
+        Column("Owner", 4, 24),
+    ]
+    REQUEST_COLUMNS = [
+        Column("#", 0, 10, ">"),
+        Column("Request", 1, 20, ">"),
+        Column("Title", 3, 48),
+        Column("Author", 4, 32),
+        Column("Requested by", 6, 24),
+    ]
 
     @staticmethod
     def display_welcome_menu():
@@ -26,19 +45,27 @@ class ConsoleUI:
         print("3. Exit")
 
     @staticmethod
-    def display_actions_menu():
+    def display_actions_menu(new_requests=0, stats=None):
         """
         Displays the actions menu for logged-in users with options to logout,
-        add or delete books, search books, request books, view requests, or exit.
+        add or delete books, search books, request books, view requests,
+        view query statistics, or exit.
+
+        Args:
+            new_requests (int): Number of requests made since the user last viewed them.
+            stats (tuple, optional): (books owned, pending requests) of the user, shown above the menu.
         """
         print("\n=== Action Menus ===")
+        if stats is not None:
+            print(f"You own {stats[0]} book(s); {stats[1]} request(s) are waiting for you.")
         print("1. Logout")
         print("2. Add Book")
         print("3. Delete Book")
         print("4. Search Book")
         print("5. Request a Book")
-        print("6. View Requests for Your Books")
-        print("7. Exit")
+        print(f"6. View Requests for Your Books ({new_requests} new)" if new_requests else "6. View Requests for Your Books")
+        print("7. Query Statistics (admin)")
+        print("8. Exit")
 
     @staticmethod
     def get_user_input(prompt):
@@ -53,6 +80,19 @@ class ConsoleUI:
         """
         return input(prompt)
 
+    @staticmethod
+    def get_search_keyword():
+        """
+        Prompts for a search keyword. A keyword starting with "~" asks for a typo-tolerant search.
+
+        Returns:
+            tuple: (keyword, fuzzy), where fuzzy is True for a typo-tolerant search.
+        """
+        keyword = input("Enter keyword to search (Enter to list all, ~keyword for typo-tolerant search): ").strip()
+        if keyword.startswith("~"):
+            return keyword[1:].strip(), True
+        return keyword, False
+
     @staticmethod
     def get_user_password(prompt):
         """
@@ -82,47 +122,139 @@ class ConsoleUI:
             print(message)
 
     @staticmethod
-    def display_books(books):
+    def display_books(books, page_size=None):
         """
-        Displays a list of books in a formatted manner.
+        Displays books as a column-aligned table.
+
+        `books` may be a list or any iterable (e.g. the generator returned by `Book.iter_search`).
+        Rows are formatted and written a page at a time by a `TableRenderer`; on a terminal, the
+        user is asked before the next page is fetched, so large result sets are never loaded all at once.
 
         Args:
-            books (list): A list of books to display. Each book is represented as a tuple.
+            books (iterable): The books to display. Each book is represented as a tuple.
+            page_size (int, optional): Number of books per page. Shows everything if omitted.
         """
-        if not books:  # Check if no books are found
-            print(f"{ConsoleUI.text_color.get('yellow')}No books found.{ConsoleUI.text_color.get('reset')}")
-        else:
+        if isinstance(books, list):  # The total is only known up front for a materialized list
+            if not books:  # Check if no books are found
+                print(f"{ConsoleUI.text_color.get('yellow')}No books found.{ConsoleUI.text_color.get('reset')}")
+                return
             print(f"\n{ConsoleUI.text_color.get('green')}Found {len(books)} Books:{ConsoleUI.text_color.get('reset')}")
-            for book in books:  # Loop through the books and display their details
-                print(f"ID: {book[0]}, Title: {book[1]}, Author: {book[2]}, ISBN: {book[3]}, OwnerName: {book[4]}")
+
+        table = TableRenderer(ConsoleUI.BOOK_COLUMNS, page_size=page_size or ConsoleUI.WRITE_CHUNK,
+                              interactive=None if page_size else False, header_color=ConsoleUI.text_color.get("green"))
+        complete = table.render(books)
+
+        if table.rows == 0:
+            print(f"{ConsoleUI.text_color.get('yellow')}No books found.{ConsoleUI.text_color.get('reset')}")
+        elif complete and not isinstance(books, list):
+            print(f"{ConsoleUI.text_color.get('green')}Listed {table.rows} Books.{ConsoleUI.text_color.get('reset')}")
 
     @staticmethod
-    def interact_requests(requests):
+    def display_query_stats(stats, limit=15):
+        """
+        Displays per-statement query statistics, most expensive first.
+
+        Args:
+            stats (list): Statement statistics as returned by `QueryStats.snapshot()`.
+            limit (int): Maximum number of statements to show.
+        """
+        if not stats:
+            print(f"{ConsoleUI.text_color.get('yellow')}No queries recorded yet.{ConsoleUI.text_color.get('reset')}")
+            return
+        print(f"\n{ConsoleUI.text_color.get('green')}Top {min(limit, len(stats))} of {len(stats)} statements by total time:{ConsoleUI.text_color.get('reset')}")
+        print(f"{'calls':>7} {'total ms':>10} {'avg ms':>8} {'max ms':>8} {'rows':>8} {'errors':>6}  query")
+        for s in stats[:limit]:
+            query = s["query"] if len(s["query"]) <= 90 else s["query"][:87] + "..."
+            print(f"{s['calls']:>7} {s['total_ms']:>10.2f} {s['avg_ms']:>8.3f} {s['max_ms']:>8.2f} {s['rows']:>8} {s['errors']:>6}  {query}")
+
+    @staticmethod
+    def display_cache_stats(stats):
+        """
+        Displays hit/miss counters and memory use of the application caches.
+
+        Args:
+            stats (list): Cache statistics as returned by `LRUCache.stats()`.
+        """
+        print(f"\n{ConsoleUI.text_color.get('green')}Caches:{ConsoleUI.text_color.get('reset')}")
+        print(f"{'cache':<10} {'hits':>8} {'misses':>8} {'hit rate':>9} {'evictions':>9} {'entries':>8} {'KiB used':>9} {'KiB max':>8}")
+        for s in stats:
+            print(f"{s['name']:<10} {s['hits']:>8} {s['misses']:>8} {s['hit_rate']:>9.1%} {s['evictions']:>9} "
+                  f"{s['entries']:>8} {s['bytes'] / 1024:>9.0f} {s['max_bytes'] / 1024:>8.0f}")
+
+    @staticmethod
+    def display_contention_stats(stats):
+        """
+        Displays how often the database was busy or locked and what the retries cost.
+
+        Args:
+            stats (list): Contention statistics as returned by `ContentionStats.snapshot()`.
+        """
+        if not stats:
+            print(f"{ConsoleUI.text_color.get('green')}No lock contention so far.{ConsoleUI.text_color.get('reset')}")
+            return
+        print(f"\n{ConsoleUI.text_color.get('green')}Lock contention:{ConsoleUI.text_color.get('reset')}")
+        print(f"{'operation':<12} {'contended':>9} {'retries':>8} {'recovered':>9} {'gave up':>8} {'wait ms':>9} {'max ms':>8}")
+        for s in stats:
+            print(f"{s['kind']:<12} {s['contended']:>9} {s['retries']:>8} {s['recovered']:>9} {s['gave_up']:>8} "
+                  f"{s['wait_ms']:>9.1f} {s['max_wait_ms']:>8.1f}")
+
+    @staticmethod
+    def interact_requests(requests, total=None):
         """
         Allows the user to interact with requests for their books, enabling them
         to accept, reject, or skip the requests.
 
+        Requests are shown a page at a time as a table, and the user decides on each request of the
+        page before the next page is fetched. Decisions are collected while the user walks through
+        the list and are then submitted together in one transaction. Once a request is accepted, the
+        remaining requests for the same book are rejected automatically and are not shown.
+
         Args:
-            requests (list): A list of requests for the user's books. Each request is a tuple.
+            requests (iterable): The requests for the user's books, each a tuple. May be a stream
+                                 (e.g. `Request.iter_requests`) if `total` is given.
+            total (int, optional): Number of requests; defaults to `len(requests)`.
         """
-        n = len(requests)  # Get the number of requests
+        n = len(requests) if total is None else total  # Get the number of requests
         if n > 0:  # If there are requests to process
-            for i, req in enumerate(requests):  # Loop through each request
-                print(
-                    f"{ConsoleUI.text_color.get('yellow')} Request: ({i + 1} / {n}) for Book (title: {req[2]}, author: {req[3]}) from User: {req[5]} ({req[4]}) {ConsoleUI.text_color.get('reset')}")
-
-                # Ask the user what action to take on this request
-                decision = input("Accept (a) / Reject (r) / Skip (s) / Exit (e): ")
-
-                # Take action based on the user's input
-                if decision == "a":
-                    Request.update_request_status(req[0], "Accepted")
-                elif decision == "r":
-                    Request.update_request_status(req[0], "Rejected")
-                elif decision == "s":
-                    continue  # Skip to the next request
+            decisions = []  # (request_id, status) pairs submitted in one batch at the end
+            accepted_books = set()  # Books given away during this session
+            # Numbered rows; competing requests for a book accepted on an earlier page are left out
+            # (they are rejected automatically). Pages are only fetched as the user works through them.
+            numbered = ((i + 1, *req) for i, req in enumerate(requests) if req[1] not in accepted_books)
+            table = TableRenderer(ConsoleUI.REQUEST_COLUMNS, page_size=ConsoleUI.PAGE_SIZE, interactive=True,
+                                  header_color=ConsoleUI.text_color.get("yellow"))
+            for page in table.pages(numbered, prompt=False):
+                for row in page:
+                    req = row[1:]
+                    if req[1] in accepted_books:
+                        continue  # Competing request for a book accepted on this page
+
+                    # Ask the user what action to take on this request
+                    decision = input(f"Request {row[0]} / {n} (ID {req[0]}): Accept (a) / Reject (r) / Skip (s) / Exit (e): ")
+
+                    # Take action based on the user's input
+                    if decision == "a":
+                        decisions.append((req[0], "Accepted"))
+                        accepted_books.add(req[1])
+                    elif decision == "r":
+                        decisions.append((req[0], "Rejected"))
+                    elif decision == "s":
+                        continue  # Skip to the next request
+                    else:
+                        break  # Exit
                 else:
-                    break  # Exit the loop
+                    continue  # Page done; fetch the next one
+                break
+
+            if decisions:
+                outcomes = [(status, outcome) for (_, status), outcome
+                            in zip(decisions, Request.update_request_statuses(decisions))]
+                resolved = sum(outcome == status for status, outcome in outcomes)
+                ConsoleUI.display_message(f"{resolved} request(s) updated.", c="green")
+                rejected = sum(outcome is not None and outcome != status for status, outcome in outcomes)
+                if rejected:
+                    ConsoleUI.display_message(
+                        f"{rejected} request(s) rejected: the book was deleted or has changed hands.", c="red")
         else:
             print(
                 f"{ConsoleUI.text_color.get('red')} No requests were made for your book {ConsoleUI.text_color.get('reset')}")
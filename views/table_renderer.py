@@ -0,0 +1,168 @@
+import sys
+from collections import namedtuple
+from itertools import islice, repeat
+from operator import itemgetter
+
+# One table column: header, the tuple index it shows, its widest allowed width and its alignment
+Column = namedtuple("Column", ["header", "index", "max_width", "align"], defaults=(None, 40, "<"))
+
+
+class TableRenderer:
+    """
+    Renders rows as a column-aligned text table, one page at a time.
+
+    Rows are consumed from any iterable, so a generator such as `Book.iter_search` is only advanced
+    as far as the pages actually shown: the next page is fetched from the database when the user
+    asks for it, not before. Each page is formatted in bulk and handed to the output stream as a
+    single write, instead of one `print` (and, on a terminal, one flush) per row.
+
+    Column widths fit the widest value seen so far (at least the header, at most the column's
+    `max_width`; longer values are cut with "…"). Widths only ever grow, so once the first pages
+    have settled them, the rows of later pages line up with the earlier ones.
+
+    When the output is a terminal, the renderer pauses after each page and asks whether to go on;
+    otherwise (output piped or redirected) every page is written without pausing.
+
+    Attributes:
+        - columns (list): The `Column`s of the table.
+        - page_size (int): Number of rows per page.
+        - rows (int): Number of rows rendered so far.
+        - stopped (bool): Whether the user stopped paging before the last row.
+    """
+
+    MORE_PROMPT = "-- Enter for more, (q) to stop: "
+    ALIGN = {"<": str.ljust, ">": str.rjust, "^": str.center}
+
+    def __init__(self, columns, page_size=20, out=None, interactive=None, header_color=None, reset_color="\033[0m"):
+        """
+        Args:
+            columns (list): `Column`s, or (header, index) pairs using the default width and alignment.
+            page_size (int): Number of rows per page.
+            out (file, optional): Where the table is written (default: `sys.stdout`).
+            interactive (bool, optional): Whether to pause between pages (default: if `out` is a terminal).
+            header_color (str, optional): Escape code the header line is shown in.
+            reset_color (str): Escape code ending `header_color`.
+        """
+        self.columns = [column if isinstance(column, Column) else Column(*column) for column in columns]
+        self.page_size = max(1, page_size)
+        self.out = out if out is not None else sys.stdout
+        self.interactive = self._is_terminal(self.out) if interactive is None else interactive
+        self.header_color = header_color
+        self.reset_color = reset_color
+        self.rows = 0
+        self.stopped = False
+        self._widths = [len(column.header) for column in self.columns]
+        indexes = [column.index for column in self.columns]
+        self._pick = itemgetter(*indexes) if len(indexes) > 1 else lambda row: (row[indexes[0]],)
+
+    def render(self, rows):
+        """
+        Writes the rows page by page, pausing between pages in interactive mode.
+
+        Args:
+            rows (iterable): The rows (tuples) to show.
+
+        Returns:
+            bool: True if every row was shown, False if the user stopped early.
+        """
+        for _ in self.pages(rows):
+            pass
+        return not self.stopped
+
+    def pages(self, rows, prompt=True):
+        """
+        Writes the rows page by page and yields each page after it has been written, so the caller
+        can act on the rows on screen (e.g. ask for a decision per row) before the next page is fetched.
+
+        Args:
+            rows (iterable): The rows (tuples) to show.
+            prompt (bool): Whether to ask "Enter for more" between pages in interactive mode.
+                           Callers that prompt per row pass False.
+
+        Yields:
+            list: The rows of each page, in order.
+        """
+        self.stopped = False
+        rows = iter(rows)
+        page = list(islice(rows, self.page_size))
+        first = True
+        while page:
+            self.write_page(page, header=first or self.interactive)
+            first = False
+            self.rows += len(page)
+            yield page
+            if len(page) < self.page_size:
+                return  # A short page is the last one
+            if prompt and self.interactive and not self.ask_more():
+                self.stopped = True
+                return
+            page = list(islice(rows, self.page_size))  # Only fetched once the user asked for it
+
+    def write_page(self, page, header=True):
+        """
+        Formats a page of rows and writes it in one call.
+
+        The page is formatted a column at a time (convert, measure, cut and pad every value of the
+        column with one builtin call each), which avoids running Python code for every cell.
+
+        Args:
+            page (list): The rows of the page.
+            header (bool): Whether to write the header line above the rows.
+        """
+        fields = []
+        for column, values in zip(self.columns, zip(*map(self._pick, page))):
+            values = list(map(str, values)) if None not in values else [self._cell(value) for value in values]
+            if "\n" in "".join(values):
+                values = [value.replace("\n", " ") for value in values]
+            fields.append(values)
+        lines = list(map("  ".join, zip(*self._pad(fields))))
+        if header:
+            heading = "  ".join(line[0] for line in self._pad([[column.header] for column in self.columns]))
+            if self.header_color:
+                heading = f"{self.header_color}{heading}{self.reset_color}"
+            lines.insert(0, heading)
+        self.out.write("\n".join(lines) + "\n")
+        self.out.flush()
+
+    def ask_more(self):
+        """
+        Returns:
+            bool: True if the user wants the next page.
+        """
+        return input(self.MORE_PROMPT).strip().lower() != "q"
+
+    def _pad(self, fields):
+        """
+        Widens the columns to fit the new values (up to their `max_width`), then cuts and pads the
+        values to the column widths. The last column is not padded if it is left-aligned, so lines
+        carry no trailing spaces.
+
+        Args:
+            fields (list): The values of every column, as lists of strings.
+
+        Returns:
+            list: The cut and padded values of every column.
+        """
+        padded = []
+        last = len(self.columns) - 1
+        for i, (column, values) in enumerate(zip(self.columns, fields)):
+            widest = max(map(len, values), default=0)
+            width = self._widths[i] = min(max(self._widths[i], widest), column.max_width)
+            if widest > width:
+                values = [value if len(value) <= width else value[:width - 1] + "…" for value in values]
+            if i == last and column.align == "<":
+                padded.append(values)
+            else:
+                padded.append(list(map(self.ALIGN[column.align], values, repeat(width))))
+        return padded
+
+    @staticmethod
+    def _cell(value):
+        return "" if value is None else str(value)
+
+    @staticmethod
+    def _is_terminal(out):
+        try:
+            return out.isatty() and sys.stdin.isatty()
+        except (AttributeError, ValueError):
+            return False